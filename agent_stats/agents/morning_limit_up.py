@@ -30,7 +30,7 @@ import pandas as pd
 
 from agent_stats.agent_base import BaseAgent
 from data.data_cleaner import data_cleaner, TushareRateLimitAbort
-from utils.common_tools import calc_limit_up_price
+from utils.common_tools import calc_limit_prices
 from utils.log_utils import logger
 
 MORNING_CUTOFF_H = 11
@@ -109,6 +109,11 @@ class MorningLimitUpAgent(BaseAgent):
                 if row["ts_code"] not in pre_close_map:
                     pre_close_map[row["ts_code"]] = row["pre_close"]
 
+        # 全市场涨停价一次向量化算完（前收价口径同上），循环内只查表
+        codes     = daily_data["ts_code"]
+        up_prices = calc_limit_prices(codes, codes.map(pre_close_map).fillna(0.0))[0]
+        limit_up_map: Dict[str, float] = dict(zip(codes, up_prices.tolist()))
+
         # ── Step 2: 候选池 — 当日 high 触板 + 非ST + 非北交所 ───────────
         candidates = []
         for _, row in daily_data.iterrows():
@@ -121,7 +126,7 @@ class MorningLimitUpAgent(BaseAgent):
             pre_close = pre_close_map.get(ts_code, 0.0)
             if pre_close <= 0:
                 continue
-            limit_price = calc_limit_up_price(ts_code, pre_close)
+            limit_price = limit_up_map.get(ts_code, 0.0)
             if limit_price <= 0:
                 continue
             high = row.get("high", 0.0) if hasattr(row, "get") else getattr(row, "high", 0.0)
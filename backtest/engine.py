@@ -3,7 +3,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import pandas as pd
 from config.config import MAX_POSITION_COUNT
-from utils.common_tools import get_trade_dates, get_daily_kline_data
+from utils.common_tools import get_trade_dates, get_daily_kline_data, get_row_limit_prices, get_st_stock_codes
 from backtest.account import Account
 from backtest.metrics import BacktestMetrics
 from data.data_cleaner import data_cleaner
@@ -51,6 +51,8 @@ class MultiStockBacktestEngine:
             if daily_df.empty:
                 logger.warning(f"{trade_date} 无有效日线数据，跳过当日")
                 continue
+            # 当日 ST 名单（入库涨跌停价缺失时补算用，主板 ST 按 ST 比例）
+            st_codes = set(get_st_stock_codes(trade_date))
 
             # ========== 开盘卖出信号执行（原有逻辑完全不变） ==========
             open_sell_ts_codes = []
@@ -64,7 +66,7 @@ class MultiStockBacktestEngine:
 
                     # 1.2 【核心拦截】判断当日是否一字跌停，无法卖出
                     pre_close = stock_df["pre_close"].iloc[0]
-                    limit_down_price = self.strategy.calc_limit_down_price(ts_code, pre_close)
+                    limit_down_price = self.strategy.calc_limit_down_price(ts_code, pre_close, ts_code in st_codes)
                     open_price = stock_df["open"].iloc[0]
                     high_price = stock_df["high"].iloc[0]
 
@@ -127,10 +129,10 @@ class MultiStockBacktestEngine:
                             self.strategy.on_buy_failed(ts_code, "无当日日线数据")
                         continue
 
-                    # 3.2 计算涨跌停价格（通用基础数据）
+                    # 3.2 涨跌停价格（优先取 kline_day 入库列，缺失时标量补算）
                     pre_close = stock_df["pre_close"].iloc[0]
-                    limit_up_price = self.strategy.calc_limit_up_price(ts_code, pre_close)
-                    limit_down_price = self.strategy.calc_limit_down_price(ts_code, pre_close)
+                    limit_up_price, limit_down_price = get_row_limit_prices(
+                        ts_code, stock_df.iloc[0], pre_close, ts_code in st_codes)
                     open_price = stock_df["open"].iloc[0]
                     close_price = stock_df["close"].iloc[0]
                     low_price = stock_df["low"].iloc[0]
@@ -221,7 +223,7 @@ class MultiStockBacktestEngine:
 
                     # 5.2 【核心拦截】判断当日是否一字跌停，无法卖出
                     pre_close = stock_df["pre_close"].iloc[0]
-                    limit_down_price = self.strategy.calc_limit_down_price(ts_code, pre_close)
+                    limit_down_price = self.strategy.calc_limit_down_price(ts_code, pre_close, ts_code in st_codes)
                     open_price = stock_df["open"].iloc[0]
                     high_price = stock_df["high"].iloc[0]
 
@@ -24,11 +24,18 @@ FILTER_688_BOARD = False
 MAIN_BOARD_LIMIT_UP_RATE = 0.098
 # 创业板/科创板（300/688开头）
 STAR_BOARD_LIMIT_UP_RATE = 0.198
-# ST股（备用）
-# ST_BOARD_LIMIT_UP_RATE = 0.048
+# 主板 ST / *ST 股（创业板/科创板 ST 仍按 20%）
+ST_BOARD_LIMIT_UP_RATE = 0.048
 #BJ所涨停幅度
 BJ_BOARD_LIMIT_UP_RATE = 0.298
 
+# ===================== A股交易所涨跌幅（计算真实涨跌停价，不带容错） =====================
+# kline_day.limit_up / limit_down、stock_limit_event 按此入库；近涨停容差在比较价格处施加
+MAIN_BOARD_PRICE_LIMIT = 0.10   # 主板
+STAR_BOARD_PRICE_LIMIT = 0.20   # 创业板 / 科创板
+ST_BOARD_PRICE_LIMIT   = 0.05   # 主板 ST / *ST
+BJ_BOARD_PRICE_LIMIT   = 0.30   # 北交所
+
 # ===================== 北交所过滤配置 =====================
 BSE_STOCK_PREFIX = ('83', '87', '88')
 BSE_EXCHANGE_SUFFIX = 'BJ'
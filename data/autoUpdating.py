@@ -8,6 +8,7 @@
 2. stock_st_daily: 增量更新ST股票风险警示表
 3. kline_day     : 增量更新A股日线行情数据
 4. index_daily   : 增量更新核心指数日线数据 (000001.SH, 399001.SZ等)
+5. stock_limit_event : 由当日 kline_day 计算全市场涨跌停事件（涨停/触板/炸板/跌停/一字板）
 
 运行逻辑：
 - 每日 15:30 开始首次尝试
@@ -152,6 +153,21 @@ def update_kline_day_incremental(date_list: list) -> tuple:
     return True, total_affected, per_date_affected
 
 
+def update_limit_events(date_list: list) -> tuple:
+    """由已入库的 kline_day 计算涨跌停事件（辅助表，失败不影响整体成功判定）"""
+    logger.info("===== 更新 stock_limit_event 表 =====")
+    try:
+        total_affected = 0
+        for trade_date in date_list:
+            affected = cleaner.clean_and_insert_limit_events(trade_date=trade_date)
+            total_affected += affected if affected is not None else 0
+        logger.info(f"stock_limit_event 更新完成，累计入库 {total_affected} 行")
+        return True, total_affected
+    except Exception as e:
+        logger.error(f"stock_limit_event 更新失败：{e}", exc_info=True)
+        return False, 0
+
+
 def update_index_daily(last_date: str) -> tuple:
     """增量更新核心指数日线"""
     logger.info("===== 更新 index_daily 表 =====")
@@ -211,6 +227,7 @@ def _build_push_msg(
         f"  stock_st     : {affected.get('stock_st',    0):>6,} 行",
         f"  kline_day    : {affected.get('kline',       0):>6,} 行",
         f"  index_daily  : {affected.get('index',       0):>6,} 行",
+        f"  limit_event  : {affected.get('limit_event', 0):>6,} 行",
         f"  ─────────────────────",
         f"  合计         : {total:>6,} 行",
     ]
@@ -264,6 +281,7 @@ def startUpdating(retry_count: int = 1) -> tuple:
     success_flags["stock_st"],    affected["stock_st"]    = update_stock_st_incremental(last_date, current_date)
     success_flags["kline"], affected["kline"], per_date_kline = update_kline_day_incremental(inc_dates)
     success_flags["index"],       affected["index"]       = update_index_daily(last_date)
+    success_flags["limit_event"], affected["limit_event"] = update_limit_events(inc_dates)
 
     total = sum(affected.values())
     logger.info(f"各表入库行数：{affected}  合计：{total}")
@@ -10,6 +10,10 @@ import pandas as pd
 from data.data_fetcher import data_fetcher
 from utils.common_tools import auto_add_missing_table_columns
 from utils.common_tools import calc_15_years_date_range
+from utils.common_tools import (
+    LIMIT_EVENT_TABLE, LIMIT_EVENT_UP, build_limit_events, calc_limit_prices,
+    get_daily_kline_data, get_st_stock_codes, get_trade_dates,
+)
 from utils.db_utils import db
 from utils.log_utils import logger
 
@@ -53,6 +57,20 @@ _THROTTLE_MIN_INTERVAL  = 3.0       # 限流模式下每次 API 调用最小间
 _MIN_FETCH_MAX_RETRIES  = 10        # 单只股票最大 API 重试次数（超出后纳入聚合告警）
 
 
+# ── 涨跌停事件表 DDL（首次入库时自动建表）──────────────────────────────────
+_LIMIT_EVENT_DDL = f"""
+CREATE TABLE IF NOT EXISTS {LIMIT_EVENT_TABLE} (
+    ts_code      VARCHAR(9)        NOT NULL,
+    trade_date   DATE              NOT NULL,
+    up_limit     FLOAT             DEFAULT 0,
+    down_limit   FLOAT             DEFAULT 0,
+    event_flags  TINYINT UNSIGNED  NOT NULL DEFAULT 0 COMMENT '1涨停 2触板 4炸板 8跌停 16一字板',
+    PRIMARY KEY (ts_code, trade_date),
+    KEY idx_trade_date (trade_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+
 class TushareRateLimitAbort(Exception):
     """
     Tushare 分钟线接口严重限流或当日配额耗尽，触发当日历史补全中断。
@@ -342,8 +360,11 @@ class DataCleaner:
             logger.error(f"表{table_name}入库异常：{str(e)}", exc_info=True)
             return 0
 
-    def _clean_kline_day_data(self, raw_df: pd.DataFrame) -> pd.DataFrame:
-        """日K数据专属清洗（保留核心逻辑，删除上游已做的校验）"""
+    def _clean_kline_day_data(self, raw_df: pd.DataFrame, with_limit_prices: bool = True) -> pd.DataFrame:
+        """
+        日K数据专属清洗（保留核心逻辑，删除上游已做的校验）
+        :param with_limit_prices: 是否写入 limit_up / limit_down（前复权表价格非真实成交价，传 False）
+        """
         if raw_df.empty:
             logger.warning("原始日K数据为空，跳过清洗")
             return pd.DataFrame()
@@ -396,12 +417,50 @@ class DataCleaner:
         df_cleaned["reserved"] = df_cleaned["reserved"].fillna("").astype(str)
         df_cleaned = df_cleaned.drop_duplicates(subset=["ts_code", "trade_date"], keep="last")
 
+        # 6.1 涨跌停价入库（向量化一次算完，下游热路径直接读列，不再逐行计算）
+        if with_limit_prices and "pre_close" in df_cleaned.columns:
+            df_cleaned = self._fill_limit_prices(df_cleaned)
+
         # 7. 保留核心字段
         df_cleaned = df_cleaned[[col for col in core_fields if col in df_cleaned.columns]]
 
         logger.debug(f"日K数据清洗完成：原始{len(raw_df)}行 → 清洗后{len(df_cleaned)}行")
         return df_cleaned
 
+    def _fill_limit_prices(self, df: pd.DataFrame) -> pd.DataFrame:
+        """按板块 + ST 状态写入 limit_up / limit_down（ST 名单取 stock_risk_warning，需先于日线入库）"""
+        st_pairs = []
+        for date in df["trade_date"].unique():
+            st_pairs.extend((code, date) for code in get_st_stock_codes(date))
+        is_st = None
+        if st_pairs:
+            is_st = pd.MultiIndex.from_arrays([df["ts_code"], df["trade_date"]]).isin(st_pairs)
+        df = df.copy()
+        df["limit_up"], df["limit_down"] = calc_limit_prices(df["ts_code"], df["pre_close"], is_st)
+        return df
+
+    def backfill_kline_day_limit_prices(self, start_date: str, end_date: str, table_name: str = "kline_day") -> int:
+        """
+        历史 kline_day 回填 limit_up / limit_down（入库时未写入的旧数据，逐日一次全市场读写）
+        总是按当前涨跌幅口径重算并覆盖写（ON DUPLICATE KEY UPDATE），口径变更后重跑即可修正；
+        stock_limit_event 优先读 limit_up 列，需在本回填之后再用 clean_and_insert_limit_events 重算
+        :param start_date / end_date: YYYY-MM-DD
+        :return: 累计影响行数
+        """
+        total = 0
+        for date in get_trade_dates(start_date, end_date):
+            daily_df = get_daily_kline_data(date)
+            if daily_df.empty:
+                continue
+            daily_df["trade_date"] = pd.to_datetime(daily_df["trade_date"]).dt.strftime("%Y-%m-%d")
+            filled = self._fill_limit_prices(daily_df[["ts_code", "trade_date", "pre_close"]])
+            affected = db.batch_insert_df(
+                filled[["ts_code", "trade_date", "limit_up", "limit_down"]], table_name, ignore_duplicate=True
+            ) or 0
+            total += affected
+            logger.info(f"{date} kline_day 涨跌停价回填完成，影响行数：{affected}")
+        return total
+
     # def clean_and_insert_kline_day(self, table_name: str = "kline_day") -> Optional[int]:
     #     """全市场A股近15年日K数据清洗入库（优化：减少数据库查询次数）"""
     #     logger.info("===== 开始全市场A股日K数据清洗入库 =====")
@@ -860,7 +919,7 @@ class DataCleaner:
                     continue
 
                 # 3. 清洗+入库（复用原有逻辑，无修改）
-                cleaned_df = self._clean_kline_day_data(raw_df)
+                cleaned_df = self._clean_kline_day_data(raw_df, with_limit_prices=False)
                 final_df = self._align_df_with_db(cleaned_df, table_name)
                 if final_df.empty:
                     continue
@@ -1036,6 +1095,50 @@ class DataCleaner:
             logger.error(f"❌ stock_st数据入库失败：{str(e)}", exc_info=True)
             return None
 
+    def clean_and_insert_limit_events(
+            self,
+            trade_date: Optional[str] = None,
+            start_date: Optional[str] = None,
+            end_date: Optional[str] = None,
+    ) -> Optional[int]:
+        """
+        由已入库的 kline_day 计算全市场涨跌停事件并写入 stock_limit_event（须在 kline_day 入库后调用）
+        单日一次全市场查询 + 一次向量化计算；重复执行为覆盖写（ON DUPLICATE KEY UPDATE）
+        :param trade_date: 单日（YYYYMMDD / YYYY-MM-DD）；与 start_date/end_date 二选一（区间用于历史回填）
+        :return: 累计影响行数；建表失败返回 None
+        """
+        if trade_date:
+            dates = [trade_date]
+        elif start_date and end_date:
+            dates = get_trade_dates(
+                pd.to_datetime(start_date).strftime("%Y-%m-%d"),
+                pd.to_datetime(end_date).strftime("%Y-%m-%d"),
+            )
+        else:
+            logger.warning("涨跌停事件入库：未指定日期，跳过")
+            return 0
+
+        if db.execute(_LIMIT_EVENT_DDL) is None:
+            logger.error(f"{LIMIT_EVENT_TABLE} 建表失败，跳过涨跌停事件入库")
+            return None
+
+        total = 0
+        for date in dates:
+            daily_df = get_daily_kline_data(date)
+            if daily_df.empty:
+                logger.warning(f"{date} kline_day 无数据，跳过涨跌停事件计算")
+                continue
+            events = build_limit_events(daily_df, get_st_stock_codes(date))
+            events["trade_date"] = pd.to_datetime(events["trade_date"]).dt.strftime("%Y-%m-%d")
+            events["event_flags"] = events["event_flags"].astype(int)
+            affected = db.batch_insert_df(events, LIMIT_EVENT_TABLE, ignore_duplicate=True) or 0
+            total += affected
+            logger.info(
+                f"{date} 涨跌停事件入库 | 股票数: {len(events)} "
+                f"| 涨停: {int(((events['event_flags'] & LIMIT_EVENT_UP) > 0).sum())} | 影响行数: {affected}"
+            )
+        return total
+
 
 # 全局实例（保持不变，确保下游调用）
 data_cleaner = DataCleaner()
@@ -24,13 +24,17 @@
     market_macro  → MarketMacroFeature（涨跌停 + 连板 + 最强板块 + 指数，全局因子）
 """
 
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List
+from typing import Dict, List, Optional
+import numpy as np
 import pandas as pd
 
 from features.base_feature import BaseFeature
 from features.feature_registry import feature_registry, FeatureRegistry
 from features.data_bundle import FeatureDataBundle
+from features.profiler import FeatureProfiler, profile_stage
+from features.candidate_pool import CandidatePoolEngine
 from utils.log_utils import logger
 
 # ──────────────────────────────────────────────────────────────────────
@@ -61,7 +65,7 @@ from features.technical.ma_position_feature import MAPositionFeature       # noq
 from features.macro.market_macro_feature import MarketMacroFeature         # noqa: F401  # 市场宏观因子：涨跌停/连板/指数（全局因子）
 
 __all__ = [
-    "FeatureEngine", "FeatureDataBundle",
+    "FeatureEngine", "FeatureDataBundle", "FeatureProfiler", "CandidatePoolEngine",
     "SectorHeatFeature", "SectorStockFeature", "SEIFeature", "MAPositionFeature",
     "MarketMacroFeature",
     "feature_registry",
@@ -74,9 +78,14 @@ class FeatureEngine:
 
     :param feature_name_list: 指定因子名称列表，None 则运行全部已注册因子
                                可用值：sei_emotion, sector_heat, sector_stock
+    :param profiler: 可选 FeatureProfiler；开启后各因子串行执行，逐因子记录耗时 / 内存 / 行数 / NaN 占比
     """
 
-    def __init__(self, feature_name_list: List[str] = None):
+    def __init__(self, feature_name_list: List[str] = None, profiler: FeatureProfiler = None):
+        self.profiler = profiler
+        # 运行中观察到的日级全局列（全局级因子的标量广播列，按首次出现顺序），供训练集存储拆分
+        self._global_columns: Dict[str, None] = {}
+        self._global_lock = threading.Lock()
         if feature_name_list is None:
             self.features = feature_registry.get_all_features()
         else:
@@ -86,22 +95,39 @@ class FeatureEngine:
             f"[FeatureEngine] 初始化完成，已加载：{[f.feature_name for f in self.features]}"
         )
 
-    def run_single_date(self, data_bundle: FeatureDataBundle) -> pd.DataFrame:
-        """
-        单日全量特征计算（多线程并行调度各因子）
+    @property
+    def global_columns(self) -> List[str]:
+        """已组装过的日级全局列（同一日所有候选股取值相同，如 adapt_score / 市场宏观因子）"""
+        with self._global_lock:
+            return list(self._global_columns)
 
-        :param data_bundle: 预加载的数据容器（只读，线程安全）
-        :return: stock_code + trade_date 为主键的特征 DataFrame
+    def feature_versions(self) -> Dict[str, str]:
+        """当前各因子口径版本 {因子名: feature_version}（训练集分区按此判断哪些因子需要重算）"""
+        return {f.feature_name: f.feature_version for f in self.features}
+
+    def run_features(self, data_bundle: FeatureDataBundle,
+                     feature_names: Optional[List[str]] = None) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        运行指定因子（多线程并行调度），返回各因子原始输出，不做组装
+        :param feature_names: 因子名列表（feature_name），None = 全部
+        :return: {feature_name: feature_df}（空结果的因子不含在内）；任一因子异常返回 None
         """
         trade_date = data_bundle.trade_date
-        stock_dfs: List[pd.DataFrame] = []   # 含 stock_code（个股级）
-        global_dfs: List[pd.DataFrame] = []  # 不含 stock_code（全局级，如 adapt_score）
+        features   = [f for f in self.features if feature_names is None or f.feature_name in feature_names]
+        results: dict = {}   # {feature_name: feature_df}
 
         def _run_one(feature):
-            return feature.feature_name, feature.calculate(data_bundle)
-
-        with ThreadPoolExecutor(max_workers=len(self.features)) as pool:
-            futures = {pool.submit(_run_one, f): f for f in self.features}
+            with profile_stage(self.profiler, trade_date, feature.feature_name,
+                               rows_in=len(data_bundle.target_ts_codes)) as record:
+                output = feature.calculate(data_bundle)
+                if self.profiler is not None:
+                    self.profiler.record_frame(record, output[0])
+            return feature.feature_name, output
+
+        # 剖析模式下串行执行，保证进程级 CPU / 内存增量可归因到单个因子
+        max_workers = 1 if self.profiler is not None else max(len(features), 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(_run_one, f): f for f in features}
             for fut in as_completed(futures):
                 feature = futures[fut]
                 try:
@@ -109,30 +135,100 @@ class FeatureEngine:
                     if feature_df.empty:
                         self.logger.warning(f"[FeatureEngine] {name} 返回空 DataFrame，跳过")
                         continue
-                    if "stock_code" in feature_df.columns:
-                        stock_dfs.append(feature_df)
-                    else:
-                        global_dfs.append(feature_df)
+                    results[name] = feature_df
                 except Exception as e:
                     self.logger.error(f"[FeatureEngine] {feature.feature_name} 失败：{e}", exc_info=True)
-                    return pd.DataFrame()
+                    return None
+        return results
 
-        if not stock_dfs:
-            self.logger.warning(f"[FeatureEngine] {trade_date} 无个股级特征数据")
+    def run_single_date(self, data_bundle: FeatureDataBundle) -> pd.DataFrame:
+        """
+        单日全量特征计算（多线程并行调度各因子）
+
+        :param data_bundle: 预加载的数据容器（只读，线程安全）
+        :return: stock_code + trade_date 为主键的特征 DataFrame
+        """
+        trade_date = data_bundle.trade_date
+        results    = self.run_features(data_bundle)
+        if results is None:
             return pd.DataFrame()
 
-        # 个股级 inner join（保证所有特征均有值）
-        full_df = stock_dfs[0]
-        for df in stock_dfs[1:]:
-            full_df = pd.merge(full_df, df, on=["stock_code", "trade_date"], how="inner")
+        # 按注册顺序（而非完成顺序）组装，保证列顺序稳定
+        stock_dfs: List[tuple] = []    # 含 stock_code（个股级）
+        global_dfs: List[tuple] = []   # 不含 stock_code（全局级，如 adapt_score）
+        for feature in self.features:
+            feature_df = results.get(feature.feature_name)
+            if feature_df is None:
+                continue
+            if "stock_code" in feature_df.columns:
+                stock_dfs.append((feature.feature_name, feature_df))
+            else:
+                global_dfs.append((feature.feature_name, feature_df))
 
-        # 全局级 left join（广播到所有行），修复原有 merge 逻辑 bug：
-        # 原代码在 stock_dfs[0] 无 stock_code 时会产生笛卡尔积
-        for df in global_dfs:
-            full_df = pd.merge(full_df, df, on=["trade_date"], how="left")
+        if not stock_dfs:
+            self.logger.warning(f"[FeatureEngine] {trade_date} 无个股级特征数据")
+            return pd.DataFrame()
 
-        full_df = full_df.loc[:, ~full_df.columns.duplicated()]
+        with profile_stage(self.profiler, trade_date, "assemble", kind="engine") as record:
+            full_df = self._assemble_aligned(trade_date, stock_dfs, global_dfs)
+            if self.profiler is not None:
+                self.profiler.record_frame(record, full_df)
         self.logger.info(
             f"[FeatureEngine] {trade_date} 合并完成 | 行:{len(full_df)} | 列:{len(full_df.columns)}"
         )
-        return full_df
\ No newline at end of file
+        return full_df
+
+    def _assemble_aligned(self, trade_date: str, stock_dfs: List[tuple], global_dfs: List[tuple]) -> pd.DataFrame:
+        """
+        零 merge 对齐组装：
+          - 以第一个个股级特征的行作为固定候选索引（行顺序即最终行顺序）
+          - 其余个股级特征按 (stock_code, trade_date) 定位到候选索引，缺失行记入行掩码
+            （等价于原先的逐个 inner join，但不再每次复制整张宽表）
+          - 全局级特征取当日那一行，以标量广播为列块（等价于原先的 left join on trade_date）
+          - 所有列块一次 pd.concat(axis=1) 生成最终宽表；同名列保留先出现者
+        """
+        key_cols = ["stock_code", "trade_date"]
+        anchor_name, anchor_df = stock_dfs[0]
+        anchor_df  = anchor_df.reset_index(drop=True)
+        anchor_idx = pd.MultiIndex.from_frame(anchor_df[key_cols])
+        n_rows     = len(anchor_df)
+
+        row_mask  = np.ones(n_rows, dtype=bool)
+        seen_cols = set(anchor_df.columns)
+        aligned   = []   # [(列子集 DataFrame, 行位置数组)]
+        for name, df in stock_dfs[1:]:
+            df_idx = pd.MultiIndex.from_frame(df[key_cols])
+            if not df_idx.is_unique:
+                dup_cnt = int(df_idx.duplicated().sum())
+                self.logger.warning(f"[FeatureEngine] {name} 存在 {dup_cnt} 条重复主键，保留首条")
+                df     = df[~df_idx.duplicated()]
+                df_idx = pd.MultiIndex.from_frame(df[key_cols])
+            pos = df_idx.get_indexer(anchor_idx)
+            row_mask &= pos >= 0
+            cols = [c for c in df.columns if c not in seen_cols]
+            seen_cols.update(cols)
+            if cols:
+                aligned.append((df[cols], pos))
+
+        keep   = np.flatnonzero(row_mask)
+        blocks = [anchor_df.iloc[keep].reset_index(drop=True)]
+        for df, pos in aligned:
+            blocks.append(df.iloc[pos[keep]].reset_index(drop=True))
+
+        # 全局级：标量广播（当日无对应行时填 NaN，与 left join 语义一致）
+        scalars = {}
+        for name, df in global_dfs:
+            day_rows = df[df["trade_date"] == trade_date] if "trade_date" in df.columns else df
+            for col in df.columns:
+                if col in seen_cols or col in scalars:
+                    continue
+                scalars[col] = day_rows[col].iloc[0] if not day_rows.empty else np.nan
+        if scalars:
+            blocks.append(pd.DataFrame(scalars, index=pd.RangeIndex(len(keep))))
+            with self._global_lock:
+                self._global_columns.update(dict.fromkeys(scalars))
+
+        dropped = n_rows - len(keep)
+        if dropped:
+            self.logger.debug(f"[FeatureEngine] {trade_date} 行掩码剔除 {dropped} 行（{anchor_name} 以外特征缺失）")
+        return pd.concat(blocks, axis=1)
@@ -6,6 +6,12 @@ from  utils.log_utils import logger
 
 
 class BaseFeature(ABC):
+    # 因子口径版本：修改本因子的计算逻辑 / 输出列时递增，
+    # dataset.py 据此只重算该因子并把新列拼接进已有训练集分区（无需更新全局 FACTOR_VERSION）
+    feature_version = "v1"
+    # 是否依赖分钟线（FeatureDataBundle.minute_cache）；增量重算时仅在需要时加载分钟线
+    requires_minute = False
+
     def __init__(self, data_api=None):
         self.data_api = data_api
         self.feature_name = self.__class__.__name__
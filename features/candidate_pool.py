@@ -0,0 +1,192 @@
+"""
+板块候选池引擎 (CandidatePoolEngine)
+====================================
+训练集生成（learnEngine/dataset.py）与实盘推断（SectorHeatStrategy）共用同一候选池构建，
+保证两端候选股完全一致。
+
+原方式：逐板块 get_stocks_in_sector（1 次 SQL/板块）→ filter_st_stocks（1 次 SQL/板块）
+        → 涨停基因（逐板块）→ D 日封板 iterrows → 低流动性
+现方式：所有过滤条件都是"股票级"属性，与所属板块无关，故先在全市场 D 日日线上
+        一次性算出布尔掩码，再按概念索引切分到各板块：
+
+    概念索引（stock_basic.concept_tags 展开，进程级缓存）
+      × 板块过滤（北交所 / 科创 / 创业板，可配置）
+      × 非 ST（stock_risk_warning 当日名单，1 次查询）
+      × D 日有日线
+      × 近 N 日涨停基因（check_limit_up_gene，全部板块并集 1 次）
+      × D 日未涨停封板（limit_up 列，向量化）
+      × 成交额 ≥ MIN_AMOUNT_THRESHOLD
+
+输出与原逐板块流程相同：{板块: 该板块候选股的 D 日日线（保持 daily_df 行顺序）} + 去重候选列表
+"""
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.config import FILTER_BSE_STOCK, FILTER_STAR_BOARD, FILTER_688_BOARD
+from utils.common_tools import attach_limit_prices, check_limit_up_gene, get_st_stock_codes
+from utils.db_utils import db
+from utils.log_utils import logger
+
+# 低流动性过滤阈值（成交额，tushare amount 单位为千元）
+MIN_AMOUNT_THRESHOLD = 10000  # 1000万元 = 10000千元
+# 涨停基因回溯交易日数
+GENE_LOOKBACK_DAYS = 10
+# D 日封板判定容差（limit_up 为交易所真实涨停价；close ≥ 涨停价 - 0.01 视为封板，尾盘买不进去）
+_SEALED_TOL = 0.01
+
+# ── 概念索引进程级缓存（stock_basic.concept_tags 展开为 (ts_code, concept) 长表）──
+# 概念标签更新频率低（data/conceptTag_get.py 手动刷新），缓存按加载自然日失效：
+# 常驻进程跨日后首次调用自动重载，同日内刷新标签后可手动 clear_concept_index_cache()
+_CONCEPT_INDEX: Dict[str, object] = {}     # {"index": DataFrame, "loaded_on": YYYY-MM-DD}
+_CONCEPT_INDEX_LOCK = threading.Lock()
+
+
+def clear_concept_index_cache():
+    """清空概念索引缓存（概念标签更新后 / 测试时调用）"""
+    with _CONCEPT_INDEX_LOCK:
+        _CONCEPT_INDEX.clear()
+
+
+def get_concept_index() -> pd.DataFrame:
+    """
+    概念 → 成分股长表 DataFrame[ts_code, concept]（一次全表查询，进程内当日复用，跨日自动重载）
+    按逗号精确切分，与 get_stocks_in_sector 的 FIND_IN_SET 匹配口径一致
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    with _CONCEPT_INDEX_LOCK:
+        if _CONCEPT_INDEX.get("loaded_on") == today:
+            return _CONCEPT_INDEX["index"]
+
+    rows = db.query("SELECT ts_code, concept_tags FROM stock_basic WHERE concept_tags IS NOT NULL", return_df=True)
+    if rows is None or rows.empty:
+        # 抛出而非返回空表：空候选池会被当作"当日无候选"写入训练集 / 打分存储
+        raise RuntimeError("[CandidatePool] 概念索引加载失败（stock_basic 无数据或查询异常）")
+
+    index = (
+        rows.assign(concept=rows["concept_tags"].astype(str).str.split(","))
+            .explode("concept")[["ts_code", "concept"]]
+    )
+    index = index[index["concept"] != ""].drop_duplicates().reset_index(drop=True)
+    with _CONCEPT_INDEX_LOCK:
+        _CONCEPT_INDEX.update(index=index, loaded_on=today)
+    logger.info(f"[CandidatePool] 概念索引加载完成 | 股票数:{rows['ts_code'].nunique()} | 映射行数:{len(index)}")
+    return index
+
+
+def board_allowed_mask(ts_codes: pd.Series) -> np.ndarray:
+    """板块过滤（北交所 / 科创板 / 创业板，按 config 开关）的向量化版本"""
+    codes = ts_codes.astype(str)
+    mask = codes.str.len() > 0
+    if FILTER_BSE_STOCK:
+        mask &= ~(codes.str.endswith(".BJ") | codes.str.startswith(("83", "87", "88")))
+    if FILTER_688_BOARD:
+        mask &= ~codes.str.startswith("688")
+    if FILTER_STAR_BOARD:
+        mask &= ~(codes.str.startswith(("300", "301", "302")) & codes.str.endswith(".SZ"))
+    return mask.to_numpy()
+
+
+class CandidatePoolEngine:
+    """
+    Top3 板块候选池构建（训练 / 推断共用）
+
+    :param gene_days:  涨停基因回溯交易日数
+    :param min_amount: 成交额下限（千元）
+    """
+
+    def __init__(self, gene_days: int = GENE_LOOKBACK_DAYS, min_amount: float = MIN_AMOUNT_THRESHOLD):
+        self.gene_days  = gene_days
+        self.min_amount = min_amount
+
+    def build(
+        self,
+        trade_date: str,
+        daily_df: pd.DataFrame,
+        sectors: List[str],
+    ) -> Tuple[Dict[str, pd.DataFrame], List[str]]:
+        """
+        :param trade_date: D 日（YYYY-MM-DD）
+        :param daily_df:   D 日全市场日线（get_daily_kline_data）
+        :param sectors:    板块名称列表（Top3）
+        :return: (sector_candidate_map, target_ts_codes)；无候选的板块对应空 DataFrame
+        :raises RuntimeError: 概念索引 / ST 名单查询失败（调用方按失败处理，不当作空候选池）
+        """
+        sector_candidate_map: Dict[str, pd.DataFrame] = {s: pd.DataFrame() for s in sectors}
+        if not sectors or daily_df is None or daily_df.empty:
+            return sector_candidate_map, []
+
+        # ---- 1. 板块成员（概念索引，一次 isin）----
+        # 概念索引 / ST 名单是全局依赖，失败直接抛出；单个板块的异常只清空该板块，不影响其余板块
+        concept_index = get_concept_index()
+        sector_members: Dict[str, pd.Index] = {}
+        for sector in sectors:
+            try:
+                sector_members[sector] = pd.Index(
+                    concept_index.loc[concept_index["concept"] == str(sector).strip(), "ts_code"].unique()
+                )
+            except Exception as e:
+                logger.error(f"[{sector}] 板块成员解析失败，该板块候选池置空：{e}")
+        member_codes = pd.Index(
+            np.unique(np.concatenate([m.to_numpy() for m in sector_members.values()]))
+        ) if sector_members else pd.Index([])
+
+        # ---- 2. 股票级掩码（全部在 D 日全市场日线上计算）----
+        codes = daily_df["ts_code"]
+        stage_counts = {"成员": len(member_codes)}
+
+        mask = codes.isin(member_codes).to_numpy()
+        mask &= board_allowed_mask(codes)
+        stage_counts["板块过滤"] = int(mask.sum())
+
+        st_codes = set(get_st_stock_codes(trade_date, strict=True))
+        mask &= ~codes.isin(st_codes).to_numpy()
+        stage_counts["非ST"] = int(mask.sum())
+
+        # 涨停基因：所有板块候选的并集一次判断（基因是股票级属性，与板块无关）
+        gene_pool = codes[mask].unique().tolist()
+        if gene_pool:
+            try:
+                gene_map = check_limit_up_gene(gene_pool, trade_date, day_count=self.gene_days)
+                mask &= codes.map(gene_map).fillna(False).astype(bool).to_numpy()
+            except Exception as e:
+                # 与 check_limit_up_gene 的保守逻辑一致：判断失败时不过滤（不误删股票）
+                logger.error(f"[CandidatePool] {trade_date} 涨停基因判断失败，跳过该过滤：{e}")
+        stage_counts["涨停基因"] = int(mask.sum())
+
+        # D 日涨停封板（价格数据异常时保守保留）
+        limit_up  = attach_limit_prices(daily_df, st_codes)["limit_up"].to_numpy()
+        pre_close = pd.to_numeric(daily_df["pre_close"], errors="coerce").to_numpy()
+        close     = pd.to_numeric(daily_df["close"], errors="coerce").to_numpy()
+        abnormal  = ~(pre_close > 0) | ~(close > 0)
+        sealed    = (limit_up > 0) & (close >= limit_up - _SEALED_TOL)
+        mask &= abnormal | ~sealed
+        stage_counts["非封板"] = int(mask.sum())
+
+        if "amount" in daily_df.columns:
+            mask &= (pd.to_numeric(daily_df["amount"], errors="coerce") >= self.min_amount).to_numpy()
+        stage_counts["流动性"] = int(mask.sum())
+
+        # ---- 3. 按板块切分（保持 daily_df 行顺序）----
+        eligible = daily_df[mask]
+        for sector, sector_codes in sector_members.items():
+            try:
+                sector_daily = eligible[eligible["ts_code"].isin(sector_codes)]
+                if not sector_daily.empty:
+                    sector_candidate_map[sector] = sector_daily.copy()
+                logger.info(f"[{sector}] 最终候选股: {len(sector_daily)}")
+            except Exception as e:
+                logger.error(f"[{sector}] 候选股切分失败，该板块候选池置空：{e}")
+
+        target_ts_codes = list(dict.fromkeys(
+            ts for df in sector_candidate_map.values() if not df.empty for ts in df["ts_code"].tolist()
+        ))
+        logger.info(
+            f"[CandidatePool] {trade_date} | "
+            + " → ".join(f"{k}:{v}" for k, v in stage_counts.items())
+            + f" | 去重候选:{len(target_ts_codes)}"
+        )
+        return sector_candidate_map, target_ts_codes
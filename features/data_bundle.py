@@ -4,24 +4,34 @@
 设计原则：
     1. 由外部（dataset.py）在特征计算前统一构建，所有因子类共享同一份数据
     2. 日线 / 分钟线各只发起一次 IO，因子内部禁止再自行拉数据
+       （由 BundlePrefetchPlanner 统一规划为分块区间查询，有界并发执行）
     3. load_minute=False 可跳过分钟线加载，适用于纯日线因子调试场景
 """
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Set
 import pandas as pd
 
 from utils.common_tools import (
-    get_trade_dates, get_daily_kline_data, get_qfq_kline_data,
+    get_trade_dates,
     get_limit_list_ths, get_limit_step, get_limit_cpt_list, get_index_daily,
-    get_market_total_volume,
+    get_market_total_volume, get_st_stock_pairs,
 )
 from data.data_cleaner import data_cleaner
+from features.prefetch_planner import BundlePrefetchPlanner
+from features.profiler import FeatureProfiler, profile_stage
 from utils.log_utils import logger
 
 # 并发加载线程数（IO 密集型，可设较大值）
 _IO_WORKERS = 8
 
+# 进程级宏观历史缓存（仅缓存 D 日之前且有数据的日期，历史数据不再变化）
+# 区间跑批时相邻交易日的 5 日窗口重叠 4 天，d1~d4 指标直接复用
+_HIST_MACRO_CACHE: Dict[str, tuple] = {}    # {date: (涨停数, 最高连板数)}
+_MARKET_VOL_CACHE: Dict[str, float] = {}    # {yyyymmdd: 全市场成交额}
+_MACRO_CACHE_LOCK = threading.Lock()
+
 
 class FeatureDataBundle:
     """
@@ -35,13 +45,18 @@ class FeatureDataBundle:
         adapt_score         : 板块轮动分（0-100），由 dataset.py 调用板块热度后传入，
                               避免 FeatureEngine 内重复调用 select_top3_hot_sectors
         load_minute         : 是否加载分钟线（默认 True），不需要 SEI 时可设 False 提速
+        profiler            : 可选 FeatureProfiler，记录各加载阶段耗时 / 内存 / 行数
 
     预加载属性（构造后即可使用）：
         lookback_dates_5d   : 含 D 日在内的最近 5 个交易日列表
         lookback_dates_20d  : 含 D 日在内的最近 20 个交易日列表
+        gain_base_date_20d  : 近 20 日涨幅的基准日（前第 21 个交易日，对齐 sort_by_recent_gain），
+                              其日线一并载入 daily_grouped；交易日不足时为空串
         daily_grouped       : dict，key=(ts_code, trade_date)，value=该行日线数据 dict
                               O(1) 查找，是所有因子计算的核心加速手段
         minute_cache        : dict，key=(ts_code, trade_date)，value=分钟线 DataFrame
+        st_pairs            : set，回溯窗口内的 ST (ts_code, trade_date)，涨跌停价补算按日判断 ST
+        prefetch_report     : 预取报告（每张表的查询次数 / 计划与实际 (股票, 日期) 数 / 行数 / 耗时）
         macro_cache         : dict，预加载的宏观数据（涨跌停池/连板/最强板块/指数日线）
     """
 
@@ -53,6 +68,7 @@ class FeatureDataBundle:
             top3_sectors: List[str],
             adapt_score: float = 0.0,
             load_minute: bool = True,
+            profiler: FeatureProfiler = None,
     ):
         self.trade_date = trade_date
         self.target_ts_codes = target_ts_codes
@@ -62,17 +78,42 @@ class FeatureDataBundle:
 
         self.lookback_dates_5d: List[str] = []
         self.lookback_dates_20d: List[str] = []
+        self.gain_base_date_20d: str = ""
         self.daily_grouped: Dict[tuple, dict] = {}
         self.qfq_daily_grouped: Dict[tuple, dict] = {}   # 前复权日线，MA 计算专用
         self.minute_cache: Dict[tuple, pd.DataFrame] = {}
+        self.st_pairs: Set[tuple] = set()
         self.macro_cache: Dict[str, pd.DataFrame] = {}
-
-        self._load_trade_dates()
-        self._load_daily_data()
-        self._load_qfq_data()
-        self._load_macro_data()
+        self.prefetch_report: pd.DataFrame = pd.DataFrame()   # 预取计划 vs 实际
+        self._prefetched: Dict[str, pd.DataFrame] = {}
+
+        self.profiler = profiler
+
+        n_codes = len(target_ts_codes)
+        with profile_stage(profiler, trade_date, "trade_dates", kind="bundle"):
+            self._load_trade_dates()
+        with profile_stage(profiler, trade_date, "prefetch", kind="bundle", rows_in=n_codes) as rec:
+            self._prefetch(load_minute)
+            rec["rows_out"] = sum(len(df) for df in self._prefetched.values())
+        with profile_stage(profiler, trade_date, "daily", kind="bundle", rows_in=n_codes) as rec:
+            self._load_daily_data()
+            rec["rows_out"] = len(self.daily_grouped)
+        with profile_stage(profiler, trade_date, "st", kind="bundle") as rec:
+            self.st_pairs = get_st_stock_pairs(self.lookback_dates_20d)
+            rec["rows_out"] = len(self.st_pairs)
+        with profile_stage(profiler, trade_date, "qfq", kind="bundle", rows_in=n_codes) as rec:
+            self._load_qfq_data()
+            rec["rows_out"] = len(self.qfq_daily_grouped)
+        with profile_stage(profiler, trade_date, "macro", kind="bundle"):
+            self._load_macro_data()
         if load_minute:
-            self._load_minute_data()
+            with profile_stage(profiler, trade_date, "minute", kind="bundle", rows_in=n_codes) as rec:
+                self._load_minute_data()
+                rec["rows_out"] = len(self.minute_cache)
+
+    def is_st(self, ts_code: str, trade_date: str) -> bool:
+        """该股在 trade_date 是否 ST（get_row_limit_prices 补算涨跌停价用）"""
+        return (ts_code, trade_date) in self.st_pairs
 
     def _load_trade_dates(self):
         try:
@@ -81,61 +122,50 @@ class FeatureDataBundle:
             self.lookback_dates_5d = get_trade_dates(start_5d, self.trade_date)[-5:]
             start_20d = (d_date - timedelta(days=40)).strftime("%Y-%m-%d")
             self.lookback_dates_20d = get_trade_dates(start_20d, self.trade_date)[-20:]
+            # 近20日涨幅基准日：与 sort_by_recent_gain 相同，回溯 60 天取前第 21 个交易日
+            start_gain = (d_date - timedelta(days=60)).strftime("%Y-%m-%d")
+            gain_dates = get_trade_dates(start_gain, self.trade_date)
+            self.gain_base_date_20d = gain_dates[-21] if len(gain_dates) >= 21 else ""
             logger.info(f"[DataBundle] {self.trade_date} 交易日加载完成 | 5日: {self.lookback_dates_5d}")
         except Exception as e:
             logger.error(f"[DataBundle] 交易日加载失败：{e}")
             raise
 
-    def _load_daily_data(self):
-        """批量加载日线（仅查候选股，多线程并发拉取各日期数据）"""
-        try:
-            all_dates = list(set(self.lookback_dates_5d + self.lookback_dates_20d))
+    def _prefetch(self, load_minute: bool):
+        """汇总日线 / 前复权 / 分钟线 DB 需求，一次规划、有界并发执行"""
+        dates_20d = list(set(self.lookback_dates_5d + self.lookback_dates_20d))
+        daily_dates = dates_20d + ([self.gain_base_date_20d] if self.gain_base_date_20d else [])
 
-            def _fetch_one(date):
-                df = get_daily_kline_data(trade_date=date, ts_code_list=self.target_ts_codes)
-                if not df.empty:
-                    df["trade_date"] = df["trade_date"].astype(str)
-                return df
+        planner = BundlePrefetchPlanner(self.target_ts_codes)
+        planner.add_table("kline_day", daily_dates)
+        planner.add_table("kline_day_qfq", dates_20d)
+        if load_minute:
+            planner.add_table("kline_min", self.lookback_dates_5d)
+        self._prefetched = planner.execute()
+        self.prefetch_report = planner.report()
+        planner.log_report(self.trade_date)
 
-            frames = []
-            with ThreadPoolExecutor(max_workers=_IO_WORKERS) as pool:
-                futures = {pool.submit(_fetch_one, d): d for d in all_dates}
-                for fut in as_completed(futures):
-                    df = fut.result()
-                    if not df.empty:
-                        frames.append(df)
-
-            if frames:
-                all_df = pd.concat(frames, ignore_index=True)
+    def _load_daily_data(self):
+        """日线（仅候选股，含近20日涨幅基准日），来自预取结果"""
+        try:
+            all_df = self._prefetched.get("kline_day", pd.DataFrame())
+            if not all_df.empty:
                 self.daily_grouped = (
                     all_df.groupby(["ts_code", "trade_date"]).first().to_dict(orient="index")
                 )
-            logger.info(f"[DataBundle] 日线加载完成 | 日期数:{len(all_dates)} | 记录数:{len(self.daily_grouped)}")
+            logger.info(
+                f"[DataBundle] 日线加载完成 | 日期数:{all_df['trade_date'].nunique() if not all_df.empty else 0}"
+                f" | 记录数:{len(self.daily_grouped)}"
+            )
         except Exception as e:
             logger.error(f"[DataBundle] 日线数据加载失败：{e}")
             raise
 
     def _load_qfq_data(self):
-        """批量加载前复权日线（MA 计算专用，与 daily_grouped 结构相同）"""
+        """前复权日线（MA 计算专用，与 daily_grouped 结构相同），来自预取结果"""
         try:
-            all_dates = list(set(self.lookback_dates_5d + self.lookback_dates_20d))
-
-            def _fetch_one(date):
-                df = get_qfq_kline_data(trade_date=date, ts_code_list=self.target_ts_codes)
-                if not df.empty:
-                    df["trade_date"] = df["trade_date"].astype(str)
-                return df
-
-            frames = []
-            with ThreadPoolExecutor(max_workers=_IO_WORKERS) as pool:
-                futures = {pool.submit(_fetch_one, d): d for d in all_dates}
-                for fut in as_completed(futures):
-                    df = fut.result()
-                    if not df.empty:
-                        frames.append(df)
-
-            if frames:
-                all_df = pd.concat(frames, ignore_index=True)
+            all_df = self._prefetched.get("kline_day_qfq", pd.DataFrame())
+            if not all_df.empty:
                 self.qfq_daily_grouped = (
                     all_df.groupby(["ts_code", "trade_date"]).first().to_dict(orient="index")
                 )
@@ -215,7 +245,7 @@ class FeatureDataBundle:
             self.macro_cache["index_df"] = index_df
 
             # ── 全市场成交量（kline_day 聚合，依赖 kline_day 已落库）──────────
-            self.macro_cache["market_vol_df"] = get_market_total_volume(self.lookback_dates_5d)
+            self.macro_cache["market_vol_df"] = self._load_market_vol()
 
             # ── 5日历史涨停数量 / 最大连板数（d1-d4，用于派生趋势因子）────────
             # d0 已有完整数据，直接从已加载结果读取；d1-d4 并发查询历史
@@ -231,6 +261,10 @@ class FeatureDataBundle:
             hist_dates = self.lookback_dates_5d[:-1]   # d1~d4（不含d0）
 
             def _fetch_hist_macro(date):
+                with _MACRO_CACHE_LOCK:
+                    cached = _HIST_MACRO_CACHE.get(date)
+                if cached is not None:
+                    return (date, *cached)
                 up_df_h   = get_limit_list_ths(date, limit_type="涨停池")
                 step_df_h = get_limit_step(date)
                 # 同 d0 一样：DB 无数据时尝试接口补拉，保证历史趋势因子有效
@@ -255,6 +289,9 @@ class FeatureDataBundle:
                 if not step_df_h.empty and "nums" in step_df_h.columns:
                     _n = pd.to_numeric(step_df_h["nums"], errors="coerce").dropna()
                     max_c = int(_n.max()) if len(_n) > 0 else 0
+                if up_cnt > 0:
+                    with _MACRO_CACHE_LOCK:
+                        _HIST_MACRO_CACHE[date] = (up_cnt, max_c)
                 return date, up_cnt, max_c
 
             if hist_dates:
@@ -278,13 +315,55 @@ class FeatureDataBundle:
         except Exception as e:
             logger.warning(f"[DataBundle] 宏观数据加载异常（非致命）：{str(e)[:120]}")
 
+    def _load_market_vol(self) -> pd.DataFrame:
+        """
+        近 5 日全市场成交额：D 日之前的日期优先读进程级缓存，仅对未缓存日期发起聚合查询
+        :return: DataFrame，列：trade_date(yyyymmdd), market_total_vol
+        """
+        td_fmt  = self.trade_date.replace("-", "")
+        with _MACRO_CACHE_LOCK:
+            cached = {
+                d.replace("-", ""): _MARKET_VOL_CACHE[d.replace("-", "")]
+                for d in self.lookback_dates_5d
+                if d.replace("-", "") in _MARKET_VOL_CACHE
+            }
+        missing = [d for d in self.lookback_dates_5d if d.replace("-", "") not in cached]
+
+        fresh_df = get_market_total_volume(missing) if missing else pd.DataFrame()
+        frames = []
+        if cached:
+            frames.append(pd.DataFrame({
+                "trade_date":       list(cached.keys()),
+                "market_total_vol": list(cached.values()),
+            }))
+        if fresh_df is not None and not fresh_df.empty:
+            frames.append(fresh_df)
+            with _MACRO_CACHE_LOCK:
+                for d, v in zip(fresh_df["trade_date"], fresh_df["market_total_vol"]):
+                    d_fmt = str(d).replace("-", "")
+                    if d_fmt < td_fmt and v:
+                        _MARKET_VOL_CACHE[d_fmt] = v
+        if not frames:
+            return pd.DataFrame(columns=["trade_date", "market_total_vol"])
+        return pd.concat(frames, ignore_index=True)
+
     def _load_minute_data(self):
-        """加载候选股近 5 日分钟线（多线程并发，HDI/SEI 因子必需）"""
+        """
+        加载候选股近 5 日分钟线（HDI/SEI 因子必需）
+        DB 已缓存的部分来自预取批量查询；仅未命中的 (股票, 日期) 走 data_cleaner 的 DB → API → DB 补拉
+        """
         try:
+            minute_df = self._prefetched.get("kline_min", pd.DataFrame())
+            if not minute_df.empty:
+                for key, df in minute_df.groupby(["ts_code", "trade_date"], sort=False):
+                    self.minute_cache[key] = df.reset_index(drop=True)
+            hit_cnt = len(self.minute_cache)
+
             tasks = [
                 (ts_code, date)
                 for ts_code in self.target_ts_codes
                 for date in self.lookback_dates_5d
+                if (ts_code, date) not in self.minute_cache
             ]
 
             def _fetch_one(pair):
@@ -295,6 +374,9 @@ class FeatureDataBundle:
                 for (ts_code, date), df in pool.map(_fetch_one, tasks):
                     self.minute_cache[(ts_code, date)] = df
 
-            logger.info(f"[DataBundle] 分钟线加载完成 | 记录数:{len(self.minute_cache)}")
+            logger.info(
+                f"[DataBundle] 分钟线加载完成 | 记录数:{len(self.minute_cache)}"
+                f" | DB批量命中:{hit_cnt} | 逐只补拉:{len(tasks)}"
+            )
         except Exception as e:
-            logger.warning(f"[DataBundle] 分钟线加载异常（非致命）：{str(e)[:120]}")
\ No newline at end of file
+            logger.warning(f"[DataBundle] 分钟线加载异常（非致命）：{str(e)[:120]}")
@@ -46,7 +46,7 @@ import numpy as np
 import pandas as pd
 
 from features.base_feature import BaseFeature
-from utils.common_tools import calc_limit_up_price, calc_limit_down_price
+from utils.common_tools import get_row_limit_prices
 
 
 # ============================================================
@@ -424,8 +424,8 @@ class SEIFeature(BaseFeature):
             if not pre_close or pre_close <= 0:
                 continue
             minute_df  = data_bundle.minute_cache.get(key, pd.DataFrame())
-            up_limit   = calc_limit_up_price(ts_code, pre_close)
-            down_limit = calc_limit_down_price(ts_code, pre_close)
+            up_limit, down_limit = get_row_limit_prices(
+                ts_code, daily_row, pre_close, data_bundle.is_st(ts_code, data_bundle.trade_date))
             hdi, facts = self._calculate_minute_hdi(minute_df, pre_close, up_limit, down_limit)
             if not facts:
                 facts = self.calc_daily_atomic(
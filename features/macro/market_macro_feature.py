@@ -34,6 +34,8 @@
     - 本模块输出全局级（无 stock_code），由 FeatureEngine 通过 left join 广播到所有个股行
     - 数据来源：limit_list_ths / limit_step / limit_cpt_list / index_daily 四张表
     - 依赖 data_bundle.macro_cache（由 FeatureDataBundle 在初始化时预加载）
+    - 成交量比率 / 趋势因子基于 日期 × 指标 矩阵整体计算（_build_macro_matrix），不再逐行 iterrows；
+      d1~d4 的历史指标由 FeatureDataBundle 进程级缓存，区间跑批时相邻日期直接复用
     - 后续可在此文件中继续新增其他宏观维度因子（如融资融券余额、北向资金等）
 """
 from typing import Dict
@@ -56,6 +58,15 @@ INDEX_CODES = {
 }
 
 
+# 日期 × 指标矩阵的列位置
+_COL_VOL, _COL_LIMIT_UP, _COL_CONSEC = 0, 1, 2
+
+
+def _to_float_or_zero(v) -> float:
+    """None / 0 → 0.0，其余转 float（NaN 保持 NaN，与逐行 float(v or 0) 一致）"""
+    return float(v or 0)
+
+
 @feature_registry.register("market_macro")
 class MarketMacroFeature(BaseFeature):
     """当日市场宏观因子"""
@@ -78,6 +89,32 @@ class MarketMacroFeature(BaseFeature):
         "market_limit_up_rate", "market_limit_up_5d_trend", "market_consec_5d_trend",
     ]
 
+    @staticmethod
+    def _build_macro_matrix(dates: list, macro_cache: dict) -> np.ndarray:
+        """
+        构建 日期 × 指标 矩阵（行序同 dates，列：全市场成交额 / 涨停数 / 最高连板数），缺失为 0
+        全市场成交额来自 market_vol_df；涨停数 / 最高连板来自 bundle 预加载的 5 日字典
+        """
+        mat = np.zeros((len(dates), 3), dtype=float)
+        if not dates:
+            return mat
+
+        market_vol_df = macro_cache.get("market_vol_df", pd.DataFrame())
+        if not market_vol_df.empty and "trade_date" in market_vol_df.columns:
+            vol_col = (market_vol_df["market_total_vol"] if "market_total_vol" in market_vol_df.columns
+                       else [0] * len(market_vol_df))
+            vol_map = dict(zip(
+                market_vol_df["trade_date"].astype(str).str.replace("-", "", regex=False),
+                map(_to_float_or_zero, vol_col),
+            ))
+            mat[:, _COL_VOL] = [vol_map.get(d.replace("-", ""), 0) for d in dates]
+
+        limit_up_counts_5d = macro_cache.get("limit_up_counts_5d", {})
+        consec_max_5d      = macro_cache.get("consec_max_5d", {})
+        mat[:, _COL_LIMIT_UP] = pd.Series(limit_up_counts_5d, dtype=float).reindex(dates).fillna(0).values
+        mat[:, _COL_CONSEC]   = pd.Series(consec_max_5d, dtype=float).reindex(dates).fillna(0).values
+        return mat
+
     def calculate(self, data_bundle) -> tuple:
         """
         从 data_bundle.macro_cache 读取预加载数据，计算宏观因子
@@ -121,68 +158,48 @@ class MarketMacroFeature(BaseFeature):
         # ========== 指数维度 ==========
         index_df = macro_cache.get("index_df", pd.DataFrame())
         if not index_df.empty and "ts_code" in index_df.columns:
-            idx_map = {r["ts_code"]: r.get("pct_chg", 0) for _, r in index_df.iterrows()}
+            pct = index_df["pct_chg"] if "pct_chg" in index_df.columns else [0] * len(index_df)
+            # 同一指数多行时后者覆盖前者
+            idx_map = dict(zip(index_df["ts_code"], pct))
         else:
             idx_map = {}
 
         for ts_code, col_name in INDEX_CODES.items():
-            row[col_name] = float(idx_map.get(ts_code, 0) or 0)
+            row[col_name] = _to_float_or_zero(idx_map.get(ts_code, 0))
+
+        # ========== 日期 × 指标矩阵（近5日，升序，最后一行=d0）==========
+        lookback_5d = list(getattr(data_bundle, "lookback_dates_5d", []))
+        macro_mat   = self._build_macro_matrix(lookback_5d, macro_cache)
 
         # ========== 全市场成交量（窗口内归一化比率）==========
         # market_vol_ratio_d{i} = vol_di / mean(vol_d0..d4)
         # 与 stock_amount_5d_ratio 设计对称，消除绝对额跨日期差异
         market_vol_df = macro_cache.get("market_vol_df", pd.DataFrame())
-        lookback_5d   = getattr(data_bundle, "lookback_dates_5d", [])
+        vol_ratios = [1.0] * 5
         if not market_vol_df.empty and "trade_date" in market_vol_df.columns and lookback_5d:
-            vol_map = {
-                str(r["trade_date"]).replace("-", ""): float(r.get("market_total_vol", 0) or 0)
-                for _, r in market_vol_df.iterrows()
-            }
-            # 计算5日均值（含d0）
-            all_vols = [vol_map.get(d.replace("-", ""), 0) for d in lookback_5d]
-            avg_vol  = float(np.mean(all_vols)) if any(v > 0 for v in all_vols) else 0.0
-            # lookback_5d 升序，最后一个=d0，往前=d1..d4
-            for di in range(5):
-                idx = len(lookback_5d) - 1 - di
-                if 0 <= idx < len(lookback_5d):
-                    vol_val = vol_map.get(lookback_5d[idx].replace("-", ""), 0)
-                    row[f"market_vol_ratio_d{di}"] = round(vol_val / (avg_vol + 1e-6), 3) if avg_vol > 0 else 1.0
-                else:
-                    row[f"market_vol_ratio_d{di}"] = 1.0
-        else:
-            for di in range(5):
-                row[f"market_vol_ratio_d{di}"] = 1.0
+            vols    = macro_mat[:, _COL_VOL]
+            avg_vol = float(np.mean(vols)) if (vols > 0).any() else 0.0
+            if avg_vol > 0:
+                # lookback_5d 升序，倒序后与 d0, d1, ... 对齐；不足 5 日的位置保持 1.0
+                ratios = (vols / (avg_vol + 1e-6))[::-1][:5]
+                vol_ratios[:len(ratios)] = [round(float(v), 3) for v in ratios]
+        for di in range(5):
+            row[f"market_vol_ratio_d{di}"] = vol_ratios[di]
 
         # ========== 派生趋势因子 ==========
-        limit_up_counts_5d = macro_cache.get("limit_up_counts_5d", {})
-        consec_max_5d      = macro_cache.get("consec_max_5d", {})
-        lookback_5d        = getattr(data_bundle, "lookback_dates_5d", [])
-        hist_dates         = lookback_5d[:-1] if len(lookback_5d) > 1 else []  # d1~d4
-
+        # D 日值 / 近4日（d1~d4）均值，两项指标一次计算；均值 < 1 说明历史数据缺失（未入库），退化为中性 1.0
         row["market_limit_up_rate"] = round(row["market_limit_up_count"] / TOTAL_LISTED_APPROX, 4)
 
-        if hist_dates and limit_up_counts_5d:
-            hist_up_counts = [limit_up_counts_5d.get(d, 0) for d in hist_dates]
-            avg_hist_up    = float(np.mean(hist_up_counts)) if hist_up_counts else 0.0
-            # avg_hist_up < 1 说明历史数据缺失（未入库），退化为中性 1.0 避免除以零
-            if avg_hist_up >= 1:
-                raw = row["market_limit_up_count"] / avg_hist_up
-                row["market_limit_up_5d_trend"] = round(float(np.clip(raw, 0.1, 10.0)), 3)
-            else:
-                row["market_limit_up_5d_trend"] = 1.0
-        else:
-            row["market_limit_up_5d_trend"] = 1.0
-
-        if hist_dates and consec_max_5d:
-            hist_consec     = [consec_max_5d.get(d, 0) for d in hist_dates]
-            avg_hist_consec = float(np.mean(hist_consec)) if hist_consec else 0.0
-            if avg_hist_consec >= 1:
-                raw = row["market_max_consec_num"] / avg_hist_consec
-                row["market_consec_5d_trend"] = round(float(np.clip(raw, 0.1, 10.0)), 3)
-            else:
-                row["market_consec_5d_trend"] = 1.0
-        else:
-            row["market_consec_5d_trend"] = 1.0
+        d0_vals   = np.array([row["market_limit_up_count"], row["market_max_consec_num"]], dtype=float)
+        has_hist  = np.array([
+            bool(macro_cache.get("limit_up_counts_5d", {})),
+            bool(macro_cache.get("consec_max_5d", {})),
+        ]) & (len(lookback_5d) > 1)
+        hist_avg  = macro_mat[:-1, [_COL_LIMIT_UP, _COL_CONSEC]].mean(axis=0) if len(lookback_5d) > 1 else np.zeros(2)
+        valid     = has_hist & (hist_avg >= 1)
+        trends    = np.where(valid, np.clip(d0_vals / np.where(valid, hist_avg, 1.0), 0.1, 10.0), 1.0)
+        row["market_limit_up_5d_trend"] = round(float(trends[0]), 3) if valid[0] else 1.0
+        row["market_consec_5d_trend"]   = round(float(trends[1]), 3) if valid[1] else 1.0
 
         feature_df = pd.DataFrame([row])
         logger.info(
@@ -18,7 +18,8 @@ import math
 from data.data_cleaner import data_cleaner
 from features.base_feature import BaseFeature
 from utils.common_tools import (get_trade_dates, get_daily_kline_data,
-                                calc_limit_down_price, calc_limit_up_price,
+                                calc_limit_down_price, calc_limit_up_price, get_row_limit_prices,
+                                get_st_stock_pairs,
                                 getStockRank_fortraining, getTagRank_daily, sort_by_recent_gain )
 from utils.log_utils import logger
 from collections import defaultdict
@@ -326,6 +327,8 @@ class SectorHeatFeature(BaseFeature):
                 return pd.DataFrame(), factor_dict
             # 按股票+日期分组索引
             daily_grouped = all_daily_df.groupby(["ts_code", "trade_date"]).first().to_dict(orient="index")
+            # 回溯期 ST 名单（涨跌停价补算按日判断 ST）
+            st_pairs = get_st_stock_pairs(lookback_dates_5d)
         except Exception as e:
             logger.error(f"[板块热度] 预加载日线数据失败：{str(e)}")
             return pd.DataFrame(), factor_dict
@@ -419,8 +422,8 @@ class SectorHeatFeature(BaseFeature):
 
                     # 计算SEI
                     minute_df = minute_cache.get(daily_key, pd.DataFrame())
-                    up_limit = calc_limit_up_price(ts_code, pre_close)
-                    down_limit = calc_limit_down_price(ts_code, pre_close)
+                    up_limit, down_limit = get_row_limit_prices(ts_code, daily_row, pre_close,
+                                                                daily_key in st_pairs)
                     sei_score = np.clip(self._calculate_minute_sei(minute_df, pre_close, up_limit, down_limit), 0, 100)
 
                     # 分类统计
@@ -496,8 +499,8 @@ class SectorHeatFeature(BaseFeature):
                         pct_chg = daily_data["pct_chg"]
                         pre_close = daily_data["pre_close"]
                         minute_df = minute_cache.get(daily_key, pd.DataFrame())
-                        up_limit = calc_limit_up_price(ts_code, pre_close)
-                        down_limit = calc_limit_down_price(ts_code, pre_close)
+                        up_limit, down_limit = get_row_limit_prices(ts_code, daily_data, pre_close,
+                                                                    daily_key in st_pairs)
                         sei_score = np.clip(self._calculate_minute_sei(minute_df, pre_close, up_limit, down_limit), 0,
                                             100)
 
@@ -0,0 +1,151 @@
+"""
+数据预取规划器 (BundlePrefetchPlanner)
+======================================
+FeatureDataBundle 构建前先汇总全部数据需求（日期集合 × 股票集合 × 表），
+生成最少的区间查询，再以有界并发一次性执行：
+
+    原方式：日线 20 次逐日查询 + 前复权 20 次逐日查询 + 分钟线 股票数×5 次逐股逐日查询
+    现方式：每张表按股票分块，每块一条 trade_date IN (...) AND ts_code IN (...) 查询
+            分钟线按日期 × 股票分块批量读 DB 缓存，仅 DB 未命中的 (股票, 日期) 才走
+            data_cleaner 的 DB → API → DB 补拉链路
+
+执行后 report() 给出每张表的 计划行数（股票数 × 日期数，停牌会使实际偏少）/ 实际行数 /
+查询次数 / 耗时，用于核对预取是否完整。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pandas as pd
+
+from utils.common_tools import get_kline_range_data
+from utils.log_utils import logger
+
+# 单条 IN 列表的股票数上限（控制 SQL 长度与单次结果集大小）
+_CODE_CHUNK_SIZE = 500
+# 分钟线单块股票数（每股每日约 240 行，块过大易拖慢单条查询）
+_MINUTE_CODE_CHUNK_SIZE = 100
+# 预取并发上限（DB 连接池有限，避免一次性占满）
+_PREFETCH_WORKERS = 4
+
+# 各表查询列（与原逐日查询函数保持一致）
+_TABLE_COLUMNS = {
+    "kline_day":     "*",
+    "kline_day_qfq": "ts_code, trade_date, open, high, low, close, volume, amount",
+    "kline_min":     "ts_code, trade_time, trade_date, open, close, high, low, volume, amount",
+}
+
+
+class BundlePrefetchPlanner:
+    """
+    预取规划器：plan → execute → report
+
+    :param ts_codes: 目标股票代码（去重后保持原顺序）
+    """
+
+    def __init__(self, ts_codes: List[str]):
+        self.ts_codes = list(dict.fromkeys(ts_codes))
+        self.tasks: List[dict] = []
+        self.results: Dict[str, pd.DataFrame] = {}
+        self.stats: Dict[str, dict] = {}
+
+    # ------------------------------------------------------------------ #
+    # 规划
+    # ------------------------------------------------------------------ #
+
+    def add_table(self, table_name: str, trade_dates: List[str]):
+        """登记一张表的需求：trade_dates × 全部目标股票，按股票分块生成查询任务"""
+        dates = sorted(set(trade_dates))
+        if not dates or not self.ts_codes:
+            return
+        chunk = _MINUTE_CODE_CHUNK_SIZE if table_name == "kline_min" else _CODE_CHUNK_SIZE
+        for i in range(0, len(self.ts_codes), chunk):
+            codes = self.ts_codes[i:i + chunk]
+            # 分钟线按日拆分，单条结果集控制在 股票数 × 240 行以内
+            date_groups = [[d] for d in dates] if table_name == "kline_min" else [dates]
+            for group in date_groups:
+                self.tasks.append({
+                    "table":   table_name,
+                    "dates":   group,
+                    "codes":   codes,
+                    "planned": len(codes) * len(group),
+                })
+        stat = self.stats.setdefault(table_name, {"queries": 0, "planned_keys": 0, "actual_keys": 0,
+                                                  "actual_rows": 0, "elapsed": 0.0})
+        stat["planned_keys"] += len(self.ts_codes) * len(dates)
+
+    # ------------------------------------------------------------------ #
+    # 执行
+    # ------------------------------------------------------------------ #
+
+    def _run_task(self, task: dict):
+        table_name = task["table"]
+        order_by   = "ts_code, trade_time" if table_name == "kline_min" else ""
+        t0 = time.perf_counter()
+        df = get_kline_range_data(
+            table_name, task["dates"], task["codes"],
+            columns=_TABLE_COLUMNS.get(table_name, "*"), order_by=order_by,
+        )
+        return task, df, time.perf_counter() - t0
+
+    def execute(self, max_workers: int = _PREFETCH_WORKERS) -> Dict[str, pd.DataFrame]:
+        """
+        有界并发执行全部查询任务
+        :return: {表名: 合并后的 DataFrame}（trade_date 已统一为 str）
+        """
+        frames: Dict[str, List[pd.DataFrame]] = {}
+        if self.tasks:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(self.tasks))) as pool:
+                for task, df, elapsed in pool.map(self._run_task, self.tasks):
+                    stat = self.stats[task["table"]]
+                    stat["queries"] += 1
+                    stat["elapsed"] += elapsed
+                    if df is not None and not df.empty:
+                        frames.setdefault(task["table"], []).append(df)
+
+        for table_name, stat in self.stats.items():
+            parts = frames.get(table_name)
+            if not parts:
+                self.results[table_name] = pd.DataFrame()
+                continue
+            df = pd.concat(parts, ignore_index=True)
+            df["trade_date"] = df["trade_date"].astype(str)
+            if table_name == "kline_min":
+                df["trade_time"] = pd.to_datetime(df["trade_time"])
+            stat["actual_rows"] = len(df)
+            stat["actual_keys"] = int(df[["ts_code", "trade_date"]].drop_duplicates().shape[0])
+            self.results[table_name] = df
+        return self.results
+
+    # ------------------------------------------------------------------ #
+    # 报告
+    # ------------------------------------------------------------------ #
+
+    def report(self) -> pd.DataFrame:
+        """
+        计划 vs 实际
+        planned_keys : 计划 (股票, 日期) 组合数
+        actual_keys  : 实际命中的 (股票, 日期) 组合数（停牌/未入库会偏少）
+        actual_rows  : 实际返回行数（分钟线为分钟条数）
+        """
+        rows = []
+        for table_name, stat in self.stats.items():
+            planned = stat["planned_keys"]
+            rows.append({
+                "table":        table_name,
+                "queries":      stat["queries"],
+                "planned_keys": planned,
+                "actual_keys":  stat["actual_keys"],
+                "coverage":     round(stat["actual_keys"] / planned, 4) if planned else 0.0,
+                "actual_rows":  stat["actual_rows"],
+                "elapsed_s":    round(stat["elapsed"], 3),
+            })
+        return pd.DataFrame(rows)
+
+    def log_report(self, tag: str = ""):
+        for row in self.report().to_dict(orient="records"):
+            logger.info(
+                f"[Prefetch] {tag} {row['table']} | 查询:{row['queries']} "
+                f"| 计划:{row['planned_keys']} 实际:{row['actual_keys']} 覆盖:{row['coverage']:.1%} "
+                f"| 行数:{row['actual_rows']} | 累计耗时:{row['elapsed_s']}s"
+            )
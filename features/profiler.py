@@ -0,0 +1,203 @@
+"""
+特征引擎性能剖析器 (FeatureProfiler)
+====================================
+记录每个交易日、每个阶段（数据容器加载阶段 / 各因子计算）的：
+
+    wall_s        : 墙钟耗时（秒）
+    cpu_s         : 进程 CPU 耗时（秒，含因子内部线程池；进程级，并发阶段会互相叠加）
+    rss_delta_mb  : 阶段前后进程常驻内存变化（MB，进程级）
+    peak_rss_delta_mb : 阶段内进程峰值 RSS 的抬升（MB，进程级，之前峰值更高时为 0）
+    rows_in / rows_out : 输入候选股数 / 输出行数
+    nan_ratio     : 输出 DataFrame 整体 NaN 占比
+    max_col_nan_ratio / max_nan_col : NaN 占比最高的列
+
+用法：
+    profiler = FeatureProfiler()
+    bundle   = FeatureDataBundle(..., profiler=profiler)       # 记录 bundle 各加载阶段
+    engine   = FeatureEngine(profiler=profiler)                # 记录各因子
+    ...
+    profiler.save("feature_profile.csv")                       # 逐条明细（.json / .csv）
+    profiler.summary()                                         # 跨日期聚合
+
+注意：
+    - 开启剖析时 FeatureEngine 串行运行各因子，dataset.py 也强制逐日串行（忽略 DATASET_WORKERS），
+      保证 CPU / 内存增量可归因到单个日期的单个阶段（并行时进程级指标互相叠加，无法拆分）
+    - 同一进程内其他线程仍在并发运行时（如调用方自行多线程），cpu_s / rss 列只能作参考，
+      wall_s 不受影响
+    - 内存指标优先用标准库 resource（Linux/macOS）；不可用时尝试 psutil（可选依赖），
+      都不可用则记为 None
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+import pandas as pd
+
+from utils.log_utils import logger
+
+try:
+    import resource   # Linux / macOS
+except ImportError:   # Windows
+    resource = None
+
+try:
+    import psutil     # 可选依赖，仅 resource 不可用时使用
+except ImportError:
+    psutil = None
+
+
+def _current_rss_mb() -> Optional[float]:
+    """当前常驻内存（MB）"""
+    try:
+        if os.path.exists("/proc/self/statm"):
+            with open("/proc/self/statm") as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+        if psutil is not None:
+            return psutil.Process().memory_info().rss / 1024 / 1024
+    except Exception:
+        pass
+    return None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """进程历史峰值常驻内存（MB）"""
+    try:
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Linux 单位 KB，macOS 单位 Byte
+            return peak / 1024 / 1024 if os.uname().sysname == "Darwin" else peak / 1024
+        if psutil is not None:
+            info = psutil.Process().memory_info()
+            return getattr(info, "peak_wset", info.rss) / 1024 / 1024
+    except Exception:
+        pass
+    return None
+
+
+def _diff(after: Optional[float], before: Optional[float]) -> Optional[float]:
+    if after is None or before is None:
+        return None
+    return round(after - before, 3)
+
+
+class FeatureProfiler:
+    """逐日 × 逐阶段性能记录器（线程安全）"""
+
+    def __init__(self):
+        self.records: List[dict] = []
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ #
+    # 记录
+    # ------------------------------------------------------------------ #
+
+    @contextmanager
+    def stage(self, trade_date: str, name: str, kind: str = "feature", rows_in: Optional[int] = None):
+        """
+        阶段计时上下文，with 块内可通过 record["rows_out"] 或 record_frame() 补充输出信息
+        :param kind: bundle（数据加载阶段）/ feature（因子计算）/ engine（组装）
+        """
+        record = {
+            "trade_date": trade_date, "kind": kind, "name": name,
+            "wall_s": None, "cpu_s": None, "rss_delta_mb": None, "peak_rss_delta_mb": None,
+            "rows_in": rows_in, "rows_out": None,
+            "nan_ratio": None, "max_col_nan_ratio": None, "max_nan_col": None,
+            "status": "ok",
+        }
+        rss0, peak0 = _current_rss_mb(), _peak_rss_mb()
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except Exception:
+            record["status"] = "error"
+            raise
+        finally:
+            record["wall_s"]            = round(time.perf_counter() - wall0, 4)
+            record["cpu_s"]             = round(time.process_time() - cpu0, 4)
+            record["rss_delta_mb"]      = _diff(_current_rss_mb(), rss0)
+            record["peak_rss_delta_mb"] = _diff(_peak_rss_mb(), peak0)
+            with self._lock:
+                self.records.append(record)
+
+    @staticmethod
+    def record_frame(record: dict, df: pd.DataFrame):
+        """把输出 DataFrame 的行数 / NaN 占比写入阶段记录"""
+        if df is None:
+            return
+        record["rows_out"] = len(df)
+        if df.empty:
+            return
+        col_nan = df.isna().mean()
+        record["nan_ratio"]         = round(float(df.isna().to_numpy().mean()), 6)
+        record["max_col_nan_ratio"] = round(float(col_nan.max()), 6)
+        record["max_nan_col"]       = str(col_nan.idxmax()) if col_nan.max() > 0 else None
+
+    # ------------------------------------------------------------------ #
+    # 报告
+    # ------------------------------------------------------------------ #
+
+    def to_dataframe(self) -> pd.DataFrame:
+        with self._lock:
+            return pd.DataFrame(list(self.records))
+
+    def summary(self) -> pd.DataFrame:
+        """按 (kind, name) 跨日期聚合：次数 / 墙钟合计·均值·P95 / CPU 合计 / 内存峰值抬升最大值"""
+        df = self.to_dataframe()
+        if df.empty:
+            return df
+        grouped = df.groupby(["kind", "name"], sort=False)
+        summary = grouped.agg(
+            runs          = ("wall_s", "size"),
+            wall_total_s  = ("wall_s", "sum"),
+            wall_mean_s   = ("wall_s", "mean"),
+            wall_p95_s    = ("wall_s", lambda s: s.quantile(0.95)),
+            cpu_total_s   = ("cpu_s", "sum"),
+            peak_rss_max_mb = ("peak_rss_delta_mb", "max"),
+            rows_out_mean = ("rows_out", "mean"),
+            nan_ratio_mean = ("nan_ratio", "mean"),
+            errors        = ("status", lambda s: int((s != "ok").sum())),
+        ).reset_index()
+        total = summary["wall_total_s"].sum()
+        summary["wall_share"] = (summary["wall_total_s"] / total).round(4) if total > 0 else 0.0
+        return summary.sort_values("wall_total_s", ascending=False).reset_index(drop=True)
+
+    def save(self, path: str):
+        """保存逐条明细：.json → {records, summary}；其他后缀 → CSV 明细"""
+        df = self.to_dataframe()
+        if path.lower().endswith(".json"):
+            payload = {
+                "records": json.loads(df.to_json(orient="records", force_ascii=False)),
+                "summary": json.loads(self.summary().to_json(orient="records", force_ascii=False)),
+            }
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2)
+        else:
+            df.to_csv(path, index=False, encoding="utf-8-sig")
+        logger.info(f"[Profiler] 剖析报告已保存：{path} | 记录数:{len(df)}")
+
+    def log_summary(self, top_n: int = 10):
+        summary = self.summary()
+        if summary.empty:
+            return
+        for row in summary.head(top_n).to_dict(orient="records"):
+            logger.info(
+                f"[Profiler] {row['kind']}/{row['name']} | 次数:{row['runs']} "
+                f"| 墙钟合计:{row['wall_total_s']:.2f}s（占比 {row['wall_share']:.1%}）"
+                f" 均值:{row['wall_mean_s']:.3f}s P95:{row['wall_p95_s']:.3f}s "
+                f"| CPU:{row['cpu_total_s']:.2f}s"
+            )
+
+
+@contextmanager
+def profile_stage(profiler: Optional[FeatureProfiler], trade_date: str, name: str,
+                  kind: str = "feature", rows_in: Optional[int] = None):
+    """profiler 为 None 时为空操作，调用方无需分支判断"""
+    if profiler is None:
+        yield {}
+        return
+    with profiler.stage(trade_date, name, kind=kind, rows_in=rows_in) as record:
+        yield record
@@ -5,8 +5,16 @@
 - 时间跨度：d4=4天前、d3=3天前、d2=2天前、d1=1天前、d0=D日
 - 指标名：profit=涨幅>7%个股数（赚钱效应）、loss=跌幅>7%个股数（亏钱效应）
 全局因子：adapt_score 板块轮动速度分，0-100，越高轮动越快
+
+进程级缓存：
+- 单日概念榜（Top5 题材 + 覆盖股票数 + 名次）按交易日缓存，相邻交易日的 5 日窗口重叠 4 天，
+  只需新算 1 天榜单，5 日聚合变为 5 条缓存记录的合并
+- 同一交易日的 Top3 结果在进程内只计算一次（dataset / 策略 / runner 多处调用共享）
+- 只缓存自然日今天之前的交易日：当日榜单随盘中行情 / 收盘后日线入库而变化，每次重算，
+  常驻进程跨日后昨日结果自然成为历史缓存，无需手动清理
 """
 import re
+import threading
 from datetime import datetime, timedelta
 from collections import defaultdict
 import numpy as np
@@ -30,6 +38,24 @@ MAIN_LINE_RULES = [
     {"level": "weak", "appear": 3, "top3": 1, "coeff": 0.6},
 ]
 
+# 进程级缓存：{trade_date: [{"rank", "name", "count"}, ...]} / {trade_date: top3 结果}
+# 历史交易日的榜单不会变化，只缓存成功结果，失败日下次调用会重试；当日（未收盘 / 未入库完）不缓存
+_DAILY_BOARD_CACHE: dict = {}
+_TOP3_RESULT_CACHE: dict = {}
+_BOARD_CACHE_LOCK = threading.Lock()
+
+
+def clear_sector_board_cache():
+    """清空单日概念榜 / Top3 结果缓存（历史日线回补 / 概念标签刷新后调用）"""
+    with _BOARD_CACHE_LOCK:
+        _DAILY_BOARD_CACHE.clear()
+        _TOP3_RESULT_CACHE.clear()
+
+
+def _is_settled_day(day: str) -> bool:
+    """是否为自然日今天之前的交易日（数据已定型，可进程级缓存）"""
+    return day < datetime.now().strftime("%Y-%m-%d")
+
 
 @feature_registry.register("sector_heat")
 class SectorHeatFeature(BaseFeature):
@@ -48,15 +74,72 @@ class SectorHeatFeature(BaseFeature):
         self.top_sector_num = 3
         self.lookback_days = 5
 
+    @staticmethod
+    def get_daily_board(day: str) -> list:
+        """
+        单日概念榜（Top5 题材），带进程级缓存（仅历史交易日）
+        :param day: 交易日，格式yyyy-mm-dd
+        :return: [{"rank": 1, "name": 题材名, "count": 覆盖股票数}, ...]；无数据/失败返回 []
+        """
+        with _BOARD_CACHE_LOCK:
+            cached = _DAILY_BOARD_CACHE.get(day)
+        if cached is not None:
+            return cached
+
+        try:
+            stock_df = getStockRank_fortraining(day)
+            if stock_df is None or stock_df.empty or "ts_code" not in stock_df.columns:
+                logger.warning(f"[板块热度] {day} 无符合条件的股票，跳过")
+                return []
+            ts_list = stock_df["ts_code"].dropna().unique().tolist()
+
+            tag_df = getTagRank_daily(ts_list)
+            if tag_df is None or tag_df.empty or "concept_name" not in tag_df.columns:
+                logger.warning(f"[板块热度] {day} 无板块数据，跳过")
+                return []
+            tag_df = tag_df.head(5).reset_index(drop=True)
+
+            counts = tag_df["cover_stock_count"] if "cover_stock_count" in tag_df.columns else [0] * len(tag_df)
+            daily_board = [
+                {"rank": i + 1, "name": str(name).strip(), "count": int(count)}
+                for i, (name, count) in enumerate(zip(tag_df["concept_name"], counts))
+            ]
+        except Exception as e:
+            logger.warning(f"[板块热度] {day} 数据处理失败：{str(e)}，跳过")
+            return []
+
+        if _is_settled_day(day):
+            with _BOARD_CACHE_LOCK:
+                _DAILY_BOARD_CACHE[day] = daily_board
+        return daily_board
+
     def select_top3_hot_sectors(self, trade_date: str) -> dict:
         """
         板块热度计算主入口（兼容原有策略调用，完全保留原有逻辑）
+        同一历史交易日的结果在进程内只计算一次，后续调用直接返回缓存副本（当日每次重算）
         :param trade_date: D日日期，格式yyyy-mm-dd
         :return: {
             "top3_sectors": List[str] 最终选中的3个板块,
             "adapt_score": int 0-100分，板块轮动速度分
         }
         """
+        with _BOARD_CACHE_LOCK:
+            cached = _TOP3_RESULT_CACHE.get(trade_date)
+        if cached is not None:
+            logger.debug(f"[板块热度] {trade_date} 命中 Top3 缓存：{cached['top3_sectors']}")
+            return {"top3_sectors": list(cached["top3_sectors"]), "adapt_score": cached["adapt_score"]}
+
+        result = self._compute_top3_hot_sectors(trade_date)
+        if result["top3_sectors"] and _is_settled_day(trade_date):
+            with _BOARD_CACHE_LOCK:
+                _TOP3_RESULT_CACHE[trade_date] = {
+                    "top3_sectors": list(result["top3_sectors"]),
+                    "adapt_score":  result["adapt_score"],
+                }
+        return result
+
+    def _compute_top3_hot_sectors(self, trade_date: str) -> dict:
+        """Top3 板块筛选 + 轮动分计算（无缓存的原始逻辑）"""
         # 基础格式校验
         if not re.match(r'^\d{4}-\d{2}-\d{2}$', trade_date):
             logger.error(f"[板块热度] 日期格式错误：{trade_date}，要求yyyy-mm-dd")
@@ -75,32 +158,18 @@ class SectorHeatFeature(BaseFeature):
             logger.error(f"[板块热度] 获取交易日异常：{str(e)}")
             return {"top3_sectors": [], "adapt_score": 0}
 
-        # 逐天生成板块榜单
+        # 逐天读取板块榜单（单日榜单带进程级缓存，5 日聚合 = 5 条缓存记录合并）
         daily_board_data = []
         all_daily_sectors = []
         daily_rank_maps = []
         for idx, day in enumerate(trade_dates):
             distance = idx - 4
-            try:
-                stock_df = getStockRank_fortraining(day)
-                if stock_df.empty or "ts_code" not in stock_df.columns:
-                    logger.warning(f"[板块热度] {day} 无符合条件的股票，跳过")
-                    continue
-                ts_list = stock_df["ts_code"].dropna().unique().tolist()
-
-                tag_df = getTagRank_daily(ts_list)
-                if tag_df.empty or "concept_name" not in tag_df.columns:
-                    logger.warning(f"[板块热度] {day} 无板块数据，跳过")
-                    continue
-                tag_df = tag_df.head(5).reset_index(drop=True)
-
-                daily_board = [{"rank": i + 1, "name": str(row["concept_name"]).strip()} for i, row in tag_df.iterrows()]
-                daily_board_data.append({"distance": distance, "board": daily_board})
-                all_daily_sectors.append(set([item["name"] for item in daily_board]))
-                daily_rank_maps.append({item["name"]: item["rank"] for item in daily_board})
-            except Exception as e:
-                logger.warning(f"[板块热度] {day} 数据处理失败：{str(e)}，跳过")
+            daily_board = self.get_daily_board(day)
+            if not daily_board:
                 continue
+            daily_board_data.append({"distance": distance, "board": daily_board})
+            all_daily_sectors.append(set([item["name"] for item in daily_board]))
+            daily_rank_maps.append({item["name"]: item["rank"] for item in daily_board})
 
         # 最低有效数据校验
         if len(daily_board_data) < 3:
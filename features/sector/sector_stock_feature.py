@@ -61,9 +61,11 @@
   sei_cache 存储全量 factors dict，避免双重计算
   无分钟线时从日线 OHLC 回退（calc_daily_atomic），保证缓存完整
   停牌 vs 无分钟线 使用不同中性值，语义区分明确
+  sei_cache 按 (ts_code, trade_date) 在当日各板块间共享，多概念重叠个股只算一次
+  列式组装：每个板块把候选股 × 5 日展开为数组块，d0~d4 每列一次向量化生成，
+  板块均值/量比按日整块计算，最后一次性构造 DataFrame（不再逐行 iterrows 拼 dict）
 """
 
-from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
 
@@ -74,9 +76,9 @@ from features.base_feature import BaseFeature
 from features.feature_registry import feature_registry
 from features.emotion.sei_feature import SEIFeature
 from utils.common_tools import (
-    sort_by_recent_gain,
-    calc_limit_up_price,
-    calc_limit_down_price,
+    build_recent_gain_panel,
+    sort_by_recent_gain_from_panel,
+    get_row_limit_prices,
 )
 
 # SEI/HDI 并行计算线程数（numpy 释放 GIL，线程并发有效）
@@ -114,12 +116,45 @@ SUSPENDED_FILL["vol_ratio"]              = 0.0    # 停牌量为 0，量比=0 
 SUSPENDED_FILL["red_session_pm_ratio"]   = -1.0
 SUSPENDED_FILL["float_session_pm_ratio"] = -1.0
 
+# sei_cache 元组中 factors 的固定顺序（元组前两位为 sei / hdi）
+_SEI_FACTOR_KEYS = [
+    "gap_return", "candle_type", "cpr", "max_dd_intra", "upper_shadow", "lower_shadow",
+    "trend_r2", "vwap_deviation", "seal_times", "break_times", "lift_times",
+    "red_time_ratio", "float_profit_time_ratio", "red_session_pm_ratio", "float_session_pm_ratio",
+]
+_SEI_FACTOR_POS = {k: i + 2 for i, k in enumerate(_SEI_FACTOR_KEYS)}
+
+# 输出列前缀 → 原子因子键（按输出列顺序；vol_ratio 由日线整块计算，不来自 factors）
+_ATOMIC_COLUMNS = [
+    ("stock_gap_return",              "gap_return"),
+    ("stock_candle",                  "candle_type"),
+    ("stock_cpr",                     "cpr"),
+    ("stock_max_dd",                  "max_dd_intra"),
+    ("stock_upper_shadow",            "upper_shadow"),
+    ("stock_lower_shadow",            "lower_shadow"),
+    ("stock_trend_r2",                "trend_r2"),
+    ("stock_vwap_dev",                "vwap_deviation"),
+    ("stock_seal_times",              "seal_times"),
+    ("stock_break_times",             "break_times"),
+    ("stock_lift_times",              "lift_times"),
+    ("stock_vol_ratio",               "vol_ratio"),
+    ("stock_red_time_ratio",          "red_time_ratio"),
+    ("stock_float_profit_time_ratio", "float_profit_time_ratio"),
+    ("stock_red_session_pm_ratio",    "red_session_pm_ratio"),
+    ("stock_float_session_pm_ratio",  "float_session_pm_ratio"),
+]
+# 整数型原子因子（K 线结构 / 次数类），输出保持 int64
+_INT_FACTOR_KEYS = {"candle_type", "seal_times", "break_times", "lift_times"}
+
+_EMPTY_MINUTE_DF = pd.DataFrame()
+
 
 @feature_registry.register("sector_stock")
 class SectorStockFeature(BaseFeature):
     """板块内个股特征类（全量原子因子版）"""
 
     feature_name = "sector_stock"
+    requires_minute = True   # SEI / HDI 依赖分钟线
     _day_tags    = [f"d{i}" for i in range(5)]
 
     factor_columns = [
@@ -158,53 +193,51 @@ class SectorStockFeature(BaseFeature):
         self.sei_calculator = SEIFeature()
 
     # ------------------------------------------------------------------ #
-    # 工具方法
+    # 工具方法（列式组装）
     # ------------------------------------------------------------------ #
 
     @staticmethod
-    def _calc_vol_ratio(ts_code: str, target_date: str,
-                        all_dates_5d: List[str], daily_grouped: dict) -> float:
-        """量比 = 当日成交量 / 近5日（含当日）均量
-        注意：kline_day 表中成交量列名为 volume（data_cleaner 入库时已从 vol 重命名）"""
-        today_row = daily_grouped.get((ts_code, target_date))
-        if not today_row:
-            return 0.0
-        today_vol = float(today_row.get("volume", 0) or 0)  # ← 列名 volume，非 vol
-        if today_vol == 0:
-            return 0.0
-        vols = [
-            float(daily_grouped[(ts_code, d)].get("volume", 0) or 0)
-            for d in all_dates_5d
-            if (ts_code, d) in daily_grouped
-        ]
-        avg_vol = np.mean(vols) if vols else 0.0
-        return round(today_vol / (avg_vol + 1e-6), 3)
+    def _build_day_panel(ts_codes: List[str], dates: List[str], daily_grouped: dict) -> Dict[str, np.ndarray]:
+        """
+        把 daily_grouped 中 ts_codes × dates 展开为 (股票数, 日期数) 的数组块
+
+        :return: {"present": bool 矩阵（该股该日有日线）, 各行情字段: float 矩阵}
+                 缺失位置：价格/涨跌幅为 nan，volume/amount 为 0
+        注意：kline_day 表中成交量列名为 volume（data_cleaner 入库时已从 vol 重命名）
+        """
+        n, m = len(ts_codes), len(dates)
+        rows = [daily_grouped.get((ts_code, d)) for ts_code in ts_codes for d in dates]
+        panel = {"present": np.array([r is not None for r in rows], dtype=bool).reshape(n, m)}
+        for field in ("open", "high", "low", "close", "pct_chg", "pre_close"):
+            panel[field] = np.array(
+                [np.nan if r is None or r.get(field) is None else float(r.get(field)) for r in rows],
+                dtype=float,
+            ).reshape(n, m)
+        for field in ("volume", "amount"):
+            panel[field] = np.array(
+                [float(r.get(field, 0) or 0) if r is not None else 0.0 for r in rows],
+                dtype=float,
+            ).reshape(n, m)
+        return panel
 
     @staticmethod
-    def _calc_amount_ratio(ts_code: str, target_date: str,
-                           all_dates_5d: List[str], daily_grouped: dict) -> float:
-        """成交额量级比 = 当日成交额 / 近5日（含当日）平均成交额（消除跨股绝对额差异）"""
-        today_row = daily_grouped.get((ts_code, target_date))
-        if not today_row:
-            return 0.0
-        today_amt = float(today_row.get("amount", 0) or 0)
-        if today_amt == 0:
-            return 0.0
-        amts = [
-            float(daily_grouped[(ts_code, d)].get("amount", 0) or 0)
-            for d in all_dates_5d
-            if (ts_code, d) in daily_grouped
-        ]
-        avg_amt = np.mean(amts) if amts else 0.0
-        return round(today_amt / (avg_amt + 1e-6), 3)
+    def _calc_window_ratio(values: np.ndarray, present: np.ndarray) -> np.ndarray:
+        """
+        量比 / 成交额量级比 = 当日值 / 近5日（含当日、仅计有日线的日期）均值
+        values / present 形状为 (股票数, 5)，返回同形状矩阵；当日停牌或值为 0 时为 0
+        """
+        counts = present.sum(axis=1, keepdims=True)
+        avg    = np.where(present, values, 0.0).sum(axis=1, keepdims=True) / np.maximum(counts, 1)
+        ratio  = np.round(values / (avg + 1e-6), 3)
+        return np.where(present & (values != 0), ratio, 0.0)
 
     # ------------------------------------------------------------------ #
     # 主计算入口
     # ------------------------------------------------------------------ #
 
     def calculate(self, data_bundle) -> tuple:
-        result_rows   = []
-        factor_dict   = {}
+        sector_frames  = []
+        factor_dict    = {}
         trade_date     = data_bundle.trade_date
         top3_sectors   = data_bundle.top3_sectors
         sector_map     = data_bundle.sector_candidate_map
@@ -213,14 +246,86 @@ class SectorStockFeature(BaseFeature):
         all_dates_5d   = data_bundle.lookback_dates_5d    # 升序，[-1]=trade_date
         all_dates_20d  = sorted(data_bundle.lookback_dates_20d)  # 升序，用于 prev_date 查找
 
-        # d0=trade_date，d4=4天前
+        # d0=trade_date，d4=4天前（列顺序与 all_dates_5d 升序一致：d4 → d0）
         day_tag_map: Dict[str, str] = {
             f"d{4 - i}": date for i, date in enumerate(all_dates_5d)
         }
+        day_tags = list(day_tag_map.keys())
+
+        # ================================================================
+        # SEI/HDI/全量原子因子统一缓存（当日跨板块共享）
+        # key   = (ts_code, trade_date)
+        # value = (sei, hdi, *[factors[k] for k in _SEI_FACTOR_KEYS])
+        # 定长元组，便于阶段 2 按日期直接堆叠为数组块
+        # 同一只股票常同时属于多个热门概念，共享缓存保证每个股票日只计算一次
+        # 无分钟线时用 calc_daily_atomic 从日线回退，保证缓存始终有值
+        # ================================================================
+        sei_cache: Dict[tuple, tuple] = {}
+
+        # 日期 → 在 20 日序列中的位置（vwap_prev 查昨日行情用，避免逐任务 list.index）
+        date_pos: Dict[str, int] = {d: i for i, d in enumerate(all_dates_20d)}
+
+        # 单任务 SEI/HDI 计算（纯 CPU + numpy，释放 GIL，线程安全）
+        sei_calc = self.sei_calculator
+        is_st    = data_bundle.is_st
+
+        def _compute_sei(task):
+            daily_key, daily_row, pre_close = task
+            ts_code, target_date = daily_key
+            # 涨跌停价优先取 kline_day 入库列，历史未回填时标量补算
+            up_limit, down_limit = get_row_limit_prices(ts_code, daily_row, pre_close, is_st(ts_code, target_date))
+            minute_df  = minute_cache.get(daily_key, _EMPTY_MINUTE_DF)
+
+            # 昨日 VWAP（元/股）= amount(千元) × 1000 / (volume(手) × 100股/手)
+            #                  = amount × 10 / volume
+            # 注意：kline_day 列名为 volume（不是 vol），data_cleaner 入库时已重命名
+            # 用于浮盈持续时间计算；找不到昨日数据则传 0（sei_feature 内部降级为昨收）
+            vwap_prev = 0.0
+            idx = date_pos.get(target_date, 0)
+            if idx > 0:
+                prev_row = daily_grouped.get((ts_code, all_dates_20d[idx - 1]), {})
+                prev_vol = float(prev_row.get("volume", 0) or 0)  # ← volume，非 vol
+                prev_amt = float(prev_row.get("amount", 0) or 0)
+                if prev_vol > 0:
+                    vwap_prev = prev_amt * 10 / prev_vol   # 千元×1000/(手×100) = 元/股
+
+            hdi, factors = sei_calc._calculate_minute_hdi(
+                minute_df, pre_close, up_limit, down_limit, vwap_prev=vwap_prev
+            )
+            if factors:
+                sei = sei_calc._factors_to_sei(factors, up_limit)
+            else:
+                sei = hdi = 50.0
+                factors = SEIFeature.calc_daily_atomic(
+                    open_price  = daily_row.get("open",  pre_close),
+                    high_price  = daily_row.get("high",  pre_close),
+                    low_price   = daily_row.get("low",   pre_close),
+                    close_price = daily_row.get("close", pre_close),
+                    pre_close   = pre_close,
+                )
+            return daily_key, (
+                float(sei), float(hdi),
+                *[factors.get(k, ATOMIC_NEUTRAL[k]) for k in _SEI_FACTOR_KEYS],
+            )
+
+        # 近20日涨幅：所有板块成员一次性从 daily_grouped 取两日收盘价（不再逐板块查库）
+        gain_panel = pd.DataFrame()
+        if data_bundle.gain_base_date_20d:
+            all_members = [
+                ts_code
+                for sector_name in top3_sectors if sector_name in sector_map
+                for ts_code in sector_map[sector_name]["ts_code"]
+            ]
+            gain_panel = build_recent_gain_panel(
+                daily_grouped, all_members, trade_date, data_bundle.gain_base_date_20d
+            )
+        else:
+            logger.warning(f"[板块个股] {trade_date} 近20日涨幅基准日不可用，排名按候选池原始顺序")
 
         # ================================================================
         # 阶段 1：板块级预计算
         # ================================================================
+        computed_cnt = reused_cnt = 0
         for sector_idx, sector_name in enumerate(top3_sectors, 1):
             if not sector_name or sector_name not in sector_map:
                 continue
@@ -233,7 +338,7 @@ class SectorStockFeature(BaseFeature):
             # ---- 20 日涨幅排名 ----
             rank_map, rank_median = {}, 0
             try:
-                sorted_df = sort_by_recent_gain(sector_d0_df, trade_date, day_count=20)
+                sorted_df = sort_by_recent_gain_from_panel(sector_d0_df, gain_panel, day_count=20)
                 if not sorted_df.empty:
                     sorted_df = sorted_df.copy()
                     sorted_df["rank"] = range(1, len(sorted_df) + 1)
@@ -242,14 +347,7 @@ class SectorStockFeature(BaseFeature):
             except Exception as e:
                 logger.warning(f"[板块个股] {sector_name} 排名失败: {e}")
 
-            # ================================================================
-            # SEI/HDI/全量原子因子统一缓存
-            # value = {"sei": float, "hdi": float, "factors": dict}
-            # 无分钟线时用 calc_daily_atomic 从日线回退，保证缓存始终有值
-            # ================================================================
-            sei_cache: Dict[tuple, dict] = {}
-
-            # 收集需要计算 SEI/HDI 的任务
+            # 收集需要计算 SEI/HDI 的任务（已被前序板块算过的股票日直接复用）
             sei_tasks = []
             seen_keys = set()
             for ts_code in sector_ts_codes:
@@ -258,198 +356,128 @@ class SectorStockFeature(BaseFeature):
                     if daily_key in seen_keys or daily_key not in daily_grouped:
                         continue
                     seen_keys.add(daily_key)
+                    if daily_key in sei_cache:
+                        reused_cnt += 1
+                        continue
                     daily_row = daily_grouped[daily_key]
                     pre_close = daily_row.get("pre_close", 0)
                     if not pre_close or pre_close <= 0:
                         continue
                     sei_tasks.append((daily_key, daily_row, pre_close))
 
-            # 单任务 SEI/HDI 计算（纯 CPU + numpy，释放 GIL，线程安全）
-            sei_calc = self.sei_calculator
-
-            def _compute_sei(task):
-                daily_key, daily_row, pre_close = task
-                ts_code, target_date = daily_key
-                up_limit   = calc_limit_up_price(ts_code, pre_close)
-                down_limit = calc_limit_down_price(ts_code, pre_close)
-                minute_df  = minute_cache.get(daily_key, pd.DataFrame())
-
-                # 昨日 VWAP（元/股）= amount(千元) × 1000 / (volume(手) × 100股/手)
-                #                  = amount × 10 / volume
-                # 注意：kline_day 列名为 volume（不是 vol），data_cleaner 入库时已重命名
-                # 用于浮盈持续时间计算；找不到昨日数据则传 0（sei_feature 内部降级为昨收）
-                vwap_prev = 0.0
-                try:
-                    idx = all_dates_20d.index(target_date)
-                    if idx > 0:
-                        prev_row = daily_grouped.get((ts_code, all_dates_20d[idx - 1]), {})
-                        prev_vol = float(prev_row.get("volume", 0) or 0)  # ← volume，非 vol
-                        prev_amt = float(prev_row.get("amount", 0) or 0)
-                        if prev_vol > 0:
-                            vwap_prev = prev_amt * 10 / prev_vol   # 千元×1000/(手×100) = 元/股
-                except (ValueError, IndexError):
-                    pass
-
-                hdi, factors = sei_calc._calculate_minute_hdi(
-                    minute_df, pre_close, up_limit, down_limit, vwap_prev=vwap_prev
-                )
-                if factors:
-                    sei = sei_calc._factors_to_sei(factors, up_limit)
-                else:
-                    sei = hdi = 50.0
-                    factors = SEIFeature.calc_daily_atomic(
-                        open_price  = daily_row.get("open",  pre_close),
-                        high_price  = daily_row.get("high",  pre_close),
-                        low_price   = daily_row.get("low",   pre_close),
-                        close_price = daily_row.get("close", pre_close),
-                        pre_close   = pre_close,
-                    )
-                return daily_key, {"sei": float(sei), "hdi": float(hdi), "factors": factors}
-
             # 多线程并行计算 SEI/HDI
+            computed_cnt += len(sei_tasks)
             with ThreadPoolExecutor(max_workers=_SEI_WORKERS) as pool:
                 for key, result in pool.map(_compute_sei, sei_tasks):
                     sei_cache[key] = result
 
-            # ---- 板块每日赚钱/亏钱效应 ----
-            sector_day_factors: Dict[str, dict] = {}
-            day_sei_mean = defaultdict(lambda: {"up": [], "down": []})
-
-            for day_tag, target_date in day_tag_map.items():
-                p_list, l_list = [], []
-                for ts_code in sector_ts_codes:
-                    dk = (ts_code, target_date)
-                    if dk not in daily_grouped or dk not in sei_cache:
-                        continue
-                    pct = daily_grouped[dk].get("pct_chg", 0)
-                    sei = sei_cache[dk]["sei"]
-                    if pct > 1e-6:
-                        p_list.append(sei);  day_sei_mean[day_tag]["up"].append(sei)
-                    elif pct < -1e-6:
-                        l_list.append(sei);  day_sei_mean[day_tag]["down"].append(sei)
-
-                sector_day_factors[day_tag] = {
-                    "profit": round(np.mean(p_list), 2) if p_list else 50.0,
-                    "loss":   round(100 - np.mean(l_list), 2) if l_list else 50.0,
-                }
-                day_sei_mean[day_tag]["up"]   = float(np.mean(day_sei_mean[day_tag]["up"]))   if day_sei_mean[day_tag]["up"]   else 50.0
-                day_sei_mean[day_tag]["down"] = float(np.mean(day_sei_mean[day_tag]["down"])) if day_sei_mean[day_tag]["down"] else 50.0
-
             # ================================================================
-            # 阶段 2：个股级特征组装
+            # 阶段 2：列式组装（每个 d 偏移一块数组，按候选股顺序对齐）
             # ================================================================
-            for _, d0_row in sector_d0_df.iterrows():
-                ts_code = d0_row["ts_code"]
-                d0_key  = (ts_code, trade_date)
-                if d0_key not in daily_grouped:
+            panel   = self._build_day_panel(sector_ts_codes, all_dates_5d, daily_grouped)
+            present = panel["present"]
+
+            # SEI 缓存堆叠为 (股票数, 日期数, 2 + 因子数)，无缓存位置为 nan
+            n_codes, n_days = present.shape
+            width     = 2 + len(_SEI_FACTOR_KEYS)
+            nan_entry = (np.nan,) * width
+            sei_block = np.array(
+                [sei_cache.get((ts_code, d), nan_entry) for ts_code in sector_ts_codes for d in all_dates_5d],
+                dtype=float,
+            ).reshape(n_codes, n_days, width)
+            has_cache = ~np.isnan(sei_block[:, :, 0])
+            sei_mat   = sei_block[:, :, 0]
+            pct_mat   = panel["pct_chg"]
+            is_up     = has_cache & (pct_mat > 1e-6)
+            is_down   = has_cache & (pct_mat < -1e-6)
+
+            # ---- 板块每日赚钱/亏钱效应（每日一次分组均值）----
+            up_cnt    = is_up.sum(axis=0)
+            down_cnt  = is_down.sum(axis=0)
+            up_mean   = np.where(is_up,   sei_mat, 0.0).sum(axis=0) / np.maximum(up_cnt,   1)
+            down_mean = np.where(is_down, sei_mat, 0.0).sum(axis=0) / np.maximum(down_cnt, 1)
+            sector_profit = np.where(up_cnt   > 0, np.round(up_mean, 2),         50.0)
+            sector_loss   = np.where(down_cnt > 0, np.round(100 - down_mean, 2), 50.0)
+            day_sei_up    = np.where(up_cnt   > 0, up_mean,   50.0)
+            day_sei_down  = np.where(down_cnt > 0, down_mean, 50.0)
+
+            # ---- 量比 / 成交额量级比（整块计算）----
+            vol_ratio_mat = self._calc_window_ratio(panel["volume"], present)
+            amt_ratio_mat = self._calc_window_ratio(panel["amount"], present)
+
+            # ---- 行索引：按候选池原始顺序，D 日无日线的股票跳过 ----
+            code_pos = {ts_code: i for i, ts_code in enumerate(sector_ts_codes)}
+            row_codes = []
+            for ts_code in sector_d0_df["ts_code"]:
+                if (ts_code, trade_date) not in daily_grouped:
                     logger.warning(f"[板块个股] {ts_code} {trade_date} 无日线，跳过")
                     continue
-
-                d0_data = daily_grouped[d0_key]
-                row = {
-                    "stock_code":            ts_code,
-                    "trade_date":            trade_date,
-                    "sector_id":             sector_idx,
-                    "sector_name":           sector_name,
-                    "stock_sector_20d_rank": rank_map.get(ts_code, rank_median),
-                }
-
-                for day_tag, target_date in day_tag_map.items():
-                    daily_key  = (ts_code, target_date)
-                    daily_data = daily_grouped.get(daily_key)
-                    cache      = sei_cache.get(daily_key)
-
-                    # ---- 原始行情 ----
-                    if daily_data:
-                        row[f"stock_open_{day_tag}"]             = daily_data.get("open",    d0_data.get("open",    0))
-                        row[f"stock_high_{day_tag}"]             = daily_data.get("high",    d0_data.get("high",    0))
-                        row[f"stock_low_{day_tag}"]              = daily_data.get("low",     d0_data.get("low",     0))
-                        row[f"stock_close_{day_tag}"]            = daily_data.get("close",   d0_data.get("close",   0))
-                        row[f"stock_pct_chg_{day_tag}"]          = daily_data.get("pct_chg", 0.0)
-                        row[f"stock_amount_5d_ratio_{day_tag}"]  = self._calc_amount_ratio(
-                            ts_code, target_date, all_dates_5d, daily_grouped
-                        )
+                row_codes.append(ts_code)
+            if not row_codes:
+                continue
+            rows_idx = np.array([code_pos[ts_code] for ts_code in row_codes], dtype=int)
+            n_rows   = len(rows_idx)
+            d0_panel = self._build_day_panel(row_codes, [trade_date], daily_grouped)
+
+            # 分钟线缺失掩码（缺失时 SEI 用板块均值替代，candle_type 已由日线回退）
+            minute_missing = np.array(
+                [minute_cache.get((ts_code, d), _EMPTY_MINUTE_DF).empty
+                 for ts_code in row_codes for d in all_dates_5d],
+                dtype=bool,
+            ).reshape(n_rows, n_days)
+
+            columns: Dict[str, np.ndarray] = {
+                "stock_code":            np.array(row_codes, dtype=object),
+                "trade_date":            np.full(n_rows, trade_date, dtype=object),
+                "sector_id":             np.full(n_rows, sector_idx, dtype=np.int64),
+                "sector_name":           np.full(n_rows, sector_name, dtype=object),
+                "stock_sector_20d_rank": [rank_map.get(ts_code, rank_median) for ts_code in row_codes],
+            }
+
+            for j, day_tag in enumerate(day_tags):
+                day_present = present[rows_idx, j]
+                day_cached  = day_present & has_cache[rows_idx, j]
+                day_pct     = pct_mat[rows_idx, j]
+                day_block   = sei_block[rows_idx, j, :]
+
+                # ---- 原始行情（当日无日线时回退到 D 日行情）----
+                for field in ("open", "high", "low", "close"):
+                    columns[f"stock_{field}_{day_tag}"] = np.where(
+                        day_present, panel[field][rows_idx, j], d0_panel[field][:, 0]
+                    )
+                columns[f"stock_pct_chg_{day_tag}"]         = np.where(day_present, day_pct, 0.0)
+                columns[f"stock_amount_5d_ratio_{day_tag}"] = amt_ratio_mat[rows_idx, j]
+
+                # ---- 情绪合成分 ----
+                sei = day_block[:, 0]
+                up, down = day_pct > 1e-6, day_pct < -1e-6
+                no_minute = minute_missing[:, j]
+                sei = np.where(no_minute & up,   day_sei_up[j],   sei)
+                sei = np.where(no_minute & down, day_sei_down[j], sei)
+                columns[f"stock_profit_{day_tag}"] = np.where(day_cached & up,   np.round(sei, 2),       0.0)
+                columns[f"stock_loss_{day_tag}"]   = np.where(day_cached & down, np.round(100 - sei, 2), 0.0)
+                columns[f"stock_hdi_{day_tag}"]    = np.where(day_cached, day_block[:, 1], SUSPENDED_FILL["hdi"])
+
+                # ---- 全量原子因子（停牌或完全无数据时用 SUSPENDED_FILL）----
+                for prefix, key in _ATOMIC_COLUMNS:
+                    if key == "vol_ratio":
+                        col = np.where(day_cached, vol_ratio_mat[rows_idx, j], SUSPENDED_FILL["vol_ratio"])
                     else:
-                        row[f"stock_open_{day_tag}"]             = d0_data.get("open",  0)
-                        row[f"stock_high_{day_tag}"]             = d0_data.get("high",  0)
-                        row[f"stock_low_{day_tag}"]              = d0_data.get("low",   0)
-                        row[f"stock_close_{day_tag}"]            = d0_data.get("close", 0)
-                        row[f"stock_pct_chg_{day_tag}"]          = 0.0
-                        row[f"stock_amount_5d_ratio_{day_tag}"]  = 0.0
-
-                    # ---- 情绪合成分 + 全量原子因子 ----
-                    if daily_data and cache:
-                        pct_chg = daily_data.get("pct_chg", 0)
-                        sei     = cache["sei"]
-                        hdi     = cache["hdi"]
-                        f       = cache["factors"]
-
-                        # 分钟线缺失时 SEI 用板块均值替代（candle_type 已由日线回退）
-                        if minute_cache.get(daily_key, pd.DataFrame()).empty:
-                            sei = day_sei_mean[day_tag]["up"]   if pct_chg > 1e-6 else \
-                                  day_sei_mean[day_tag]["down"] if pct_chg < -1e-6 else sei
-
-                        if pct_chg > 1e-6:
-                            row[f"stock_profit_{day_tag}"] = round(sei, 2)
-                            row[f"stock_loss_{day_tag}"]   = 0.0
-                        elif pct_chg < -1e-6:
-                            row[f"stock_profit_{day_tag}"] = 0.0
-                            row[f"stock_loss_{day_tag}"]   = round(100 - sei, 2)
-                        else:
-                            row[f"stock_profit_{day_tag}"] = 0.0
-                            row[f"stock_loss_{day_tag}"]   = 0.0
-
-                        row[f"stock_hdi_{day_tag}"]          = hdi
-                        row[f"stock_gap_return_{day_tag}"]   = f.get("gap_return",     ATOMIC_NEUTRAL["gap_return"])
-                        row[f"stock_candle_{day_tag}"]        = f.get("candle_type",    ATOMIC_NEUTRAL["candle_type"])
-                        row[f"stock_cpr_{day_tag}"]           = f.get("cpr",            ATOMIC_NEUTRAL["cpr"])
-                        row[f"stock_max_dd_{day_tag}"]        = f.get("max_dd_intra",   ATOMIC_NEUTRAL["max_dd_intra"])
-                        row[f"stock_upper_shadow_{day_tag}"]  = f.get("upper_shadow",   ATOMIC_NEUTRAL["upper_shadow"])
-                        row[f"stock_lower_shadow_{day_tag}"]  = f.get("lower_shadow",   ATOMIC_NEUTRAL["lower_shadow"])
-                        row[f"stock_trend_r2_{day_tag}"]      = f.get("trend_r2",       ATOMIC_NEUTRAL["trend_r2"])
-                        row[f"stock_vwap_dev_{day_tag}"]      = f.get("vwap_deviation", ATOMIC_NEUTRAL["vwap_deviation"])
-                        row[f"stock_seal_times_{day_tag}"]               = f.get("seal_times",             0)
-                        row[f"stock_break_times_{day_tag}"]              = f.get("break_times",            0)
-                        row[f"stock_lift_times_{day_tag}"]               = f.get("lift_times",             0)
-                        row[f"stock_vol_ratio_{day_tag}"]                = self._calc_vol_ratio(
-                            ts_code, target_date, all_dates_5d, daily_grouped
-                        )
-                        row[f"stock_red_time_ratio_{day_tag}"]           = f.get("red_time_ratio",          ATOMIC_NEUTRAL["red_time_ratio"])
-                        row[f"stock_float_profit_time_ratio_{day_tag}"]  = f.get("float_profit_time_ratio", ATOMIC_NEUTRAL["float_profit_time_ratio"])
-                        row[f"stock_red_session_pm_ratio_{day_tag}"]     = f.get("red_session_pm_ratio",    ATOMIC_NEUTRAL["red_session_pm_ratio"])
-                        row[f"stock_float_session_pm_ratio_{day_tag}"]   = f.get("float_session_pm_ratio",  ATOMIC_NEUTRAL["float_session_pm_ratio"])
+                        col = np.where(day_cached, day_block[:, _SEI_FACTOR_POS[key]], SUSPENDED_FILL[key])
+                    if key in _INT_FACTOR_KEYS:
+                        col = col.astype(np.int64)
+                    columns[f"{prefix}_{day_tag}"] = col
 
-                    else:
-                        # 停牌或完全无数据
-                        row[f"stock_profit_{day_tag}"]                   = 0.0
-                        row[f"stock_loss_{day_tag}"]                     = 0.0
-                        row[f"stock_hdi_{day_tag}"]                      = SUSPENDED_FILL["hdi"]
-                        row[f"stock_gap_return_{day_tag}"]               = SUSPENDED_FILL["gap_return"]
-                        row[f"stock_candle_{day_tag}"]                   = SUSPENDED_FILL["candle_type"]
-                        row[f"stock_cpr_{day_tag}"]                      = SUSPENDED_FILL["cpr"]
-                        row[f"stock_max_dd_{day_tag}"]                   = SUSPENDED_FILL["max_dd_intra"]
-                        row[f"stock_upper_shadow_{day_tag}"]             = SUSPENDED_FILL["upper_shadow"]
-                        row[f"stock_lower_shadow_{day_tag}"]             = SUSPENDED_FILL["lower_shadow"]
-                        row[f"stock_trend_r2_{day_tag}"]                 = SUSPENDED_FILL["trend_r2"]
-                        row[f"stock_vwap_dev_{day_tag}"]                 = SUSPENDED_FILL["vwap_deviation"]
-                        row[f"stock_seal_times_{day_tag}"]               = 0
-                        row[f"stock_break_times_{day_tag}"]              = 0
-                        row[f"stock_lift_times_{day_tag}"]               = 0
-                        row[f"stock_vol_ratio_{day_tag}"]                = SUSPENDED_FILL["vol_ratio"]
-                        row[f"stock_red_time_ratio_{day_tag}"]           = SUSPENDED_FILL["red_time_ratio"]
-                        row[f"stock_float_profit_time_ratio_{day_tag}"]  = SUSPENDED_FILL["float_profit_time_ratio"]
-                        row[f"stock_red_session_pm_ratio_{day_tag}"]     = SUSPENDED_FILL["red_session_pm_ratio"]
-                        row[f"stock_float_session_pm_ratio_{day_tag}"]   = SUSPENDED_FILL["float_session_pm_ratio"]
-
-                    # ---- 板块平均（无条件填充）----
-                    row[f"sector_avg_profit_{day_tag}"] = sector_day_factors[day_tag]["profit"]
-                    row[f"sector_avg_loss_{day_tag}"]   = sector_day_factors[day_tag]["loss"]
-
-                result_rows.append(row)
-
-        feature_df = pd.DataFrame(result_rows)
+                # ---- 板块平均（无条件填充）----
+                columns[f"sector_avg_profit_{day_tag}"] = np.full(n_rows, sector_profit[j])
+                columns[f"sector_avg_loss_{day_tag}"]   = np.full(n_rows, sector_loss[j])
+
+            sector_frames.append(pd.DataFrame(columns))
+
+        feature_df = pd.concat(sector_frames, ignore_index=True) if sector_frames else pd.DataFrame()
         logger.info(
             f"[板块个股特征] {trade_date} 完成"
             f" | 样本: {len(feature_df)} | 列数: {len(feature_df.columns) if not feature_df.empty else 0}"
+            f" | SEI 计算: {computed_cnt} | 跨板块复用: {reused_cnt}"
         )
-        return feature_df, factor_dict
\ No newline at end of file
+        return feature_df, factor_dict
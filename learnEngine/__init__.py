@@ -1,8 +1,13 @@
 # learnEngine/__init__.py
 # from .mock_data_generator import generate_full_mock_dataset
 from .label import LabelEngine
-from .dataset import ProcessedDatesManager, DataSetAssembler, validate_train_dataset
+from .processed_dates import ProcessedDatesManager
+from .dataset import DataSetAssembler, validate_train_dataset
+from .dataset_store import PartitionedDatasetStore
+from .dataset_planner import DatasetDryRunPlanner
 from .model import SectorHeatXGBModel
+from .hyper_search import HyperParamSearch
+from .incremental import IncrementalUpdater
 
 __all__ = [
     # "generate_full_mock_dataset",
@@ -10,5 +15,9 @@ __all__ = [
     "ProcessedDatesManager",
     "DataSetAssembler",
     "validate_train_dataset",
+    "PartitionedDatasetStore",
+    "DatasetDryRunPlanner",
     "SectorHeatXGBModel",
+    "HyperParamSearch",
+    "IncrementalUpdater",
 ]
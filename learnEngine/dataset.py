@@ -10,90 +10,42 @@
   3. FeatureDataBundle(... adapt_score=adapt_score) 统一预加载数据
   4. FeatureEngine.run_single_date(data_bundle) → feature_df（含 adapt_score）
   5. LabelEngine.generate_single_date → label_df
-  6. 合并、清洗、追加写入 CSV
+  6. 合并、清洗，写入分区 Parquet 存储（或追加写入 CSV）
   7. ProcessedDatesManager 标记已处理（写入成功后才标记，保证幂等）
+
+因子级增量重建（分区存储）：
+  修改单个因子时递增该因子类的 feature_version（而非 FACTOR_VERSION），
+  启动时对比各分区记录的因子版本，只重算变更因子（纯日线因子不加载分钟线）并把新列拼接进已有分区；
+  重算沿用分区内的候选股 / Top3 / 板块归属，任一候选股拿不到新值时该日改为整日重建
 """
 
-import json
 import os
 import sys
 import warnings
 from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List
 
 import pandas as pd
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from config.config import FILTER_BSE_STOCK, FILTER_STAR_BOARD, FILTER_688_BOARD
 from data.data_cleaner import data_cleaner
-from features import FeatureEngine, FeatureDataBundle
+from features import FeatureEngine, FeatureDataBundle, FeatureProfiler, CandidatePoolEngine
 from features.sector.sector_heat_feature import SectorHeatFeature
+from learnEngine.dataset_planner import DatasetDryRunPlanner
+from learnEngine.dataset_store import PartitionedDatasetStore, SpliceIncompleteError
 from learnEngine.label import LabelEngine
+from learnEngine.processed_dates import ProcessedDatesManager
 from utils.common_tools import (
-    get_stocks_in_sector,
-    filter_st_stocks,
     sort_by_recent_gain,
     get_trade_dates,
     get_daily_kline_data,
-    calc_limit_up_price,
 )
 from utils.log_utils import logger
 
 
-# ============================================================
-# 已处理日期管理（原子性读写，保证断点续跑幂等）
-# ============================================================
-
-class ProcessedDatesManager:
-    """管理已处理日期的读写，确保原子性"""
-
-    def __init__(self, file_path: str, factor_version: str):
-        self.file_path      = file_path
-        self.factor_version = factor_version
-        self.processed_dates = self._load()
-
-    def _load(self) -> List[str]:
-        """加载已处理日期；因子版本不一致则清空（强制重跑）"""
-        if not os.path.exists(self.file_path):
-            return []
-        try:
-            with open(self.file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if data.get("factor_version") != self.factor_version:
-                    logger.warning("因子版本变更，清空已处理记录（将重新生成全量数据）")
-                    return []
-                return sorted(data.get("processed_dates", []))
-        except Exception as e:
-            logger.error(f"加载已处理日期失败: {e}")
-            return []
-
-    def is_processed(self, date: str) -> bool:
-        return date in self.processed_dates
-
-    def add(self, date: str):
-        """添加并立即持久化（写入成功后调用，保证幂等）"""
-        if date not in self.processed_dates:
-            self.processed_dates.append(date)
-            self._save()
-
-    def reset(self):
-        """清空已处理记录（如训练集 CSV 被删除，需重新生成时调用）"""
-        self.processed_dates = []
-        if os.path.exists(self.file_path):
-            os.remove(self.file_path)
-        logger.warning("已处理日期记录已重置，将重新生成全量数据")
-
-    def _save(self):
-        with open(self.file_path, "w", encoding="utf-8") as f:
-            json.dump(
-                {"factor_version": self.factor_version,
-                 "processed_dates": sorted(self.processed_dates)},
-                f, ensure_ascii=False, indent=2
-            )
-
-
 # ============================================================
 # 数据集清洗器
 # ============================================================
@@ -101,8 +53,8 @@ class ProcessedDatesManager:
 class DataSetAssembler:
     """单日数据校验 & 清洗"""
 
-    # 价格为 0 必属异常的核心列（停牌/数据缺失导致，宁可丢行也不污染模型）
-    _PRICE_SANITY_COL = "stock_close_d0"
+    # 价格为 0 必属异常的核心列（停牌/数据缺失导致，宁可丢行也不污染模型；因子拼接沿用同一口径）
+    PRICE_SANITY_COL = "stock_close_d0"
 
     @staticmethod
     def validate_and_clean(df: pd.DataFrame) -> pd.DataFrame:
@@ -121,20 +73,21 @@ class DataSetAssembler:
         # ── 丢弃 D 日收盘价缺失或为零的行 ───────────────────────────────
         # 该列为零必然是停牌 / 数据入库异常，宁可损失训练样本，
         # 也不能让"收盘价=0"这种明显错误值进入特征矩阵污染模型。
-        if DataSetAssembler._PRICE_SANITY_COL in df.columns:
-            bad = df[DataSetAssembler._PRICE_SANITY_COL].isna() | \
-                  (df[DataSetAssembler._PRICE_SANITY_COL] <= 0)
+        if DataSetAssembler.PRICE_SANITY_COL in df.columns:
+            bad = df[DataSetAssembler.PRICE_SANITY_COL].isna() | \
+                  (df[DataSetAssembler.PRICE_SANITY_COL] <= 0)
             bad_count = int(bad.sum())
             if bad_count:
                 logger.warning(
-                    f"[DataSetAssembler] 丢弃 {DataSetAssembler._PRICE_SANITY_COL} "
+                    f"[DataSetAssembler] 丢弃 {DataSetAssembler.PRICE_SANITY_COL} "
                     f"异常行（停牌/数据缺失）: {bad_count} 行"
                 )
                 df = df[~bad]
 
         # ── 特征 NaN 填 0（中性值，与 FeatureDataBundle 设计对齐）────────
-        # 注意：label1/label2 已在上方 dropna 保证，此处 fillna 不会影响标签
-        df = df.fillna(0)
+        # 注意：label1/label2 已在上方 dropna 保证；附加标签（label_*）的 NaN 表示持有期超出数据，保留
+        fill_cols = [c for c in df.columns if not c.startswith("label_")]
+        df[fill_cols] = df[fill_cols].fillna(0)
         return df.reset_index(drop=True)
 
 
@@ -142,132 +95,6 @@ class DataSetAssembler:
 # 私有辅助函数
 # ============================================================
 
-def _filter_ts_code_by_board(ts_code_list: List[str]) -> List[str]:
-    """过滤北交所 / 科创板 / 创业板"""
-    result = []
-    for ts in ts_code_list:
-        if not ts:
-            continue
-        if FILTER_BSE_STOCK and (ts.endswith(".BJ") or ts.startswith(("83", "87", "88"))):
-            continue
-        if FILTER_688_BOARD and ts.startswith("688"):
-            continue
-        if FILTER_STAR_BOARD and ts.startswith(("300", "301", "302")) and ts.endswith(".SZ"):
-            continue
-        result.append(ts)
-    return result
-
-
-def _check_stock_has_limit_up(
-        ts_code_list: List[str], end_date: str, day_count: int = 10
-) -> Dict[str, bool]:
-    """批量判断近 N 日是否有涨停（保守逻辑：异常时全返回 True 保留所有股票）"""
-    if not ts_code_list or day_count <= 0 or not end_date:
-        return {ts: True for ts in ts_code_list}
-
-    try:
-        if len(end_date) == 8 and end_date.isdigit():
-            end_dt = datetime.strptime(end_date, "%Y%m%d")
-        else:
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-        end_fmt = end_dt.strftime("%Y-%m-%d")
-    except ValueError as e:
-        logger.error(f"日期解析失败: {end_date} | {e}")
-        return {ts: True for ts in ts_code_list}
-
-    try:
-        pre_end  = (end_dt - timedelta(days=1)).strftime("%Y-%m-%d")
-        start_dt = (end_dt - timedelta(days=60)).strftime("%Y-%m-%d")
-        dates    = get_trade_dates(start_dt, pre_end)[-day_count:]
-        if len(dates) < day_count:
-            logger.warning(f"回溯交易日不足 {day_count} 个，返回全 True")
-            return {ts: True for ts in ts_code_list}
-    except Exception as e:
-        logger.error(f"获取交易日失败: {e}")
-        return {ts: True for ts in ts_code_list}
-
-    try:
-        frames = []
-        for date in dates:
-            df = get_daily_kline_data(trade_date=date)
-            if not df.empty:
-                frames.append(df[df["ts_code"].isin(ts_code_list)].copy())
-        if not frames:
-            return {ts: True for ts in ts_code_list}
-        all_df = pd.concat(frames, ignore_index=True)
-    except Exception as e:
-        logger.error(f"日线数据获取失败: {e}")
-        return {ts: True for ts in ts_code_list}
-
-    # 逐股判断是否有涨停
-    result = {ts: False for ts in ts_code_list}
-    for _, row in all_df.iterrows():
-        ts    = row["ts_code"]
-        pre_c = row.get("pre_close", 0)
-        close = row.get("close", 0)
-        if pre_c <= 0 or close <= 0:
-            continue
-        limit = calc_limit_up_price(ts, pre_c)
-        if limit > 0 and (abs(close - limit) <= 0.001 or close >= limit):
-            result[ts] = True
-
-    logger.info(
-        f"近 {day_count} 日涨停判断完成 | 候选: {len(ts_code_list)} | 有涨停基因: {sum(result.values())}"
-    )
-    return result
-
-
-def _filter_limit_up_on_d0(daily_df: pd.DataFrame) -> pd.DataFrame:
-    """
-    过滤 D 日涨停封板的股票（收盘价 == 涨停价，买不进去）
-    :param daily_df: D 日候选股日线 DataFrame（含 ts_code, pre_close, close）
-    :return: 过滤后的 DataFrame
-    """
-    if daily_df.empty:
-        return daily_df
-
-    keep_mask = []
-    for _, row in daily_df.iterrows():
-        ts_code   = row["ts_code"]
-        pre_close = row.get("pre_close", 0)
-        close     = row.get("close", 0)
-        if pre_close <= 0 or close <= 0:
-            keep_mask.append(True)  # 数据异常，保守保留
-            continue
-        limit_up = calc_limit_up_price(ts_code, pre_close)
-        if limit_up > 0 and close >= limit_up - 0.01:
-            keep_mask.append(False)  # D 日涨停封板，过滤
-        else:
-            keep_mask.append(True)
-
-    filtered = daily_df[keep_mask].copy()
-    removed  = len(daily_df) - len(filtered)
-    if removed > 0:
-        logger.info(f"[D日涨停过滤] 过滤涨停封板股: {removed} 只")
-    return filtered
-
-
-# 低流动性过滤阈值（成交额，单位：万元；tushare amount 单位为千元）
-MIN_AMOUNT_THRESHOLD = 10000  # 1000万元 = 10000千元
-
-
-def _filter_low_liquidity(daily_df: pd.DataFrame) -> pd.DataFrame:
-    """
-    过滤成交额极低的股票（策略买不进去，加入训练集只会引入噪声）
-    :param daily_df: D 日候选股日线 DataFrame（含 amount 列，单位千元）
-    :return: 过滤后的 DataFrame
-    """
-    if daily_df.empty or "amount" not in daily_df.columns:
-        return daily_df
-
-    before = len(daily_df)
-    filtered = daily_df[daily_df["amount"] >= MIN_AMOUNT_THRESHOLD].copy()
-    removed = before - len(filtered)
-    if removed > 0:
-        logger.info(f"[低流动性过滤] 过滤成交额 < {MIN_AMOUNT_THRESHOLD}千元股: {removed} 只")
-    return filtered
-
-
 def validate_train_dataset(csv_path: str) -> pd.DataFrame:
     """最终训练集全量校验"""
     if not os.path.exists(csv_path):
@@ -297,6 +124,270 @@ def validate_train_dataset(csv_path: str) -> pd.DataFrame:
     return df
 
 
+# ============================================================
+# 训练集口径版本
+# ============================================================
+
+# 全局口径（标签 / 清洗规则）变更时更新版本号 → 全量重建；
+# 单个因子的逻辑变更只需递增该因子类的 feature_version → 仅重算该因子并拼接列（需分区存储）。
+# 推理侧（模型清单校验、打分缓存目录）以此作为"当前代码口径"
+FACTOR_VERSION = "v4.1_exchange_limit_price"
+
+
+# ============================================================
+# 单日构建 + 按交易日顺序提交（支持多日期并发）
+# ============================================================
+
+# 单日处理结果状态
+DATE_OK      = "ok"        # 成功，待写入
+DATE_EMPTY   = "empty"     # 数据合理缺失（Top3 / 候选池为空），重置连续失败计数
+DATE_SKIPPED = "skipped"   # 特征 / 标签 / 清洗后为空，跳过但不影响连续失败计数
+DATE_ERROR   = "error"     # 异常，计入连续失败
+
+# 连续失败计数器阈值：超阈值直接退出，避免系统性故障下静默空跑
+MAX_CONSECUTIVE_FAILS = 5   # 连续 5 个日期失败 → 视为系统性异常，终止
+
+
+def build_single_date(date: str, feature_engine: FeatureEngine, label_engine: LabelEngine,
+                      sector_heat: SectorHeatFeature, profiler: FeatureProfiler = None):
+    """
+    单日训练样本构建（Step 1 ~ 7，不含写盘；各日期之间无共享可变状态，可并发调用）
+
+    :return: (status, clean_df)，status 为 DATE_OK / DATE_EMPTY / DATE_SKIPPED；异常直接抛出
+    """
+    logger.info(f"\n========== 处理日期: {date} ==========")
+    # ---- Step 1: Top3 板块 + 轮动分（必须先于候选池构建）----
+    top3_result   = sector_heat.select_top3_hot_sectors(trade_date=date)
+    top3_sectors  = top3_result["top3_sectors"]
+    adapt_score   = top3_result["adapt_score"]
+
+    if not top3_sectors:
+        logger.warning(f"{date} Top3 板块为空，跳过")
+        return DATE_EMPTY, None   # 数据合理缺失，非系统性错误
+
+    # ---- Step 2: ST + 宏观数据入库 ----
+    date_fmt = date.replace("-", "")
+    try:
+        data_cleaner.insert_stock_st(trade_date=date_fmt)
+    except Exception as e:
+        logger.error(f"{date} ST 数据入库失败: {e}", exc_info=True)
+    try:
+        data_cleaner.clean_and_insert_limit_list_ths(trade_date=date_fmt, limit_type="涨停池")
+        data_cleaner.clean_and_insert_limit_list_ths(trade_date=date_fmt, limit_type="跌停池")
+        data_cleaner.clean_and_insert_limit_step(trade_date=date_fmt)
+        data_cleaner.clean_and_insert_limit_cpt_list(trade_date=date_fmt)
+        data_cleaner.clean_and_insert_index_daily(trade_date=date_fmt)
+    except Exception as e:
+        logger.error(f"{date} 宏观数据入库失败: {e}", exc_info=True)
+
+    # ---- Step 3: 构建板块候选池（与实盘策略共用 CandidatePoolEngine）----
+    daily_df = get_daily_kline_data(date)   # 当日全市场日线（预取，后续复用）
+    sector_candidate_map, target_ts_codes = CandidatePoolEngine().build(date, daily_df, top3_sectors)
+
+    # ---- Step 4: 构建数据容器（一次 IO 覆盖所有因子）----
+    if not target_ts_codes:
+        logger.warning(f"{date} 候选池为空，跳过")
+        return DATE_EMPTY, None   # 候选池为空属于正常数据情况
+
+    data_bundle = FeatureDataBundle(
+        trade_date           = date,
+        target_ts_codes      = target_ts_codes,
+        sector_candidate_map = sector_candidate_map,
+        top3_sectors         = top3_sectors,
+        adapt_score          = adapt_score,   # 注入，avoid 重复计算
+        load_minute          = True,
+        profiler             = profiler,
+    )
+
+    # ---- Step 5: 特征计算（adapt_score 已在 bundle 中，自动输出到 feature_df）----
+    feature_df = feature_engine.run_single_date(data_bundle)
+    if feature_df.empty:
+        logger.warning(f"{date} 特征计算失败，跳过")
+        return DATE_SKIPPED, None
+
+    # ---- Step 6: 标签生成 ----
+    label_df = label_engine.generate_single_date(
+        date, feature_df["stock_code"].unique().tolist()
+    )
+    if label_df.empty:
+        logger.warning(f"{date} 标签生成失败，跳过")
+        return DATE_SKIPPED, None
+
+    # ---- Step 7: 合并 & 清洗 ----
+    merged   = pd.merge(feature_df, label_df, on=["stock_code", "trade_date"], how="left")
+    clean_df = DataSetAssembler.validate_and_clean(merged)
+    if clean_df.empty:
+        logger.warning(f"{date} 清洗后无有效数据，跳过")
+        return DATE_SKIPPED, None
+
+    return DATE_OK, clean_df
+
+
+def splice_single_date(date: str, feature_engine: FeatureEngine, store: PartitionedDatasetStore,
+                       feature_names: List[str], profiler: FeatureProfiler = None):
+    """
+    单日因子增量重算：按分区已有的候选股 / Top3 / 板块归属重建数据容器，只运行 feature_names 中的因子
+    （不按当前 DB 重新选板块 / 构建候选池，保证拼接的新列与分区已有行一一对应；
+     宏观 / ST 数据在首次构建时已入库，不重复拉取；无因子依赖分钟线时跳过分钟线加载）
+
+    :return: {因子名: 因子输出}；因子计算失败返回 None（保留原分区，下次启动重试）
+    :raises SpliceIncompleteError: 分区缺少 Top3 / 板块归属，或有候选股 D 日无日线（需整日重建）
+    """
+    logger.info(f"\n========== 因子增量重算: {date} | {feature_names} ==========")
+    context = store.read_date_context(date)
+    if not context or not context["top3_sectors"] or not context["sector_map"]:
+        raise SpliceIncompleteError(f"{date} 分区缺少 Top3 / 板块归属，无法按原候选池重算")
+
+    daily_df = get_daily_kline_data(date)
+    daily_df = daily_df.drop_duplicates(subset=["ts_code"]).set_index("ts_code", drop=False) \
+        if not daily_df.empty else daily_df
+    lost = [c for c in context["stock_codes"] if daily_df.empty or c not in daily_df.index]
+    if lost:
+        raise SpliceIncompleteError(f"{date} 分区内 {len(lost)} 只候选股 D 日无日线（如 {lost[:5]}）")
+
+    # 候选池：分区内各板块的候选股（保持分区行顺序）对应的 D 日日线
+    sector_candidate_map = {
+        sector: daily_df.loc[codes].reset_index(drop=True) if codes else pd.DataFrame()
+        for sector, codes in ((s, context["sector_map"].get(s, [])) for s in context["top3_sectors"])
+    }
+    load_minute = any(f.requires_minute for f in feature_engine.features if f.feature_name in feature_names)
+    data_bundle = FeatureDataBundle(
+        trade_date           = date,
+        target_ts_codes      = context["stock_codes"],
+        sector_candidate_map = sector_candidate_map,
+        top3_sectors         = context["top3_sectors"],
+        adapt_score          = context["adapt_score"],
+        load_minute          = load_minute,
+        profiler             = profiler,
+    )
+    return feature_engine.run_features(data_bundle, feature_names)
+
+
+def run_single_date_safe(date: str, feature_engine: FeatureEngine, label_engine: LabelEngine,
+                         sector_heat: SectorHeatFeature, profiler: FeatureProfiler = None):
+    """build_single_date 的异常兜底包装：(status, clean_df, error)，异常在提交阶段按日期顺序计数"""
+    try:
+        status, clean_df = build_single_date(date, feature_engine, label_engine, sector_heat, profiler)
+        return status, clean_df, None
+    except Exception as e:
+        logger.error(f"{date} 构建失败: {e}", exc_info=True)
+        return DATE_ERROR, None, e
+
+
+def iter_ordered_results(dates: List[str], fn, workers: int = 1):
+    """
+    并发执行 fn(date)，按 dates 原始顺序逐个产出 (date, result)
+    在途任务数上限 workers × 2（滑动窗口，控制内存）；workers <= 1 时逐日串行
+    调用方中途退出（如连续失败终止）时取消尚未开始的任务
+    """
+    if workers <= 1:
+        for date in dates:
+            yield date, fn(date)
+        return
+
+    pool     = ThreadPoolExecutor(max_workers=workers)
+    date_it  = iter(dates)
+    pending  = {d: pool.submit(fn, d) for d in islice(date_it, workers * 2)}
+    try:
+        for date in dates:
+            result = pending.pop(date).result()
+            nxt = next(date_it, None)
+            if nxt is not None:
+                pending[nxt] = pool.submit(fn, nxt)
+            yield date, result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class OrderedDateCommitter:
+    """
+    按交易日顺序提交单日结果：列对齐 → 分区写入 / CSV 追加 → ProcessedDatesManager 标记
+    调用顺序即提交顺序，保证已标记日期之前的所有日期均已落定，崩溃后续跑结果与串行一致
+    """
+
+    def __init__(self, csv_path: str, dates_manager: ProcessedDatesManager,
+                 max_consecutive_fails: int = MAX_CONSECUTIVE_FAILS,
+                 store: PartitionedDatasetStore = None, feature_engine: FeatureEngine = None):
+        self.csv_path              = csv_path
+        self.dates_manager         = dates_manager
+        self.max_consecutive_fails = max_consecutive_fails
+        self.consecutive_fails     = 0
+        # 传入 store 时写分区 Parquet（列对齐由 store 的固定 schema 负责），否则追加 CSV
+        self.store                 = store
+        # 提供日级全局列（FeatureEngine.global_columns），store 据此把全局列拆到每日一行的全局表
+        self.feature_engine        = feature_engine
+
+        # ---------- CSV 写入模式 ----------
+        self.first_write   = not os.path.exists(csv_path)
+        self.fixed_columns = None
+        if store is None and not self.first_write:
+            self.fixed_columns = pd.read_csv(csv_path, nrows=0).columns.tolist()
+            logger.info(f"断点续跑 | 固定列数: {len(self.fixed_columns)}")
+
+    def commit(self, date: str, status: str, clean_df: pd.DataFrame = None, error: Exception = None):
+        if status == DATE_EMPTY:
+            self.consecutive_fails = 0
+            return
+        if status == DATE_SKIPPED:
+            return
+        if status == DATE_ERROR:
+            self._on_error(date, error)
+            return
+
+        try:
+            if self.store is not None:
+                # ---- Step 8 + 9: 按固定 schema 对齐并原子写入单日分区 ----
+                global_columns = self.feature_engine.global_columns if self.feature_engine else None
+                self.store.write_date(date, clean_df, global_columns=global_columns)
+            else:
+                self._append_csv(clean_df)
+        except Exception as e:
+            self._on_error(date, e)
+            return
+
+        # ---- Step 10: 标记已处理（写入成功后才标记，保证幂等）----
+        # 用独立 try 包裹：若 JSON 写盘失败（磁盘满等），不应影响数据，
+        # 下次启动时由"启动一致性检查"补充标记即可
+        try:
+            self.dates_manager.add(date)
+        except Exception as mark_err:
+            logger.warning(
+                f"{date} 标记已处理失败（数据已写入，下次启动将自动补偿）: {mark_err}"
+            )
+
+        self.consecutive_fails = 0  # 本日成功，重置计数器
+        logger.info(f"✅ {date} 处理完成，写入 {len(clean_df)} 行")
+
+    def _append_csv(self, clean_df: pd.DataFrame):
+        # ---- Step 8: 列对齐（断点续跑时保持列顺序一致）----
+        if self.first_write:
+            self.fixed_columns = clean_df.columns.tolist()
+        else:
+            clean_df = clean_df.reindex(columns=self.fixed_columns, fill_value=0)
+
+        # ---- Step 9: 原子性写入 ----
+        clean_df.to_csv(
+            self.csv_path,
+            mode="a", header=self.first_write,
+            index=False, encoding="utf-8-sig"
+        )
+        self.first_write = False
+
+    def _on_error(self, date: str, error: Exception):
+        self.consecutive_fails += 1
+        logger.error(
+            f"{date} 处理失败 (连续失败 {self.consecutive_fails}/{self.max_consecutive_fails}): {error}"
+        )
+        if self.consecutive_fails >= self.max_consecutive_fails:
+            logger.critical(
+                f"连续 {self.max_consecutive_fails} 个日期处理失败，"
+                f"疑似系统性故障（DB 断连 / 数据异常），终止训练集生成"
+            )
+            raise RuntimeError(
+                f"训练集生成异常退出：连续 {self.max_consecutive_fails} 个日期失败"
+            ) from error
+
+
 # ============================================================
 # 主流程入口
 # ============================================================
@@ -310,36 +401,70 @@ if __name__ == "__main__":
     START_DATE            = "2024-11-02"
     END_DATE              = "2026-03-11"
     OUTPUT_CSV_PATH       = os.path.join(os.getcwd(), "train_dataset_final.csv")
+    # 分区 Parquet 存储目录（按月分区、一日一文件，schema 与 FACTOR_VERSION 绑定）；None 退回追加 CSV
+    OUTPUT_STORE_DIR      = os.path.join(os.getcwd(), "train_dataset_store")
     PROCESSED_DATES_FILE  = "processed_dates.json"
-    # 因子逻辑有变更（新增列、修改计算公式）时必须更新版本号，否则旧数据不会重跑
-    FACTOR_VERSION        = "v3.9_vol_ratio_normalized_ma_clean"
+    # 并发处理的日期数（1 = 逐日串行；>1 时按交易日顺序提交，结果与串行一致）
+    DATASET_WORKERS       = 1
+    # 性能剖析报告（.csv / .json），None 关闭剖析（开启后因子串行执行，且日期强制串行）
+    PROFILE_REPORT_PATH   = None
+    # 标签区间模式：一次加载待处理区间的 D..D+h 日线面板算出全部标签（False = 逐日查询）
+    LABEL_RANGE_MODE      = True
+    # 附加标签 {列名: (持有期 h, 收益阈值)}，D+1 开盘买入持有至 D+h 收盘；新增后需更新 FACTOR_VERSION
+    EXTRA_LABELS          = {}
+    # 预演模式：只读 DB 走一遍待处理区间，估算 API 调用数 / DB 读取行数 / 墙钟后退出（不调接口、不写训练集）
+    DRY_RUN               = False
     # =====================================================
 
     # ---------- 初始化核心组件 ----------
-    feature_engine    = FeatureEngine()          # 使用 features/__init__.py 的新引擎
-    label_engine      = LabelEngine(START_DATE, END_DATE)
+    profiler          = FeatureProfiler() if PROFILE_REPORT_PATH else None
+    # CPU / 内存增量为进程级指标，多日期并发时互相叠加无法归因 → 剖析时日期串行
+    date_workers      = 1 if profiler is not None else DATASET_WORKERS
+    if profiler is not None and DATASET_WORKERS > 1:
+        logger.warning(f"[Profiler] 性能剖析已开启，DATASET_WORKERS={DATASET_WORKERS} 改为逐日串行")
+    feature_engine    = FeatureEngine(profiler=profiler)   # 使用 features/__init__.py 的新引擎
+    label_engine      = LabelEngine(START_DATE, END_DATE, extra_labels=EXTRA_LABELS)
     sector_heat       = SectorHeatFeature()
     dates_manager     = ProcessedDatesManager(PROCESSED_DATES_FILE, FACTOR_VERSION)
+    store             = (
+        PartitionedDatasetStore(OUTPUT_STORE_DIR, FACTOR_VERSION, feature_engine.feature_versions())
+        if OUTPUT_STORE_DIR else None
+    )
+    # 因子版本变更：旧存储归档保留，新版本从空目录重建（与 dates_manager 清空记录同步）
+    if store is not None and store.version_mismatch:
+        store.archive()
+
+    def _output_exists() -> bool:
+        return store.exists() if store is not None else os.path.exists(OUTPUT_CSV_PATH)
+
+    def _validate_output():
+        if store is not None:
+            store.validate()
+        else:
+            validate_train_dataset(OUTPUT_CSV_PATH)
 
     # ---------- 确定待处理日期 ----------
     all_trade_dates = get_trade_dates(START_DATE, END_DATE)
     to_process      = [d for d in all_trade_dates if not dates_manager.is_processed(d)]
 
     # ── 启动一致性检查 ─────────────────────────────────────────────────────
-    # 场景：进程在"CSV 写入成功"与"标记已处理"之间崩溃
+    # 场景：进程在"数据写入成功"与"标记已处理"之间崩溃
     # 结果：数据已落盘但未标记 → 下次启动会重跑该日，写入重复行
-    # 修复：读取 CSV 中已有的日期，对未标记但已有数据的日期补充标记，
-    #       避免重复写入（最终校验的 deduplicate 作为兜底）
-    if os.path.exists(OUTPUT_CSV_PATH) and to_process:
+    # 修复：读取已有数据的日期（分区存储直接取文件名，CSV 只读 trade_date 列），
+    #       对未标记但已有数据的日期补充标记，避免重复写入（最终校验的 deduplicate 作为兜底）
+    if _output_exists() and to_process:
         try:
-            csv_dates = set(
-                pd.read_csv(OUTPUT_CSV_PATH, usecols=["trade_date"])["trade_date"]
-                .astype(str).unique()
-            )
-            retroactive = csv_dates & set(all_trade_dates) - set(dates_manager.processed_dates)
+            if store is not None:
+                written_dates = set(store.list_dates())
+            else:
+                written_dates = set(
+                    pd.read_csv(OUTPUT_CSV_PATH, usecols=["trade_date"])["trade_date"]
+                    .astype(str).unique()
+                )
+            retroactive = written_dates & set(all_trade_dates) - set(dates_manager.processed_dates)
             if retroactive:
                 logger.info(
-                    f"启动一致性修复：CSV 中已有数据但未标记完成的日期 → {sorted(retroactive)}，"
+                    f"启动一致性修复：训练集中已有数据但未标记完成的日期 → {sorted(retroactive)}，"
                     f"自动补充标记（避免重复写入）"
                 )
                 for d in sorted(retroactive):
@@ -348,197 +473,88 @@ if __name__ == "__main__":
         except Exception as e:
             logger.warning(f"启动一致性检查失败（忽略，继续正常处理）: {e}")
 
-    # ── CSV 删除但全部日期已标记 → 重置 ────────────────────────────────────
-    if not to_process and not os.path.exists(OUTPUT_CSV_PATH):
-        logger.warning("训练集 CSV 不存在但所有日期已标记为处理完成，重置记录并重新生成")
+    # ── 预演模式：估算本次运行成本后退出（训练集缺失时按全量重建估算，不重置记录）──────
+    if DRY_RUN:
+        plan_dates = to_process if (to_process or _output_exists()) else list(all_trade_dates)
+        if store is not None and store.exists():
+            stale = store.stale_features()
+            if stale:
+                logger.info(f"[DryRun] 另有 {len(stale)} 个分区待因子增量重算（未计入估算）")
+        planner = DatasetDryRunPlanner(sector_heat, workers=DATASET_WORKERS)
+        planner.plan(plan_dates)
+        planner.log_report()
+        exit(0)
+
+    # ── 因子级增量重建：因子版本落后的已有分区只重算变更因子并拼接列 ─────────────
+    if store is not None and store.exists():
+        stale = store.stale_features()
+        if stale:
+            logger.info(f"因子版本变更，增量重算 {len(stale)} 个分区: "
+                        f"{sorted({n for names in stale.values() for n in names})}")
+
+            def _splice_date(date):
+                try:
+                    return splice_single_date(date, feature_engine, store, stale[date], profiler)
+                except SpliceIncompleteError as e:
+                    return e
+                except Exception as e:
+                    logger.error(f"{date} 因子增量重算失败: {e}", exc_info=True)
+                    return None
+
+            # 无法按原候选池完整拼接的日期改为整日重建（本次运行随待处理日期一起重跑，
+            # 重建前分区保持原样且版本仍落后，中断后下次启动会再次走到这里）
+            rebuild_dates = []
+            for date, outputs in iter_ordered_results(sorted(stale), _splice_date, date_workers):
+                if not outputs:
+                    logger.warning(f"{date} 因子增量重算无结果，保留原分区（下次启动重试）")
+                    continue
+                try:
+                    if isinstance(outputs, SpliceIncompleteError):
+                        raise outputs
+                    store.splice_date(date, outputs, sanity_col=DataSetAssembler.PRICE_SANITY_COL)
+                except SpliceIncompleteError as e:
+                    logger.warning(f"{e} → 整日重建")
+                    rebuild_dates.append(date)
+            outside = [d for d in rebuild_dates if d not in set(all_trade_dates)]
+            if outside:
+                logger.warning(f"{outside} 不在本次日期区间内，保留原分区（区间覆盖这些日期时再重建）")
+            rebuild_dates = [d for d in rebuild_dates if d not in set(outside)]
+            if rebuild_dates:
+                logger.info(f"整日重建 {len(rebuild_dates)} 个无法拼接的分区: {rebuild_dates}")
+                to_process = sorted(set(to_process) | set(rebuild_dates))
+
+    # ── 训练集删除但全部日期已标记 → 重置 ─────────────────────────────────
+    if not to_process and not _output_exists():
+        logger.warning("训练集不存在但所有日期已标记为处理完成，重置记录并重新生成")
         dates_manager.reset()
         to_process = list(all_trade_dates)
     if not to_process:
         logger.info("✅ 所有日期已处理完成！")
-        validate_train_dataset(OUTPUT_CSV_PATH)
+        _validate_output()
         exit(0)
     logger.info(f"待处理日期（共 {len(to_process)} 个）: {to_process}")
+    if LABEL_RANGE_MODE:
+        label_engine.load_range(to_process)
 
-    # ── 连续失败计数器：超阈值直接退出，避免系统性故障下静默空跑 ──────────────
-    MAX_CONSECUTIVE_FAILS = 5   # 连续 5 个日期失败 → 视为系统性异常，终止
-    consecutive_fails = 0
-
-    # ---------- CSV 写入模式 ----------
-    first_write   = not os.path.exists(OUTPUT_CSV_PATH)
-    fixed_columns = None
-    if not first_write:
-        fixed_columns = pd.read_csv(OUTPUT_CSV_PATH, nrows=0).columns.tolist()
-        logger.info(f"断点续跑 | 固定列数: {len(fixed_columns)}")
-
-    # ==================== 逐日原子性处理 ====================
-    for date in to_process:
-        logger.info(f"\n========== 处理日期: {date} ==========")
-        try:
-            # ---- Step 1: Top3 板块 + 轮动分（必须先于候选池构建）----
-            top3_result   = sector_heat.select_top3_hot_sectors(trade_date=date)
-            top3_sectors  = top3_result["top3_sectors"]
-            adapt_score   = top3_result["adapt_score"]
-
-            if not top3_sectors:
-                logger.warning(f"{date} Top3 板块为空，跳过")
-                consecutive_fails = 0  # 数据合理缺失，非系统性错误
-                continue
-
-            # ---- Step 2: ST + 宏观数据入库 ----
-            date_fmt = date.replace("-", "")
-            try:
-                data_cleaner.insert_stock_st(trade_date=date_fmt)
-            except Exception as e:
-                logger.error(f"{date} ST 数据入库失败: {e}", exc_info=True)
-            try:
-                data_cleaner.clean_and_insert_limit_list_ths(trade_date=date_fmt, limit_type="涨停池")
-                data_cleaner.clean_and_insert_limit_list_ths(trade_date=date_fmt, limit_type="跌停池")
-                data_cleaner.clean_and_insert_limit_step(trade_date=date_fmt)
-                data_cleaner.clean_and_insert_limit_cpt_list(trade_date=date_fmt)
-                data_cleaner.clean_and_insert_index_daily(trade_date=date_fmt)
-            except Exception as e:
-                logger.error(f"{date} 宏观数据入库失败: {e}", exc_info=True)
-
-            # ---- Step 3: 构建板块候选池 ----
-            daily_df          = get_daily_kline_data(date)   # 当日全市场日线（预取，后续复用）
-            sector_candidate_map: Dict = {}
-
-            for sector in top3_sectors:
-                logger.info(f"处理板块: {sector}")
-                try:
-                    raw_stocks = get_stocks_in_sector(sector)
-                    if not raw_stocks:
-                        logger.warning(f"[{sector}] 无股票，跳过")
-                        sector_candidate_map[sector] = pd.DataFrame()
-                        continue
-
-                    ts_codes = [item["ts_code"] for item in raw_stocks]
-
-                    # 板块过滤（北交所 / 科创 / 创业板）
-                    ts_codes = _filter_ts_code_by_board(ts_codes)
-                    if not ts_codes:
-                        sector_candidate_map[sector] = pd.DataFrame()
-                        continue
-
-                    # ST 过滤
-                    ts_codes = filter_st_stocks(ts_codes, date)
-                    if not ts_codes:
-                        sector_candidate_map[sector] = pd.DataFrame()
-                        continue
-
-                    # 过滤当日无日线数据的股票
-                    sector_daily = daily_df[daily_df["ts_code"].isin(ts_codes)].copy()
-                    if sector_daily.empty:
-                        sector_candidate_map[sector] = pd.DataFrame()
-                        continue
-
-                    # 近 10 日涨停基因过滤（仅保留有涨停基因的个股）
-                    candidates   = sector_daily["ts_code"].unique().tolist()
-                    limit_up_map = _check_stock_has_limit_up(candidates, date, day_count=10)
-                    keep         = [ts for ts, has in limit_up_map.items() if has]
-                    sector_daily = sector_daily[sector_daily["ts_code"].isin(keep)]
-
-                    # D 日涨停封板过滤（收盘价==涨停价，买不进去）
-                    sector_daily = _filter_limit_up_on_d0(sector_daily)
-
-                    # 低流动性过滤
-                    sector_daily = _filter_low_liquidity(sector_daily)
-
-                    sector_candidate_map[sector] = sector_daily
-                    logger.info(f"[{sector}] 最终候选股: {len(sector_candidate_map[sector])}")
-
-                except Exception as e:
-                    logger.error(f"[{sector}] 处理失败: {e}", exc_info=True)
-                    sector_candidate_map[sector] = pd.DataFrame()
-
-            # ---- Step 4: 构建数据容器（一次 IO 覆盖所有因子）----
-            target_ts_codes = list({
-                ts
-                for df in sector_candidate_map.values()
-                if not df.empty
-                for ts in df["ts_code"].tolist()
-            })
-            if not target_ts_codes:
-                logger.warning(f"{date} 候选池为空，跳过")
-                consecutive_fails = 0  # 候选池为空属于正常数据情况
-                continue
-
-            data_bundle = FeatureDataBundle(
-                trade_date           = date,
-                target_ts_codes      = target_ts_codes,
-                sector_candidate_map = sector_candidate_map,
-                top3_sectors         = top3_sectors,
-                adapt_score          = adapt_score,   # 注入，avoid 重复计算
-                load_minute          = True,
-            )
-
-            # ---- Step 5: 特征计算（adapt_score 已在 bundle 中，自动输出到 feature_df）----
-            feature_df = feature_engine.run_single_date(data_bundle)
-            if feature_df.empty:
-                logger.warning(f"{date} 特征计算失败，跳过")
-                continue
-
-            # ---- Step 6: 标签生成 ----
-            label_df = label_engine.generate_single_date(
-                date, feature_df["stock_code"].unique().tolist()
-            )
-            if label_df.empty:
-                logger.warning(f"{date} 标签生成失败，跳过")
-                continue
-
-            # ---- Step 7: 合并 & 清洗 ----
-            merged   = pd.merge(feature_df, label_df, on=["stock_code", "trade_date"], how="left")
-            clean_df = DataSetAssembler.validate_and_clean(merged)
-            if clean_df.empty:
-                logger.warning(f"{date} 清洗后无有效数据，跳过")
-                continue
-
-            # ---- Step 8: 列对齐（断点续跑时保持列顺序一致）----
-            if first_write:
-                fixed_columns = clean_df.columns.tolist()
-            else:
-                clean_df = clean_df.reindex(columns=fixed_columns, fill_value=0)
-
-            # ---- Step 9: 原子性写入 ----
-            clean_df.to_csv(
-                OUTPUT_CSV_PATH,
-                mode="a", header=first_write,
-                index=False, encoding="utf-8-sig"
-            )
-            first_write = False
-
-            # ---- Step 10: 标记已处理（写入成功后才标记，保证幂等）----
-            # 用独立 try 包裹：若 JSON 写盘失败（磁盘满等），不应影响数据，
-            # 下次启动时由"启动一致性检查"补充标记即可
-            try:
-                dates_manager.add(date)
-            except Exception as mark_err:
-                logger.warning(
-                    f"{date} 标记已处理失败（数据已写入，下次启动将自动补偿）: {mark_err}"
-                )
+    # ==================== 逐日处理 + 按交易日顺序提交 ====================
+    # DATASET_WORKERS > 1 时多个日期并发计算（线程共享 DB 连接池与分钟线 API 信号量），
+    # 结果严格按交易日顺序提交（分区写入 / CSV 追加 + 标记已处理），崩溃后续跑与单线程结果一致
+    committer = OrderedDateCommitter(OUTPUT_CSV_PATH, dates_manager, store=store,
+                                     feature_engine=feature_engine)
 
-            consecutive_fails = 0  # 本日成功，重置计数器
-            logger.info(f"✅ {date} 处理完成，写入 {len(clean_df)} 行")
+    def _run_date(date):
+        return run_single_date_safe(date, feature_engine, label_engine, sector_heat, profiler)
 
-        except Exception as e:
-            consecutive_fails += 1
-            logger.error(
-                f"{date} 处理失败 (连续失败 {consecutive_fails}/{MAX_CONSECUTIVE_FAILS}): {e}",
-                exc_info=True,
-            )
-            if consecutive_fails >= MAX_CONSECUTIVE_FAILS:
-                logger.critical(
-                    f"连续 {MAX_CONSECUTIVE_FAILS} 个日期处理失败，"
-                    f"疑似系统性故障（DB 断连 / 数据异常），终止训练集生成"
-                )
-                raise RuntimeError(
-                    f"训练集生成异常退出：连续 {MAX_CONSECUTIVE_FAILS} 个日期失败"
-                ) from e
-            continue
+    for date, (status, clean_df, error) in iter_ordered_results(to_process, _run_date, date_workers):
+        committer.commit(date, status, clean_df, error)
 
     # ==================== 最终校验 ====================
     logger.info("\n========== 全量处理完成 ==========")
-    if os.path.exists(OUTPUT_CSV_PATH):
-        validate_train_dataset(OUTPUT_CSV_PATH)
+    dates_manager.compact()   # 追加日志并入快照，processed_dates.json 即完整记录
+    if profiler is not None:
+        profiler.log_summary()
+        profiler.save(PROFILE_REPORT_PATH)
+    if _output_exists():
+        _validate_output()
     else:
         logger.error("❌ 训练集生成失败！")
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+训练集生成预演规划器 (DatasetDryRunPlanner)
+==========================================
+长时间运行 dataset.py 之前，按交易日历走一遍待处理区间，只做 DB 读取、不调用任何 Tushare 接口、
+不写训练集，估算本次运行需要的 API 调用数 / DB 读取行数 / 墙钟耗时：
+
+    每个待处理日期：
+      Top3 板块（与正式流程同一 select_top3_hot_sectors，DB + 进程级缓存）
+      → 候选池（CandidatePoolEngine，D 日全市场日线 1 次查询 + ST / 涨停基因）
+      → 按 FeatureDataBundle 的窗口登记 (股票, 日期) 需求：
+            kline_day     : 近 20 日 + 近 20 日涨幅基准日
+            kline_day_qfq : 近 20 日
+            kline_min     : 近 5 日（DB 未命中 → 逐只 API 补拉）
+      → 分块 GROUP BY 计数查询各表已缓存的 (股票, 日期) 与行数
+        （相邻日期窗口重叠，已查过的组合在进程内复用，不重复计数查询）
+
+API 调用：
+    分钟线   : 全区间去重后的 DB 未命中 (股票, 日期)，每个 1 次 stk_mins（首次补拉后即入库，后续日期命中）
+    日级入库 : build_single_date Step 2 每日无条件调用的入库接口（ST / 涨跌停池 / 连板 / 最强板块 / 指数）
+
+墙钟估算（与 data_cleaner / data_fetcher 当前限流参数一致）：
+    分钟线   : 调用数 × (API_REQUEST_INTERVAL + 接口往返) / 并发信号量；限流模式每次再加 3s
+    日级入库 : 调用数 × (API_REQUEST_INTERVAL + 接口往返)，按 DATASET_WORKERS 并发摊薄
+    DB 读取  : 读取行数 / 实测吞吐（用首个有候选的日期跑一次真实预取校准，仅读 DB）
+    候选池   : 预演过程中实测的逐日候选池构建耗时
+
+用法：dataset.py 中设置 DRY_RUN = True，或
+    planner = DatasetDryRunPlanner(sector_heat)
+    planner.plan(to_process)
+    planner.log_report()
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from data.data_fetcher import API_REQUEST_INTERVAL
+from features.candidate_pool import CandidatePoolEngine
+from features.prefetch_planner import BundlePrefetchPlanner
+from utils.common_tools import get_daily_kline_data, get_trade_dates
+from utils.db_utils import db
+from utils.log_utils import logger
+
+# 单条计数查询 IN 列表的股票数上限（与 BundlePrefetchPlanner 一致）
+_CODE_CHUNK_SIZE = 500
+# 单次 Tushare 接口往返耗时经验值（秒，不含 API_REQUEST_INTERVAL 固定等待）
+_API_LATENCY_S = 0.5
+# 分钟线接口并发上限 / 限流模式额外等待（与 data_cleaner 的 _TUSHARE_MIN_API_SEM / _THROTTLE_MIN_INTERVAL 一致）
+_MINUTE_API_CONCURRENCY = 2
+_MINUTE_THROTTLE_INTERVAL = 3.0
+# 单只股票单日分钟线行数（09:30-11:30 + 13:00-15:00，含集合竞价约 241 条）
+_MINUTE_ROWS_PER_KEY = 241
+# build_single_date Step 2 每日无条件调用的入库接口数
+_DAILY_INGEST_API_CALLS = {
+    "stock_st":       1,
+    "limit_list_ths": 2,   # 涨停池 + 跌停池
+    "limit_step":     1,
+    "limit_cpt_list": 1,
+    "index_daily":    1,
+}
+# 未校准时的 DB 读取吞吐兜底值（行/秒）
+_DEFAULT_DB_ROWS_PER_SEC = 200000.0
+# 窗口回溯的日历天数（覆盖 21 个交易日，与 FeatureDataBundle 的 60 天回溯一致）
+_CALENDAR_LOOKBACK_DAYS = 60
+
+_BUNDLE_TABLES = ("kline_day", "kline_day_qfq", "kline_min")
+
+
+def _normalize_dates(values: pd.Series) -> pd.Series:
+    """DB 返回的 date / yyyymmdd / yyyy-mm-dd 统一为 yyyy-mm-dd 字符串"""
+    text = values.astype(str).str.replace("-", "", regex=False).str[:8]
+    return text.str[:4] + "-" + text.str[4:6] + "-" + text.str[6:8]
+
+
+class DatasetDryRunPlanner:
+    """
+    训练集生成预演：plan → report / log_report
+
+    :param sector_heat:       SectorHeatFeature 实例（Top3 板块选择，与正式流程共用缓存）
+    :param calibrate:         是否用首个有候选的日期跑一次真实预取（仅读 DB）实测 DB 吞吐
+    :param api_latency_s:     单次接口往返耗时假设（秒）
+    :param workers:           正式运行的 DATASET_WORKERS（日期并发摊薄 DB / 入库 / 候选池耗时，分钟线受全局信号量约束）
+    """
+
+    def __init__(self, sector_heat, calibrate: bool = True, api_latency_s: float = _API_LATENCY_S,
+                 workers: int = 1):
+        self.sector_heat    = sector_heat
+        self.workers        = max(1, workers)
+        self.calibrate      = calibrate
+        self.api_latency_s  = api_latency_s
+        self.candidate_pool = CandidatePoolEngine()
+
+        # 进程内已查询的 (股票, 日期) → 行数（0 = DB 未命中），相邻日期窗口重叠时复用
+        self._known: Dict[str, Dict[Tuple[str, str], int]] = {t: {} for t in _BUNDLE_TABLES}
+        self._minute_misses: Set[Tuple[str, str]] = set()
+        self.date_records: List[dict] = []
+        self.table_stats: Dict[str, dict] = {
+            t: {"planned_keys": 0, "cached_keys": 0, "missing_keys": 0, "db_rows": 0} for t in _BUNDLE_TABLES
+        }
+        self.count_queries = 0
+        self.db_rows_per_sec: Optional[float] = None
+        self.elapsed_s = 0.0
+
+    # ------------------------------------------------------------------ #
+    # 预演
+    # ------------------------------------------------------------------ #
+
+    def plan(self, dates: List[str]) -> pd.DataFrame:
+        """逐日预演，返回逐日明细（report() 给出汇总）"""
+        t0 = time.perf_counter()
+        dates = sorted(dates)
+        if not dates:
+            return pd.DataFrame()
+
+        first = datetime.strptime(dates[0], "%Y-%m-%d") - timedelta(days=_CALENDAR_LOOKBACK_DAYS)
+        calendar = get_trade_dates(first.strftime("%Y-%m-%d"), dates[-1])
+        position = {d: i for i, d in enumerate(calendar)}
+
+        for n, date in enumerate(dates, 1):
+            record = self._plan_date(date, calendar, position.get(date))
+            self.date_records.append(record)
+            if n % 20 == 0 or n == len(dates):
+                logger.info(f"[DryRun] 预演进度 {n}/{len(dates)} | 分钟线待补拉累计:{len(self._minute_misses)}")
+
+        self.elapsed_s = time.perf_counter() - t0
+        return pd.DataFrame(self.date_records)
+
+    def _plan_date(self, date: str, calendar: List[str], idx: Optional[int]) -> dict:
+        record = {"trade_date": date, "status": "ok", "candidates": 0, "market_rows": 0,
+                  "minute_missing": 0, "pool_s": 0.0}
+        if idx is None:
+            record["status"] = "not_trade_date"
+            return record
+
+        t0 = time.perf_counter()
+        top3_sectors = self.sector_heat.select_top3_hot_sectors(trade_date=date)["top3_sectors"]
+        if not top3_sectors:
+            record["status"] = "empty_top3"
+            record["pool_s"] = round(time.perf_counter() - t0, 3)
+            return record
+
+        daily_df = get_daily_kline_data(date)
+        record["market_rows"] = 0 if daily_df is None else len(daily_df)
+        _, target_ts_codes = self.candidate_pool.build(date, daily_df, top3_sectors)
+        record["pool_s"] = round(time.perf_counter() - t0, 3)
+        if not target_ts_codes:
+            record["status"] = "empty_pool"
+            return record
+        record["candidates"] = len(target_ts_codes)
+
+        # 与 FeatureDataBundle._load_trade_dates 相同的窗口
+        dates_5d  = calendar[max(0, idx - 4): idx + 1]
+        dates_20d = calendar[max(0, idx - 19): idx + 1]
+        daily_dates = dates_20d + ([calendar[idx - 20]] if idx >= 20 else [])
+
+        self._register("kline_day", target_ts_codes, daily_dates)
+        self._register("kline_day_qfq", target_ts_codes, dates_20d)
+        missing_before = len(self._minute_misses)
+        self._register("kline_min", target_ts_codes, dates_5d)
+        record["minute_missing"] = len(self._minute_misses) - missing_before
+
+        if self.calibrate and self.db_rows_per_sec is None:
+            self._calibrate(target_ts_codes, daily_dates, dates_20d, dates_5d)
+        return record
+
+    def _register(self, table_name: str, ts_codes: List[str], trade_dates: List[str]):
+        """登记一日需求：未查询过的组合发计数查询，再按"正式流程会读到的行数"累计"""
+        known = self._known[table_name]
+        unknown_codes = [c for c in ts_codes if any((c, d) not in known for d in trade_dates)]
+        if unknown_codes:
+            self._count_present(table_name, unknown_codes, trade_dates)
+
+        stat = self.table_stats[table_name]
+        for code in ts_codes:
+            for date in trade_dates:
+                rows = known[(code, date)]
+                if rows == 0 and (code, date) in self._minute_misses:
+                    rows = _MINUTE_ROWS_PER_KEY   # 之前日期已补拉入库，本日走 DB 批量命中
+                stat["planned_keys"] += 1
+                if rows > 0:
+                    stat["cached_keys"] += 1
+                    stat["db_rows"] += rows
+                    continue
+                stat["missing_keys"] += 1
+                if table_name == "kline_min":
+                    # DB 未命中 → 逐只 DB 查询 + API 补拉 + 入库后重读
+                    self._minute_misses.add((code, date))
+                    stat["db_rows"] += _MINUTE_ROWS_PER_KEY
+
+    def _count_present(self, table_name: str, ts_codes: List[str], trade_dates: List[str]):
+        """分块 GROUP BY 计数：已缓存的 (股票, 日期) 及行数；查询失败按未命中计"""
+        known = self._known[table_name]
+        dates_param = (
+            tuple(trade_dates) if table_name == "kline_min"
+            else tuple(d.replace("-", "") for d in trade_dates)
+        )
+        sql = (f"SELECT ts_code, trade_date, COUNT(*) AS n FROM {table_name} "
+               f"WHERE trade_date IN %s AND ts_code IN %s GROUP BY ts_code, trade_date")
+        for i in range(0, len(ts_codes), _CODE_CHUNK_SIZE):
+            codes = ts_codes[i:i + _CODE_CHUNK_SIZE]
+            self.count_queries += 1
+            try:
+                df = db.query(sql, params=(dates_param, tuple(codes)), return_df=True)
+            except Exception as e:
+                logger.warning(f"[DryRun] {table_name} 计数查询失败（按未命中计）：{e}")
+                df = None
+            if df is not None and not df.empty:
+                for code, date, n in zip(df["ts_code"], _normalize_dates(df["trade_date"]), df["n"]):
+                    known[(code, date)] = int(n)
+            for code in codes:
+                for date in trade_dates:
+                    known.setdefault((code, date), 0)
+
+    def _calibrate(self, ts_codes: List[str], daily_dates: List[str], dates_20d: List[str], dates_5d: List[str]):
+        """用一日真实预取（与 FeatureDataBundle 相同的查询，只读 DB）实测 DB 读取吞吐"""
+        planner = BundlePrefetchPlanner(ts_codes)
+        planner.add_table("kline_day", daily_dates)
+        planner.add_table("kline_day_qfq", dates_20d)
+        planner.add_table("kline_min", dates_5d)
+        t0 = time.perf_counter()
+        results = planner.execute()
+        elapsed = time.perf_counter() - t0
+        rows = sum(len(df) for df in results.values())
+        if rows and elapsed > 0:
+            self.db_rows_per_sec = rows / elapsed
+            logger.info(f"[DryRun] DB 吞吐校准 | 行数:{rows} | 耗时:{elapsed:.2f}s | {self.db_rows_per_sec:,.0f} 行/秒")
+
+    # ------------------------------------------------------------------ #
+    # 报告
+    # ------------------------------------------------------------------ #
+
+    def report(self) -> dict:
+        """
+        汇总估算
+        api_calls        : 分钟线 + 日级入库接口调用数
+        db_rows          : 正式运行预计读取的 DB 行数（全市场 D 日日线 + 预取三表 + 分钟线补拉重读）
+        est_wall_s       : 正常限流下的墙钟估算；est_wall_throttled_s 为全程限流模式的上界
+        """
+        dates_df    = pd.DataFrame(self.date_records)
+        n_ok        = int((dates_df["status"] == "ok").sum()) if not dates_df.empty else 0
+        n_planned   = int(dates_df["status"].isin(["ok", "empty_pool"]).sum()) if not dates_df.empty else 0
+        minute_api  = len(self._minute_misses)
+        ingest_api  = n_planned * sum(_DAILY_INGEST_API_CALLS.values())
+        market_rows = int(dates_df["market_rows"].sum()) if not dates_df.empty else 0
+        db_rows     = market_rows + sum(s["db_rows"] for s in self.table_stats.values())
+
+        per_call      = API_REQUEST_INTERVAL + self.api_latency_s
+        minute_s      = minute_api * per_call / _MINUTE_API_CONCURRENCY
+        minute_thr_s  = minute_api * (per_call + _MINUTE_THROTTLE_INTERVAL) / _MINUTE_API_CONCURRENCY
+        ingest_s      = ingest_api * per_call / self.workers
+        rows_per_sec  = self.db_rows_per_sec or _DEFAULT_DB_ROWS_PER_SEC
+        db_s          = db_rows / rows_per_sec / self.workers
+        pool_s        = (float(dates_df["pool_s"].sum()) if not dates_df.empty else 0.0) / self.workers
+
+        return {
+            "dates":                len(dates_df),
+            "dates_with_pool":      n_ok,
+            "candidates_total":     int(dates_df["candidates"].sum()) if not dates_df.empty else 0,
+            "api_calls":            minute_api + ingest_api,
+            "api_minute_calls":     minute_api,
+            "api_ingest_calls":     ingest_api,
+            "db_rows":              int(db_rows),
+            "db_rows_per_sec":      round(rows_per_sec, 1),
+            "db_rows_per_sec_calibrated": self.db_rows_per_sec is not None,
+            "tables": {
+                t: {**s, "coverage": round(s["cached_keys"] / s["planned_keys"], 4) if s["planned_keys"] else 0.0}
+                for t, s in self.table_stats.items()
+            },
+            "est_minute_api_s":     round(minute_s, 1),
+            "est_ingest_api_s":     round(ingest_s, 1),
+            "est_db_s":             round(db_s, 1),
+            "est_pool_s":           round(pool_s, 1),
+            "est_wall_s":           round(minute_s + ingest_s + db_s + pool_s, 1),
+            "est_wall_throttled_s": round(minute_thr_s + ingest_s + db_s + pool_s, 1),
+            "planner_elapsed_s":    round(self.elapsed_s, 1),
+            "planner_count_queries": self.count_queries,
+        }
+
+    def log_report(self):
+        summary = self.report()
+        logger.info(
+            f"[DryRun] 日期:{summary['dates']}（有候选 {summary['dates_with_pool']}）"
+            f" | 候选股合计:{summary['candidates_total']}"
+            f" | 预演耗时:{summary['planner_elapsed_s']}s（计数查询 {summary['planner_count_queries']} 次）"
+        )
+        for table_name, stat in summary["tables"].items():
+            logger.info(
+                f"[DryRun] {table_name} | 计划:{stat['planned_keys']} 已缓存:{stat['cached_keys']}"
+                f" 未命中:{stat['missing_keys']} 覆盖:{stat['coverage']:.1%} | 预计读取行数:{stat['db_rows']}"
+            )
+        logger.info(
+            f"[DryRun] API 调用:{summary['api_calls']}（分钟线 {summary['api_minute_calls']}"
+            f" + 日级入库 {summary['api_ingest_calls']}）"
+            f" | DB 读取行数:{summary['db_rows']:,}"
+            f"（{summary['db_rows_per_sec']:,.0f} 行/秒，{'实测' if summary['db_rows_per_sec_calibrated'] else '默认值'}）"
+        )
+        logger.info(
+            f"[DryRun] 预计墙钟:{summary['est_wall_s'] / 3600:.2f}h"
+            f"（分钟线 {summary['est_minute_api_s']}s + 入库 {summary['est_ingest_api_s']}s"
+            f" + DB {summary['est_db_s']}s + 候选池 {summary['est_pool_s']}s）"
+            f" | 全程限流上界:{summary['est_wall_throttled_s'] / 3600:.2f}h"
+        )
@@ -0,0 +1,641 @@
+"""
+分区列式训练集存储 (PartitionedDatasetStore)
+=============================================
+替代单一追加写 CSV：
+
+    <root>/
+        _schema.json                                ← 因子版本 + 列名 + 显式 dtype + 全局列清单
+        trade_month=2024-11/part-2024-11-04.parquet   ← 个股行（主键 + 个股因子 + 标签）
+        trade_month=2024-11/global-2024-11-04.parquet ← 日级全局因子（单行：trade_date + 全局列）
+        trade_month=2024-11/part-2024-11-05.parquet
+        trade_month=2024-12/...
+
+    - 按月分区目录（hive 风格），目录内一日一个文件：单日写入为整文件原子替换，
+      重跑同一日期直接覆盖，不会产生重复行
+    - 列与 dtype 在首次写入时固定并写入 _schema.json（与 FACTOR_VERSION 绑定），
+      之后各日按固定 schema 对齐（因子缺列补 0、多余列丢弃，与原 CSV 断点续跑逻辑一致；
+      标签缺失的行写入前丢弃，不补 0）
+    - 读取支持列投影（只解码需要的列）与日期区间谓词下推（按文件名日期剪枝 + trade_date 过滤）
+    - 校验逐分区进行，只重写有问题的单日文件
+    - 日级全局因子（adapt_score / 市场宏观等，同一日所有候选股取值相同）不再逐行重复存储，
+      单独存为每日一行的 global 表，load() 时按 trade_date 惰性拼回（只在请求了全局列时读取）；
+      全局列清单在首次写入时由 FeatureEngine 给出并固定在 _schema.json 中
+
+因子版本变更时，由构建流程显式调用 archive() 把旧存储整体改名为 <root>.<旧版本号> 保留，
+新版本从空目录开始写（构造函数无副作用；版本不一致且未归档时拒绝写入）。
+
+因子级增量重建：
+    每个单日文件在 Parquet 元数据中记录写入时各因子的 feature_version（{因子名: 版本}），
+    stale_features() 对比当前引擎的因子版本，列出每个分区需要重算的因子；
+    splice_date() 只把这些因子的新列拼接进已有分区（按 stock_code + trade_date 对齐），
+    其余列（含标签）原样保留 —— 修改单个因子不再触发全量重建。
+    重算以分区已有的候选股 / Top3 / 板块归属为准（read_date_context），不按当前 DB 重建候选池；
+    分区中任一主键拿不到新值时放弃拼接（SpliceIncompleteError），由调用方整日重建，不以 0 填充。
+    未带版本元数据的旧分区按 _schema.json 中的基线版本（首次启用时记为当时的因子版本）处理。
+
+依赖 pyarrow（requirements.txt）；未安装时仅在实际读写存储时报错，不影响 CSV 流程。
+"""
+import glob
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.log_utils import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_ds
+    import pyarrow.parquet as pq
+except ImportError:   # 仅使用 CSV 流程时无需 pyarrow
+    pa = pa_ds = pq = None
+
+
+# 元数据文件名（位于存储根目录）
+SCHEMA_FILE = "_schema.json"
+# 分区目录前缀（hive 风格：trade_month=YYYY-MM）
+PARTITION_KEY = "trade_month"
+# 单日文件 Parquet 元数据中记录因子版本的键
+FEATURE_VERSIONS_KEY = b"feature_versions"
+
+# 固定 dtype 的列；其余数值列统一 float64，非数值列统一 string
+_FIXED_DTYPES = {
+    "stock_code":  "string",
+    "trade_date":  "string",
+    "label1":      "int8",
+    "label2":      "int8",
+}
+# 校验时的主键与核心列（与 validate_train_dataset 一致）
+_KEY_COLS      = ["stock_code", "trade_date"]
+_LABEL_COLS    = ["label1", "label2"]
+_REQUIRED_COLS = ["stock_code", "trade_date", "label1", "label2", "adapt_score"]
+
+_PART_FILE_RE   = re.compile(r"part-(\d{4}-\d{2}-\d{2})\.parquet$")
+_GLOBAL_FILE_RE = re.compile(r"global-(\d{4}-\d{2}-\d{2})\.parquet$")
+
+
+class SpliceIncompleteError(ValueError):
+    """因子拼接时分区中有主键拿不到新值（需整日重建该分区）"""
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("分区列式存储需要 pyarrow，请先 pip install pyarrow")
+
+
+def _arrow_type(dtype: str):
+    return {
+        "string":  pa.string(),
+        "int8":    pa.int8(),
+        "int64":   pa.int64(),
+        "float64": pa.float64(),
+    }[dtype]
+
+
+def _infer_dtypes(df: pd.DataFrame) -> Dict[str, str]:
+    """首次写入时推断各列 dtype（主键/标签固定，其余数值列 float64，其他 string）"""
+    dtypes = {}
+    for col in df.columns:
+        if col in _FIXED_DTYPES:
+            dtypes[col] = _FIXED_DTYPES[col]
+        elif pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]):
+            dtypes[col] = "float64"
+        else:
+            dtypes[col] = "string"
+    return dtypes
+
+
+def _normalize_date(date: str) -> str:
+    """YYYYMMDD / YYYY-MM-DD → YYYY-MM-DD"""
+    date = str(date)
+    if len(date) == 8 and date.isdigit():
+        return f"{date[:4]}-{date[4:6]}-{date[6:]}"
+    return date
+
+
+class PartitionedDatasetStore:
+    """
+    按月分区的 Parquet 训练集存储
+
+    :param root_dir:       存储根目录
+    :param factor_version:   写入方传入当前 FACTOR_VERSION；只读方可传 None（不校验版本）
+    :param feature_versions: 当前各因子版本 {因子名: feature_version}，写入时记入分区元数据
+    """
+
+    def __init__(self, root_dir: str, factor_version: Optional[str] = None,
+                 feature_versions: Optional[Dict[str, str]] = None):
+        self.root_dir         = root_dir
+        self.factor_version   = factor_version
+        self.feature_versions = dict(feature_versions or {})
+        self.schema           = self._load_schema()
+
+    # ------------------------------------------------------------------ #
+    # 版本
+    # ------------------------------------------------------------------ #
+
+    @property
+    def version_mismatch(self) -> bool:
+        """写入方版本与已有存储的 schema 版本不一致（需 archive() 后从空目录重建）"""
+        return bool(self.factor_version and self.schema
+                    and self.schema.get("factor_version") != self.factor_version)
+
+    def archive(self) -> Optional[str]:
+        """
+        旧存储整体改名为 <root>.<旧版本号> 保留，之后从空目录开始写（与 ProcessedDatesManager 清空记录同步）
+        仅由构建流程在版本校验后显式调用，构造函数不做任何文件操作
+        :return: 归档目录；存储不存在时返回 None
+        """
+        if not self.schema:
+            return None
+        old_version = self.schema.get("factor_version") or "unknown"
+        archived    = f"{self.root_dir.rstrip(os.sep)}.{old_version}"
+        suffix      = 1
+        while os.path.exists(archived):
+            archived = f"{self.root_dir.rstrip(os.sep)}.{old_version}_{suffix}"
+            suffix  += 1
+        logger.warning(
+            f"[DatasetStore] 因子版本变更 {old_version} → {self.factor_version}，"
+            f"旧存储归档至: {archived}"
+        )
+        os.replace(self.root_dir, archived)
+        self.schema = None
+        return archived
+
+    # ------------------------------------------------------------------ #
+    # 元数据
+    # ------------------------------------------------------------------ #
+
+    @property
+    def schema_path(self) -> str:
+        return os.path.join(self.root_dir, SCHEMA_FILE)
+
+    def _load_schema(self) -> Optional[dict]:
+        if not os.path.exists(self.schema_path):
+            return None
+        with open(self.schema_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_schema(self, dtypes: Dict[str, str], feature_columns: Optional[Dict[str, List[str]]] = None,
+                     global_columns: Optional[List[str]] = None):
+        os.makedirs(self.root_dir, exist_ok=True)
+        old = self.schema or {}
+        if global_columns is None:
+            global_columns = old.get("global_columns", [])
+        schema = {
+            "factor_version": self.factor_version or old.get("factor_version"),
+            # 无版本元数据的分区按此基线判断（首次写入 / 首次启用因子级版本时的因子版本）
+            "baseline_feature_versions": old.get("baseline_feature_versions") or self.feature_versions,
+            # 因子 → 曾产出的列（拼接时用于剔除因子已不再产出的旧列）
+            "feature_columns": {**old.get("feature_columns", {}), **(feature_columns or {})},
+            # 日级全局列（存于 global-*.parquet，不在个股行文件中）
+            "global_columns": [c for c in global_columns if c in dtypes],
+            "columns": [{"name": c, "dtype": t} for c, t in dtypes.items()],
+        }
+        tmp_path = self.schema_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(schema, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.schema_path)
+        self.schema = schema
+
+    @property
+    def columns(self) -> List[str]:
+        """固定列顺序（尚未写入时为空）"""
+        return [c["name"] for c in self.schema["columns"]] if self.schema else []
+
+    @property
+    def dtypes(self) -> Dict[str, str]:
+        return {c["name"]: c["dtype"] for c in self.schema["columns"]} if self.schema else {}
+
+    @property
+    def global_columns(self) -> List[str]:
+        """日级全局列（旧版未拆分的存储为空）"""
+        return list(self.schema.get("global_columns", [])) if self.schema else []
+
+    @property
+    def row_dtypes(self) -> Dict[str, str]:
+        """个股行文件（part-*.parquet）的列与 dtype"""
+        global_cols = set(self.global_columns)
+        return {c: t for c, t in self.dtypes.items() if c not in global_cols}
+
+    @property
+    def global_dtypes(self) -> Dict[str, str]:
+        """全局表（global-*.parquet）的列与 dtype"""
+        dtypes = self.dtypes
+        return {"trade_date": "string", **{c: dtypes[c] for c in self.global_columns}}
+
+    def exists(self) -> bool:
+        return self.schema is not None
+
+    # ------------------------------------------------------------------ #
+    # 写入
+    # ------------------------------------------------------------------ #
+
+    def partition_path(self, date: str) -> str:
+        date = _normalize_date(date)
+        return os.path.join(self.root_dir, f"{PARTITION_KEY}={date[:7]}", f"part-{date}.parquet")
+
+    def global_path(self, date: str) -> str:
+        date = _normalize_date(date)
+        return os.path.join(self.root_dir, f"{PARTITION_KEY}={date[:7]}", f"global-{date}.parquet")
+
+    def _extend_schema(self, df: pd.DataFrame, drop_cols: List[str] = (),
+                       feature_columns: Optional[Dict[str, List[str]]] = None,
+                       global_df: Optional[pd.DataFrame] = None):
+        """
+        拼接新因子列时扩展 schema：新增列按首次写入规则推断 dtype，drop_cols 从 schema 移除
+        global_df 中的新增列登记为全局列
+        """
+        dtypes = {c: t for c, t in self.dtypes.items() if c not in set(drop_cols)}
+        for col, dtype in _infer_dtypes(df).items():
+            dtypes.setdefault(col, dtype)
+        global_cols = [c for c in self.global_columns if c not in set(drop_cols)]
+        if global_df is not None:
+            for col, dtype in _infer_dtypes(global_df.drop(columns=["trade_date"], errors="ignore")).items():
+                dtypes.setdefault(col, dtype)
+                if col not in global_cols:
+                    global_cols.append(col)
+        if dtypes != self.dtypes or feature_columns or global_cols != self.global_columns:
+            self._save_schema(dtypes, feature_columns, global_cols)
+
+    def _to_table(self, df: pd.DataFrame, feature_versions: Optional[Dict[str, str]] = None,
+                  dtypes: Optional[Dict[str, str]] = None):
+        """
+        按固定 schema 对齐列并显式转换 dtype；feature_versions 写入 Parquet 元数据
+        标签缺失（空值 / 缺列）的行直接丢弃，不以 0 填充；缺列补 0 只作用于因子列
+        """
+        dtypes = self.row_dtypes if dtypes is None else dtypes
+        label_cols = [c for c in _LABEL_COLS if c in dtypes]
+        fill_cols  = [c for c in dtypes if c not in df.columns and c not in label_cols]
+        df = df.reindex(columns=list(dtypes))
+        df[fill_cols] = 0
+        if label_cols:
+            null_label = df[label_cols].apply(pd.to_numeric, errors="coerce").isnull().any(axis=1)
+            if null_label.any():
+                logger.warning(f"[DatasetStore] 丢弃标签缺失行: {int(null_label.sum())}/{len(df)}")
+                df = df[~null_label]
+        arrays = []
+        for col, dtype in dtypes.items():
+            s = df[col]
+            if dtype == "string":
+                s = s.astype(str)
+            else:
+                s = pd.to_numeric(s, errors="coerce")
+                if dtype != "float64":
+                    s = s.fillna(0)
+                s = s.astype(dtype)
+            arrays.append(pa.array(s.to_numpy(), type=_arrow_type(dtype)))
+        table = pa.Table.from_arrays(arrays, names=list(dtypes))
+        versions = self.feature_versions if feature_versions is None else feature_versions
+        if versions:
+            table = table.replace_schema_metadata(
+                {FEATURE_VERSIONS_KEY: json.dumps(versions, ensure_ascii=False, sort_keys=True)}
+            )
+        return table
+
+    @staticmethod
+    def _write_table(table, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    def write_date(self, date: str, df: pd.DataFrame, feature_versions: Optional[Dict[str, str]] = None,
+                   global_columns: Optional[List[str]] = None) -> int:
+        """
+        写入单日数据（整文件原子替换，重跑同一日期为覆盖写）
+        :param feature_versions: 记入分区元数据的因子版本，None = 当前版本（全量计算的新数据）
+        :param global_columns:   日级全局列（FeatureEngine.global_columns），仅首次写入时固定到 schema
+        :return: 写入行数
+        """
+        _require_pyarrow()
+        if self.version_mismatch:
+            raise ValueError(
+                f"存储版本 {self.schema.get('factor_version')} 与当前 {self.factor_version} 不一致，"
+                f"请先调用 archive()"
+            )
+        if not self.schema:
+            dtypes = _infer_dtypes(df)
+            self._save_schema(dtypes, global_columns=[
+                c for c in (global_columns or []) if c in dtypes and c not in _FIXED_DTYPES
+            ])
+            logger.info(
+                f"[DatasetStore] 初始化 schema | 列数: {len(self.columns)} "
+                f"| 全局列: {len(self.global_columns)} | 版本: {self.factor_version}"
+            )
+
+        table = self._to_table(df, feature_versions)
+        self._write_table(table, self.partition_path(date))
+
+        # 全局列单独写一行（df 中不含全局列时不动原全局表，如校验修复只重写个股行）
+        global_cols = [c for c in self.global_columns if c in df.columns]
+        if global_cols and not df.empty:
+            global_df = df[global_cols].iloc[:1].assign(trade_date=_normalize_date(date))
+            self._write_table(self._to_table(global_df, {}, self.global_dtypes), self.global_path(date))
+        return table.num_rows
+
+    # ------------------------------------------------------------------ #
+    # 读取
+    # ------------------------------------------------------------------ #
+
+    def partition_files(self, start_date: str = None, end_date: str = None) -> List[str]:
+        """按日期区间列出单日分区文件（按日期升序，文件名即日期，无需打开文件）"""
+        return self._dated_files("part", _PART_FILE_RE, start_date, end_date)
+
+    def global_files(self, start_date: str = None, end_date: str = None) -> List[str]:
+        """按日期区间列出单日全局表文件"""
+        return self._dated_files("global", _GLOBAL_FILE_RE, start_date, end_date)
+
+    def _dated_files(self, prefix: str, pattern, start_date: str = None, end_date: str = None) -> List[str]:
+        start_date = _normalize_date(start_date) if start_date else None
+        end_date   = _normalize_date(end_date) if end_date else None
+        files = []
+        for path in glob.glob(os.path.join(self.root_dir, f"{PARTITION_KEY}=*", f"{prefix}-*.parquet")):
+            m = pattern.search(path)
+            if not m:
+                continue
+            d = m.group(1)
+            if (start_date and d < start_date) or (end_date and d > end_date):
+                continue
+            files.append((d, path))
+        return [p for _, p in sorted(files)]
+
+    def list_dates(self) -> List[str]:
+        """已写入的交易日（YYYY-MM-DD，升序）"""
+        return [_PART_FILE_RE.search(p).group(1) for p in self.partition_files()]
+
+    def load(self, columns: List[str] = None, start_date: str = None,
+             end_date: str = None) -> pd.DataFrame:
+        """
+        读取训练集
+        :param columns:    列投影（None = 全部列）；不存在的列忽略
+        :param start_date: 起始交易日（含），按月目录剪枝 + trade_date 谓词下推
+        :param end_date:   截止交易日（含）
+        全局列从 global 表读取后按 trade_date 拼回（缺失日期填 0，与清洗口径一致）
+        """
+        _require_pyarrow()
+        if not self.schema:
+            return pd.DataFrame(columns=columns or [])
+
+        files = self.partition_files(start_date, end_date)
+        if not files:
+            return pd.DataFrame(columns=columns or self.columns)
+
+        expr = None
+        if start_date:
+            expr = pa_ds.field("trade_date") >= _normalize_date(start_date)
+        if end_date:
+            cond = pa_ds.field("trade_date") <= _normalize_date(end_date)
+            expr = cond if expr is None else expr & cond
+
+        wanted      = self.columns if columns is None else [c for c in columns if c in self.dtypes]
+        global_set  = set(self.global_columns)
+        global_cols = [c for c in wanted if c in global_set]
+        row_cols    = [c for c in wanted if c not in global_set]
+        if global_cols and "trade_date" not in row_cols:
+            row_cols = row_cols + ["trade_date"]
+
+        row_dtypes = self.row_dtypes
+        dataset = pa_ds.dataset(files, schema=pa.schema([(c, _arrow_type(t)) for c, t in row_dtypes.items()]),
+                                format="parquet")
+        df = dataset.to_table(columns=row_cols, filter=expr).to_pandas()
+        if not global_cols:
+            return df
+
+        global_dtypes = self.global_dtypes
+        global_files  = self.global_files(start_date, end_date)
+        if global_files:
+            global_ds = pa_ds.dataset(
+                global_files, schema=pa.schema([(c, _arrow_type(global_dtypes[c])) for c in global_dtypes]),
+                format="parquet",
+            )
+            global_df = global_ds.to_table(columns=["trade_date"] + global_cols).to_pandas()
+            global_df = global_df.drop_duplicates(subset=["trade_date"], keep="last")
+        else:
+            global_df = pd.DataFrame(columns=["trade_date"] + global_cols)
+
+        # 惰性拼接：按 trade_date 定位行号后逐列取值，不复制个股宽表
+        pos = pd.Index(global_df["trade_date"]).get_indexer(df["trade_date"])
+        hit = pos >= 0
+        for col in global_cols:
+            values = global_df[col].to_numpy()
+            if global_dtypes[col] == "string":
+                df[col] = np.where(hit, values[pos.clip(min=0)] if len(values) else "", "0")
+            else:
+                df[col] = np.where(hit, values[pos.clip(min=0)] if len(values) else 0.0, 0.0)
+        return df[wanted]
+
+    def iter_load(self, columns: List[str] = None, start_date: str = None, end_date: str = None,
+                  dates_per_chunk: int = 20):
+        """
+        按交易日分块流式读取（每块 dates_per_chunk 个单日分区，按日期升序），
+        全量训练集无需一次性解码进内存；参数含义同 load()
+        """
+        start_date = _normalize_date(start_date) if start_date else None
+        end_date   = _normalize_date(end_date) if end_date else None
+        dates = [
+            d for d in self.list_dates()
+            if not (start_date and d < start_date) and not (end_date and d > end_date)
+        ]
+        for i in range(0, len(dates), max(1, dates_per_chunk)):
+            chunk = dates[i:i + dates_per_chunk]
+            yield self.load(columns=columns, start_date=chunk[0], end_date=chunk[-1])
+
+    # ------------------------------------------------------------------ #
+    # 因子级增量重建
+    # ------------------------------------------------------------------ #
+
+    def read_feature_versions(self, path: str) -> Dict[str, str]:
+        """单日文件记录的因子版本（只读 Parquet footer）；无元数据时返回 schema 基线版本"""
+        metadata = pq.read_schema(path).metadata or {}
+        raw = metadata.get(FEATURE_VERSIONS_KEY)
+        if raw:
+            return json.loads(raw)
+        return dict((self.schema or {}).get("baseline_feature_versions") or {})
+
+    def stale_features(self) -> Dict[str, List[str]]:
+        """
+        对比各分区记录的因子版本与当前 feature_versions
+        :return: {日期: [需重算的因子名]}（版本不同或分区中无记录的新因子；仅列出有差异的日期）
+        """
+        _require_pyarrow()
+        if not self.schema or not self.feature_versions:
+            return {}
+        # 启用因子级版本前写入的存储：以当前版本作为基线（数据与当前 FACTOR_VERSION 一致）
+        if not self.schema.get("baseline_feature_versions"):
+            self._save_schema(self.dtypes)
+
+        stale = {}
+        for path in self.partition_files():
+            stored = self.read_feature_versions(path)
+            names  = [n for n, v in self.feature_versions.items() if stored.get(n) != v]
+            if names:
+                stale[_PART_FILE_RE.search(path).group(1)] = names
+        return stale
+
+    def read_date_context(self, date: str) -> Optional[dict]:
+        """
+        单日分区的候选池上下文（因子重算时原样复用，不按当前 DB 重新选板块 / 构建候选池）
+        :return: {stock_codes: 分区行顺序的候选股, sector_map: {板块: [候选股]}, top3_sectors, adapt_score}；
+                 分区不存在时返回 None
+        """
+        _require_pyarrow()
+        date = _normalize_date(date)
+        if not os.path.exists(self.partition_path(date)):
+            return None
+        df = self.load(["stock_code", "sector_name", "top3_sectors", "adapt_score"], date, date)
+        top3 = str(df["top3_sectors"].iloc[0]) if "top3_sectors" in df.columns and len(df) else ""
+        sector_map: Dict[str, List[str]] = {}
+        if "sector_name" in df.columns:
+            for sector, codes in df.groupby("sector_name", sort=False)["stock_code"]:
+                sector_map[str(sector)] = codes.tolist()
+        return {
+            "stock_codes":  df["stock_code"].tolist(),
+            "sector_map":   sector_map,
+            "top3_sectors": [s for s in top3.split(",") if s and s != "0"],
+            "adapt_score":  float(df["adapt_score"].iloc[0]) if "adapt_score" in df.columns and len(df) else 0.0,
+        }
+
+    def splice_date(self, date: str, feature_outputs: Dict[str, pd.DataFrame],
+                    sanity_col: Optional[str] = None) -> int:
+        """
+        把重算因子的新列拼接进已有单日分区
+        :param feature_outputs: {因子名: 该因子输出}；含 stock_code 的按 (stock_code, trade_date) 对齐，
+                                不含 stock_code 的全局因子取当日一行：拆分存储写入 global 表，
+                                旧版未拆分存储广播到全部行
+        :param sanity_col:      新值缺失或 ≤ 0 时丢弃该行的价格列（与 DataSetAssembler 清洗口径一致）
+        :return: 分区行数
+        :raises SpliceIncompleteError: 分区中有主键（或全局因子当日行）拿不到新值，分区保持不变
+        """
+        _require_pyarrow()
+        date = _normalize_date(date)
+        path = self.partition_path(date)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"[DatasetStore] 分区不存在，无法拼接: {path}")
+
+        base      = pq.read_table(path).to_pandas()
+        versions  = self.read_feature_versions(path)
+        key_idx   = pd.MultiIndex.from_frame(base[_KEY_COLS].astype(str))
+        protected = set(_KEY_COLS) | set(_LABEL_COLS) | {c for c in base.columns if c.startswith("label_")}
+        old_map   = (self.schema or {}).get("feature_columns", {})
+        normalized = bool(self.global_columns)
+
+        new_cols, global_vals, drop_cols, feature_columns = {}, {}, [], {}
+        for name, out in feature_outputs.items():
+            cols = [c for c in out.columns if c not in protected and c not in _KEY_COLS]
+            if "stock_code" in out.columns:
+                out = out.drop_duplicates(subset=_KEY_COLS)
+                pos = pd.MultiIndex.from_frame(out[_KEY_COLS].astype(str)).get_indexer(key_idx)
+                missing = int((pos < 0).sum())
+                if missing:
+                    sample = base.loc[pos < 0, "stock_code"].head(5).tolist()
+                    raise SpliceIncompleteError(
+                        f"[DatasetStore] {date} {name} 有 {missing} 行无新值（如 {sample}），放弃拼接"
+                    )
+                for col in cols:
+                    vals = out[col].to_numpy()[pos.clip(min=0)]
+                    new_cols[col] = pd.Series(vals, index=base.index).where(pos >= 0)
+            else:
+                day_rows = out[out["trade_date"].astype(str) == date] if "trade_date" in out.columns else out
+                if day_rows.empty:
+                    raise SpliceIncompleteError(f"[DatasetStore] {date} {name} 无当日全局值，放弃拼接")
+                target = global_vals if normalized else new_cols
+                for col in cols:
+                    target[col] = day_rows[col].iloc[0]
+            # 因子不再产出的旧列从分区与 schema 中移除；列归属记录保留历史列，保证其余分区拼接时同样移除
+            owned = old_map.get(name, [])
+            drop_cols += [c for c in owned if c not in cols]
+            feature_columns[name] = owned + [c for c in cols if c not in owned]
+            versions[name] = self.feature_versions.get(name, versions.get(name))
+
+        base = base.drop(columns=[c for c in drop_cols if c in base.columns])
+        for col, values in new_cols.items():
+            base[col] = values
+        # 与 DataSetAssembler 一致：价格列异常的行丢弃，因子自身输出的 NaN 填 0（所有主键均已取到新值）
+        if sanity_col and sanity_col in new_cols:
+            bad = base[sanity_col].isna() | (base[sanity_col] <= 0)
+            if bad.any():
+                logger.warning(f"[DatasetStore] {date} 丢弃 {sanity_col} 异常行（停牌/数据缺失）: {int(bad.sum())} 行")
+                base = base[~bad].reset_index(drop=True)
+        fill_cols = list(new_cols)
+        base[fill_cols] = base[fill_cols].fillna(0)
+
+        global_df = None
+        if global_vals:
+            global_path = self.global_path(date)
+            global_df   = (pq.read_table(global_path).to_pandas() if os.path.exists(global_path)
+                           else pd.DataFrame({"trade_date": [date]}))
+            global_df   = global_df.drop(columns=[c for c in drop_cols if c in global_df.columns])
+            for col, value in global_vals.items():
+                global_df[col] = value
+            global_df = global_df.fillna(0)
+
+        self._extend_schema(base, drop_cols=drop_cols, feature_columns=feature_columns, global_df=global_df)
+        rows = self.write_date(date, base, feature_versions=versions)
+        if global_df is not None:
+            self._write_table(self._to_table(global_df, {}, self.global_dtypes), self.global_path(date))
+        logger.info(
+            f"[DatasetStore] {date} 因子拼接完成 | 因子:{list(feature_outputs)} "
+            f"| 更新列:{len(new_cols) + len(global_vals)} 移除列:{len(drop_cols)} | 行数:{rows}"
+        )
+        return rows
+
+    # ------------------------------------------------------------------ #
+    # 逐分区校验
+    # ------------------------------------------------------------------ #
+
+    def validate(self) -> pd.DataFrame:
+        """
+        逐单日文件校验：核心列齐全、主键去重、标签空值剔除、全局表存在；只重写有改动的文件
+        :return: 每个分区的校验报告（date / rows / dup / null_label / global_missing / rewritten）
+        """
+        _require_pyarrow()
+        if not self.schema:
+            logger.warning(f"[DatasetStore] 存储不存在，跳过校验: {self.root_dir}")
+            return pd.DataFrame()
+
+        missing = [c for c in _REQUIRED_COLS if c not in self.dtypes]
+        if missing:
+            raise ValueError(f"缺失核心列: {missing}")
+
+        report = []
+        global_dates = {_GLOBAL_FILE_RE.search(p).group(1) for p in self.global_files()}
+        for path in self.partition_files():
+            date = _PART_FILE_RE.search(path).group(1)
+            df   = pq.read_table(path).to_pandas()
+            rows = len(df)
+
+            dup = int(df.duplicated(subset=_KEY_COLS).sum())
+            if dup:
+                df = df.drop_duplicates(subset=_KEY_COLS)
+            null = int(df[_LABEL_COLS].isnull().any(axis=1).sum())
+            if null:
+                df = df.dropna(subset=_LABEL_COLS)
+            foreign = int((df["trade_date"] != date).sum())
+            if foreign:
+                df = df[df["trade_date"] == date]
+
+            # 全局表缺失时 load() 按 0 填充全局列，仅告警（需重跑该日期修复）
+            global_missing = bool(self.global_columns) and date not in global_dates
+            if global_missing:
+                logger.warning(f"[DatasetStore] {date} 全局表缺失，读取时全局列按 0 填充")
+
+            rewritten = bool(dup or null or foreign)
+            if rewritten:
+                self.write_date(date, df, feature_versions=self.read_feature_versions(path))
+                logger.warning(
+                    f"[DatasetStore] {date} 分区修复 | 重复:{dup} 标签空值:{null} 日期不符:{foreign}"
+                )
+            report.append({"date": date, "rows": len(df), "dup": dup, "null_label": null,
+                           "foreign_date": foreign, "global_missing": global_missing,
+                           "rewritten": rewritten, "rows_before": rows})
+
+        report_df = pd.DataFrame(report)
+        total = int(report_df["rows"].sum()) if not report_df.empty else 0
+        logger.info(
+            f"【最终校验】分区数: {len(report_df)} | 有效行数: {total} | "
+            f"修复分区: {int(report_df['rewritten'].sum()) if not report_df.empty else 0}"
+        )
+        return report_df
@@ -0,0 +1,401 @@
+"""
+超参数搜索 (HyperParamSearch)
+==============================
+SectorHeatXGBModel.base_params（max_depth / learning_rate / 正则项等）为手工挑选，
+本模块在本机 CPU 上并行搜索，并用验证集 AUC 曲线提前淘汰劣势试验：
+
+    random  : 随机采样 n_trials 组参数；已完成试验的"逐轮最优 AUC"取中位数作为基准曲线，
+              新试验在 PRUNE_WARMUP 轮后每 PRUNE_INTERVAL 轮对比一次，低于中位数即中止（中位数剪枝）
+    halving : 连续减半（successive halving）；n_trials 组参数先各训练 min_rounds 轮，
+              按验证 AUC 保留前 1/eta 进入下一档（轮数 × eta），直至 n_estimators 上限
+              （同一参数 + 固定 seed 训练可复现，已提前早停的试验结果直接沿用，不重复训练）
+
+加速手段（与 walk_forward 一致）：
+    1. 全样本分箱一次（walk_forward.build_bin_codes），按日期排序写入临时 .npy，
+       各进程 mmap 只读共享；子进程内缓存训练 / 验证 QuantileDMatrix，同一进程的后续试验直接复用
+    2. spawn 进程池，试验数 × XGBoost 线程 ≈ CPU 核数
+
+时间切分与 train.time_series_split 一致（按 trade_date 排序，尾部 val_ratio 为验证集）。
+每个试验结束即追加写入结果表（CSV），export_best() 把最优参数写成 JSON，
+SectorHeatXGBModel(params_path=...) 加载后覆盖 base_params 中的同名参数。
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from learnEngine.model import SectorHeatXGBModel
+from learnEngine.walk_forward import MAX_BIN, build_bin_codes
+from utils.log_utils import logger
+
+# 搜索空间：参数名 → (类型, 下界, 上界)；int 整数均匀 / float 均匀 / log 对数均匀
+SEARCH_SPACE: Dict[str, tuple] = {
+    "max_depth":        ("int",   2,    8),
+    "learning_rate":    ("log",   0.02, 0.3),
+    "subsample":        ("float", 0.5,  1.0),
+    "colsample_bytree": ("float", 0.5,  1.0),
+    "min_child_weight": ("log",   1.0,  50.0),
+    "gamma":            ("float", 0.0,  1.0),
+    "reg_alpha":        ("log",   1e-3, 5.0),
+    "reg_lambda":       ("log",   0.1,  10.0),
+}
+# 中位数剪枝：至少 PRUNE_MIN_TRIALS 个完整试验后才启用，前 PRUNE_WARMUP 轮不剪，之后每 PRUNE_INTERVAL 轮判断一次
+PRUNE_MIN_TRIALS = 5
+PRUNE_WARMUP     = 30
+PRUNE_INTERVAL   = 10
+# 连续减半：首档轮数 / 淘汰比例
+HALVING_MIN_ROUNDS = 50
+HALVING_ETA        = 3
+# scale_pos_weight 上限（与 SectorHeatXGBModel.train 一致）
+_MAX_SCALE_POS_WEIGHT = 4.0
+# 不进入 xgb.train 参数字典的 sklearn 接口参数
+_SKLEARN_ONLY_PARAMS = ("n_estimators", "early_stopping_rounds", "n_jobs", "random_state")
+
+# 子进程内训练 / 验证矩阵缓存：codes_path → (dtrain, dval)
+_matrix_cache: Dict[str, tuple] = {}
+_matrix_lock = threading.Lock()
+
+
+def clear_trial_matrix_cache():
+    """释放进程内缓存的训练 / 验证 QuantileDMatrix"""
+    with _matrix_lock:
+        _matrix_cache.clear()
+
+
+def _load_matrices(task: dict) -> tuple:
+    """按 codes_path 取缓存矩阵，未命中时从 mmap 分箱码构建（每进程每次搜索只构建一次）"""
+    with _matrix_lock:
+        cached = _matrix_cache.get(task["codes_path"])
+        if cached is None:
+            _matrix_cache.clear()
+            codes = np.load(task["codes_path"], mmap_mode="r")
+            y     = np.load(task["y_path"], mmap_mode="r")
+            split, cols = task["split"], task["feature_cols"]
+            dtrain = xgb.QuantileDMatrix(np.asarray(codes[:split]), label=np.asarray(y[:split]),
+                                         feature_names=cols, max_bin=MAX_BIN)
+            dval   = xgb.QuantileDMatrix(np.asarray(codes[split:]), label=np.asarray(y[split:]),
+                                         feature_names=cols, ref=dtrain)
+            cached = _matrix_cache[task["codes_path"]] = (dtrain, dval)
+        return cached
+
+
+class _MedianPruner(xgb.callback.TrainingCallback):
+    """逐轮最优验证 AUC 低于已完成试验的中位数曲线时中止训练"""
+
+    def __init__(self, median_curve: np.ndarray):
+        super().__init__()
+        self.median_curve = median_curve
+        self.best_auc  = -np.inf
+        self.pruned_at = None
+
+    def after_iteration(self, model, epoch: int, evals_log) -> bool:
+        self.best_auc = max(self.best_auc, evals_log["val"]["auc"][-1])
+        rounds = epoch + 1
+        if rounds < PRUNE_WARMUP or rounds % PRUNE_INTERVAL or rounds > len(self.median_curve):
+            return False
+        if self.best_auc < self.median_curve[rounds - 1]:
+            self.pruned_at = rounds
+            return True
+        return False
+
+
+def _run_trial(task: dict) -> dict:
+    """子进程：在共享分箱码上训练单个试验，返回验证曲线与最优轮指标"""
+    t0 = time.time()
+    dtrain, dval = _load_matrices(task)
+
+    params = {**task["base_params"], **task["params"], "scale_pos_weight": task["scale_pos_weight"]}
+    booster_params = {k: v for k, v in params.items() if k not in _SKLEARN_ONLY_PARAMS}
+    booster_params.update(
+        nthread=task["n_jobs"], seed=params["random_state"],
+        eval_metric=["logloss", "auc"],   # 早停监控最后一个指标（auc）
+    )
+
+    pruner = _MedianPruner(task["median_curve"]) if task.get("median_curve") is not None else None
+    evals_result = {}
+    booster = xgb.train(
+        booster_params, dtrain,
+        num_boost_round=task["budget"],
+        evals=[(dval, "val")],
+        early_stopping_rounds=params["early_stopping_rounds"],
+        evals_result=evals_result,
+        callbacks=[pruner] if pruner else None,
+        verbose_eval=False,
+    )
+
+    auc_curve = evals_result["val"]["auc"]
+    best = int(np.argmax(auc_curve))
+    return {
+        "trial_id":       task["trial_id"],
+        "rung":           task.get("rung", 0),
+        "budget":         task["budget"],
+        "rounds_trained": booster.num_boosted_rounds(),
+        "best_iteration": best,
+        "val_auc":        round(float(auc_curve[best]), 6),
+        "val_logloss":    round(float(evals_result["val"]["logloss"][best]), 6),
+        "pruned":         bool(pruner and pruner.pruned_at),
+        "pruned_at":      pruner.pruned_at if pruner else None,
+        "elapsed_s":      round(time.time() - t0, 2),
+        "params":         task["params"],
+        "auc_curve":      auc_curve,
+    }
+
+
+def _run_inline(fn, task: dict) -> Future:
+    """单进程模式：同步执行并包装成已完成的 Future，与进程池共用调度逻辑"""
+    future = Future()
+    future.set_result(fn(task))
+    return future
+
+
+class HyperParamSearch:
+    """
+    本地并行超参数搜索：run → results / best() → export_best
+
+    :param method:       random / halving
+    :param n_trials:     试验数（halving 为首档参数组数）；第 0 个试验固定为当前 base_params（基线）
+    :param val_ratio:    验证集占比（与 train.VAL_RATIO 一致）
+    :param results_path: 结果表 CSV（逐试验追加写入，多次搜索以 search_id 区分）
+    :param workers:      并行试验数，None = 按 CPU 自动（每个试验至少 2 线程）
+    :param seed:         参数采样随机种子
+    """
+
+    def __init__(self, method: str = "halving", n_trials: int = 27, val_ratio: float = 0.2,
+                 results_path: str = "hyper_search_results.csv", workers: Optional[int] = None,
+                 seed: int = 42, search_space: Dict[str, tuple] = None):
+        if method not in ("random", "halving"):
+            raise ValueError(f"不支持的搜索方式: {method}（random / halving）")
+        self.method       = method
+        self.n_trials     = n_trials
+        self.val_ratio    = val_ratio
+        self.results_path = results_path
+        self.workers      = workers
+        self.search_space = search_space or SEARCH_SPACE
+        self.rng          = np.random.default_rng(seed)
+        self.base_params  = dict(SectorHeatXGBModel(model_save_path="").base_params)
+        self.search_id    = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.results      = pd.DataFrame()
+        self._records: List[dict] = []
+        self._curves:  List[np.ndarray] = []
+
+    # ------------------------------------------------------------------ #
+    # 参数采样
+    # ------------------------------------------------------------------ #
+
+    def _sample(self) -> dict:
+        params = {}
+        for name, (kind, lo, hi) in self.search_space.items():
+            if kind == "int":
+                params[name] = int(self.rng.integers(lo, hi + 1))
+            elif kind == "log":
+                params[name] = round(float(np.exp(self.rng.uniform(np.log(lo), np.log(hi)))), 5)
+            else:
+                params[name] = round(float(self.rng.uniform(lo, hi)), 4)
+        return params
+
+    def _candidates(self) -> List[dict]:
+        baseline = {name: self.base_params[name] for name in self.search_space if name in self.base_params}
+        return [baseline] + [self._sample() for _ in range(self.n_trials - 1)]
+
+    def _resolve_workers(self) -> tuple:
+        """(并行试验数, 每个试验 XGBoost 线程数)，两者乘积 ≈ CPU 核数"""
+        cpus = os.cpu_count() or 1
+        workers = self.workers or max(1, cpus // 2)
+        workers = max(1, min(workers, self.n_trials, cpus))
+        return workers, max(1, cpus // workers)
+
+    # ------------------------------------------------------------------ #
+    # 结果记录
+    # ------------------------------------------------------------------ #
+
+    def _record(self, result: dict):
+        """记录试验结果并追加写入结果表"""
+        curve = np.maximum.accumulate(np.asarray(result.pop("auc_curve"), dtype=float))
+        if not result["pruned"]:
+            self._curves.append(curve)
+        row = {"search_id": self.search_id, "method": self.method, **result}
+        self._records.append(row)
+
+        flat = {k: v for k, v in row.items() if k != "params"}
+        flat.update(result["params"])
+        flat["params"] = json.dumps(result["params"], sort_keys=True)
+        pd.DataFrame([flat]).to_csv(
+            self.results_path, mode="a", index=False, encoding="utf-8-sig",
+            header=not os.path.exists(self.results_path),
+        )
+        logger.info(
+            f"[HyperSearch] 试验 {result['trial_id']:3d} | 档位 {result['rung']} | 轮数 {result['rounds_trained']}"
+            f"/{result['budget']} | AUC:{result['val_auc']:.4f} logloss:{result['val_logloss']:.4f}"
+            f"{' | 剪枝@' + str(result['pruned_at']) if result['pruned_at'] else ''} | {result['elapsed_s']}s"
+        )
+
+    def _median_curve(self) -> Optional[np.ndarray]:
+        """已完成试验逐轮最优 AUC 的中位数（早停试验用末值补齐到 n_estimators）"""
+        if len(self._curves) < PRUNE_MIN_TRIALS:
+            return None
+        n = self.base_params["n_estimators"]
+        padded = np.vstack([np.pad(c[:n], (0, n - len(c[:n])), mode="edge") for c in self._curves])
+        return np.median(padded, axis=0)
+
+    # ------------------------------------------------------------------ #
+    # 执行
+    # ------------------------------------------------------------------ #
+
+    def run(self, X: pd.DataFrame, y: np.ndarray, trade_dates) -> pd.DataFrame:
+        """
+        :param X:           特征矩阵（load_and_prepare 的 X）
+        :param y:           标签
+        :param trade_dates: 与 X 行对齐的 trade_date
+        :return: 本次搜索的全部试验记录（每个试验取最后一档）
+        """
+        order = np.argsort(np.asarray(trade_dates).astype(str), kind="stable")
+        split = int(len(order) * (1 - self.val_ratio))
+        y_sorted = np.asarray(y)[order]
+        pos = int(y_sorted[:split].sum())
+        neg = split - pos
+        scale_pos_weight = min(round(neg / pos, 2) if pos > 0 else 1.0, _MAX_SCALE_POS_WEIGHT)
+
+        workers, n_jobs = self._resolve_workers()
+        logger.info(
+            f"[HyperSearch] {self.method} | 试验数: {self.n_trials} | 训练集: {split} 行 | 验证集: {len(order) - split} 行"
+            f" | 并行试验数: {workers} × XGBoost 线程: {n_jobs}"
+        )
+
+        tmp_dir = tempfile.mkdtemp(prefix="hyper_search_")
+        try:
+            # ---- 分箱一次，按日期排序落盘，各试验共享 ----
+            codes_path = os.path.join(tmp_dir, "codes.npy")
+            y_path     = os.path.join(tmp_dir, "y.npy")
+            np.save(codes_path, build_bin_codes(X)[order])
+            np.save(y_path, y_sorted)
+
+            base_task = {
+                "codes_path": codes_path, "y_path": y_path, "split": split,
+                "feature_cols": list(X.columns), "n_jobs": n_jobs,
+                "base_params": self.base_params, "scale_pos_weight": scale_pos_weight,
+            }
+            pool = None
+            if workers > 1:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            submit = pool.submit if pool else _run_inline
+            try:
+                if self.method == "random":
+                    self._run_random(submit, base_task, workers)
+                else:
+                    self._run_halving(submit, base_task)
+            finally:
+                if pool:
+                    pool.shutdown()
+                clear_trial_matrix_cache()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        records = pd.DataFrame(self._records)
+        self.results = (records.sort_values("rung").groupby("trial_id").tail(1)
+                        .sort_values("val_auc", ascending=False).reset_index(drop=True))
+        logger.info(f"[HyperSearch] 结果表已追加: {self.results_path}")
+        return self.results
+
+    def _run_random(self, submit, base_task: dict, workers: int):
+        """随机搜索：保持 workers 个试验在途，新试验携带当前中位数曲线用于剪枝"""
+        candidates = self._candidates()
+        budget = self.base_params["n_estimators"]
+        pending, next_id = set(), 0
+        while next_id < len(candidates) or pending:
+            while next_id < len(candidates) and len(pending) < workers:
+                task = {**base_task, "trial_id": next_id, "params": candidates[next_id],
+                        "budget": budget, "median_curve": self._median_curve()}
+                pending.add(submit(_run_trial, task))
+                next_id += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._record(future.result())
+
+    def _run_halving(self, submit, base_task: dict):
+        """连续减半：逐档训练存活试验，按验证 AUC 保留前 1/eta"""
+        max_rounds = self.base_params["n_estimators"]
+        budgets, budget = [], HALVING_MIN_ROUNDS
+        while budget < max_rounds:
+            budgets.append(budget)
+            budget *= HALVING_ETA
+        budgets.append(max_rounds)
+
+        alive = {i: params for i, params in enumerate(self._candidates())}
+        converged: Dict[int, dict] = {}   # 已在更低档早停：更高档结果相同，直接沿用
+        for rung, budget in enumerate(budgets):
+            futures = []
+            for trial_id, params in alive.items():
+                if trial_id in converged:
+                    carried = {**converged[trial_id], "rung": rung, "budget": budget, "elapsed_s": 0.0}
+                    futures.append(_run_inline(lambda t: t, carried))
+                    continue
+                task = {**base_task, "trial_id": trial_id, "params": params, "budget": budget, "rung": rung}
+                futures.append(submit(_run_trial, task))
+
+            results = []
+            for future in futures:
+                result = future.result()
+                if result["rounds_trained"] < budget:
+                    converged[result["trial_id"]] = dict(result)
+                results.append(result)
+
+            results.sort(key=lambda r: r["val_auc"], reverse=True)
+            n_keep = len(results) if rung == len(budgets) - 1 else max(1, len(results) // HALVING_ETA)
+            for i, result in enumerate(results):
+                if i >= n_keep:
+                    result = {**result, "pruned": True, "pruned_at": result["rounds_trained"]}
+                self._record(result)
+            alive = {r["trial_id"]: r["params"] for r in results[:n_keep]}
+            logger.info(f"[HyperSearch] 档位 {rung}（{budget} 轮）| 存活 {n_keep}/{len(results)}")
+
+    # ------------------------------------------------------------------ #
+    # 最优参数导出
+    # ------------------------------------------------------------------ #
+
+    def best(self) -> dict:
+        """未被剪枝的试验中验证 AUC 最高者"""
+        if self.results.empty:
+            raise RuntimeError("尚无搜索结果，先调用 run()")
+        finished = self.results[~self.results["pruned"]]
+        return (finished if not finished.empty else self.results).iloc[0].to_dict()
+
+    def export_best(self, path: str) -> dict:
+        """
+        最优参数写入 JSON（SectorHeatXGBModel(params_path=path) 加载）
+        :return: 写入的内容
+        """
+        best = self.best()
+        payload = {
+            "params":         best["params"],
+            "val_auc":        best["val_auc"],
+            "val_logloss":    best["val_logloss"],
+            "best_iteration": int(best["best_iteration"]),
+            "trial_id":       int(best["trial_id"]),
+            "method":         self.method,
+            "search_id":      self.search_id,
+            "created_at":     datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        logger.info(f"[HyperSearch] 最优参数已导出: {path} | 试验 {payload['trial_id']} | AUC:{payload['val_auc']:.4f}")
+        return payload
+
+    def log_summary(self, top: int = 5):
+        baseline = self.results[self.results["trial_id"] == 0]
+        if not baseline.empty:
+            logger.info(f"[HyperSearch] 基线（base_params）AUC:{baseline.iloc[0]['val_auc']:.4f}")
+        for row in self.results.head(top).to_dict(orient="records"):
+            logger.info(
+                f"[HyperSearch] Top | 试验 {row['trial_id']:3d} | AUC:{row['val_auc']:.4f}"
+                f" | 轮数:{row['best_iteration'] + 1} | {json.dumps(row['params'], sort_keys=True)}"
+            )
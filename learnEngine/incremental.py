@@ -0,0 +1,312 @@
+"""
+增量模型更新 (IncrementalUpdater)
+==================================
+train.py 每次重训都在全部历史上从头拟合；每日新增的已标注交易日只有数百行，
+却要重新读取 / 分箱 / 训练整个训练集。增量模式在当前原生模型上续训（continued boosting）：
+
+    当前模型（清单 date_range.train_end 之前的数据已训练）
+        └─ 截至最优轮 ──┬─ 新交易日（train_end 之后）去掉尾部两段 → 追加新树（上限 max_new_trees）
+                        ├─ 其后 holdout_days 个交易日 → early stopping
+                        └─ 最后 guard_days 个交易日   → 回退守卫（early stopping 不可见，避免选轮与验收同源）
+
+    1. 树数上限：单次最多追加 max_new_trees 棵；累计树数达 max_total_trees 时转全量重训
+    2. 回退守卫：新旧模型在守卫窗口上比较 AUC，下降超过 max_auc_drop 时放弃本次更新（保留原模型文件）；
+       续训后最优仍是原模型（追加 0 棵树）同样视为未通过
+    3. 全量重训策略（plan 返回 full）：
+         - 距上次全量重训新增交易日数 ≥ full_refit_days
+         - 特征列 / 超参数 / 因子版本与模型清单不一致
+         - 模型清单缺少训练日期区间（如 pickle 转换的旧模型）
+    4. 留出集 / 守卫窗口日期在下一次更新时并入训练（清单 date_range 记录已训练 / 留出区间）
+
+清单追加 full_refit（上次全量重训所见数据截止日）与 incremental_updates（逐次更新记录）；
+benchmark=True 时在相同训练区间 / 留出集上再做一次全量重训，对比耗时与 AUC / logloss。
+"""
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from sklearn.metrics import log_loss, roc_auc_score
+
+from learnEngine.model import SectorHeatXGBModel
+from learnEngine.model_artifact import ModelArtifact
+from learnEngine.train_loader import TrainingDataLoader
+from utils.log_utils import logger
+
+# 单次增量最多追加的树数
+DEFAULT_MAX_NEW_TREES = 50
+# 累计树数上限（达到后转全量重训，避免模型无限增长）
+DEFAULT_MAX_TOTAL_TREES = 600
+# 新数据尾部留作 early stopping 的交易日数（守卫窗口之前）
+DEFAULT_HOLDOUT_DAYS = 5
+# 新数据最末留作回退守卫的交易日数（early stopping 不可见）
+DEFAULT_GUARD_DAYS = 3
+# 守卫窗口 AUC 允许的最大下降（超过则放弃本次增量）
+DEFAULT_MAX_AUC_DROP = 0.005
+# 距上次全量重训新增交易日数达到该值 → 全量重训
+DEFAULT_FULL_REFIT_DAYS = 20
+# 增量训练集最少行数（不足时本次不更新）
+MIN_NEW_TRAIN_ROWS = 50
+
+# plan() 的决策
+MODE_INCREMENTAL = "incremental"
+MODE_FULL        = "full"
+MODE_NOOP        = "noop"
+
+# 与训练数据无关的参数（比较超参数是否变化时忽略）
+_RUNTIME_PARAMS = ("scale_pos_weight", "n_jobs", "verbosity")
+# 清单中由 save_artifact 生成的字段（续写清单时不沿用）
+_ARTIFACT_KEYS = (
+    "manifest_version", "model_format", "model_file", "sha256", "xgboost_version",
+    "created_at", "feature_names", "feature_dtypes", "best_iteration", "params",
+)
+
+
+def _holdout_metrics(y: np.ndarray, prob: np.ndarray) -> Dict[str, float]:
+    return {
+        "auc":     round(float(roc_auc_score(y, prob)), 6),
+        "logloss": round(float(log_loss(y, prob, labels=[0, 1])), 6),
+    }
+
+
+class IncrementalUpdater:
+    """
+    增量更新：plan → update
+
+    :param model_path:      当前模型（.ubj + 清单），更新通过后原地覆盖
+    :param train_path:      分区存储目录或训练集 CSV（同 train.py）
+    :param target_label:    目标标签列
+    :param is_feature_col:  列名 → 是否为训练特征（train.py 的 _is_feature_col）
+    :param int8_patterns:   按 int8 存放的类别型特征列
+    :param end_date:        新数据截止日（含，None 不限）
+    :param params_path:     调优参数 JSON（与全量训练一致；与清单参数不同则转全量重训）
+    """
+
+    def __init__(self, model_path: str, train_path: str, target_label: str,
+                 is_feature_col: Callable[[str], bool], int8_patterns: List[str] = (),
+                 end_date: str = None, params_path: str = None,
+                 max_new_trees: int = DEFAULT_MAX_NEW_TREES,
+                 max_total_trees: int = DEFAULT_MAX_TOTAL_TREES,
+                 holdout_days: int = DEFAULT_HOLDOUT_DAYS,
+                 guard_days: int = DEFAULT_GUARD_DAYS,
+                 max_auc_drop: float = DEFAULT_MAX_AUC_DROP,
+                 full_refit_days: int = DEFAULT_FULL_REFIT_DAYS):
+        self.model_path      = model_path
+        self.train_path      = train_path
+        self.target_label    = target_label
+        self.is_feature_col  = is_feature_col
+        self.int8_patterns   = list(int8_patterns)
+        self.end_date        = end_date
+        self.params_path     = params_path
+        self.max_new_trees   = max_new_trees
+        self.max_total_trees = max_total_trees
+        self.holdout_days    = holdout_days
+        self.guard_days      = guard_days
+        self.max_auc_drop    = max_auc_drop
+        self.full_refit_days = full_refit_days
+
+        self.artifact = ModelArtifact(model_path)
+        self.mode: Optional[str] = None
+        self.reason = ""
+        self._new_counts: Dict[str, int] = {}    # train_end 之后各交易日行数
+
+    def _make_loader(self, start_date: str = None, end_date: str = None) -> TrainingDataLoader:
+        return TrainingDataLoader(self.train_path, self.target_label, self.is_feature_col,
+                                  self.int8_patterns, start_date, end_date or self.end_date)
+
+    def _make_model(self) -> SectorHeatXGBModel:
+        return SectorHeatXGBModel(model_save_path=self.model_path, params_path=self.params_path)
+
+    def _decide(self, mode: str, reason: str) -> str:
+        self.mode, self.reason = mode, reason
+        logger.info(f"[Incremental] 决策: {mode} | {reason}")
+        return mode
+
+    # ------------------------------------------------------------------ #
+    # 决策
+    # ------------------------------------------------------------------ #
+
+    def plan(self) -> str:
+        """
+        判断本次应增量更新 / 全量重训 / 不更新
+        :return: MODE_INCREMENTAL / MODE_FULL / MODE_NOOP（原因见 self.reason）
+        """
+        errors = self.artifact.validate()
+        if errors:
+            return self._decide(MODE_FULL, f"当前模型不可用：{'；'.join(errors)}")
+        manifest = self.artifact.manifest
+        date_range = manifest.get("date_range") or {}
+        train_end = date_range.get("train_end")
+        if not train_end:
+            return self._decide(MODE_FULL, "模型清单缺少训练日期区间")
+        full_refit_end = (manifest.get("full_refit") or {}).get("data_end") or date_range.get("val_end") or train_end
+
+        # ---- 口径一致性：特征列 / 超参数 / 因子版本 ----
+        loader = self._make_loader(start_date=min(train_end, full_refit_end))
+        if loader.feature_cols != self.artifact.feature_names:
+            return self._decide(MODE_FULL, "训练特征列与模型清单不一致")
+        trained_params = manifest.get("params") or {}
+        changed = sorted(
+            k for k, v in self._make_model().base_params.items()
+            if k not in _RUNTIME_PARAMS and k in trained_params and trained_params[k] != v
+        )
+        if changed:
+            return self._decide(MODE_FULL, f"超参数与模型清单不一致: {changed}")
+        versions = loader.dataset_versions()
+        if versions.get("factor_version") != manifest.get("factor_version") or \
+                (versions.get("feature_versions") or {}) != (manifest.get("feature_versions") or {}):
+            return self._decide(MODE_FULL, "训练集因子版本与模型清单不一致")
+
+        # ---- 树数上限 / 全量重训周期 ----
+        n_trees = self.artifact.iteration_range[1] or self.artifact.booster.num_boosted_rounds()
+        if n_trees >= self.max_total_trees:
+            return self._decide(MODE_FULL, f"累计树数 {n_trees} 已达上限 {self.max_total_trees}")
+        date_counts = loader.date_counts()
+        days_since_full = sum(1 for d in date_counts if d > full_refit_end)
+        if days_since_full >= self.full_refit_days:
+            return self._decide(
+                MODE_FULL, f"距上次全量重训（数据截至 {full_refit_end}）已新增 {days_since_full} 个交易日"
+            )
+
+        # ---- 新数据量 ----
+        self._new_counts = {d: n for d, n in date_counts.items() if d > train_end}
+        new_dates = sorted(self._new_counts)
+        n_reserved = self.holdout_days + self.guard_days
+        if len(new_dates) <= n_reserved:
+            return self._decide(
+                MODE_NOOP,
+                f"{train_end} 之后仅 {len(new_dates)} 个交易日"
+                f"（需多于留出集 {self.holdout_days} 日 + 守卫窗口 {self.guard_days} 日）",
+            )
+        n_new_train = sum(self._new_counts[d] for d in new_dates[:-n_reserved])
+        if n_new_train < MIN_NEW_TRAIN_ROWS:
+            return self._decide(MODE_NOOP, f"新增训练样本不足（{n_new_train} 行 < {MIN_NEW_TRAIN_ROWS}）")
+        return self._decide(
+            MODE_INCREMENTAL,
+            f"新增 {len(new_dates)} 个交易日（{new_dates[0]} ~ {new_dates[-1]}）| 当前树数: {n_trees}",
+        )
+
+    # ------------------------------------------------------------------ #
+    # 增量更新
+    # ------------------------------------------------------------------ #
+
+    def update(self, evaluate_fn: Callable = None, benchmark: bool = False) -> dict:
+        """
+        在当前模型上追加新树；至少追加 1 棵且守卫窗口 AUC 未回退（或回退不超过 max_auc_drop）时覆盖保存
+        :param evaluate_fn: (model, X_val, y_val, feature_cols) → 守卫窗口指标 dict（写入清单 metrics，None = AUC / logloss）
+        :param benchmark:   同时在相同数据上全量重训并对比（耗时 / AUC / logloss）
+        :return: {accepted, n_trees_before, n_trees_after, before, after, seconds, ...}
+        """
+        if self.mode is None:
+            self.plan()
+        if self.mode != MODE_INCREMENTAL:
+            raise RuntimeError(f"当前不适合增量更新（{self.mode}）：{self.reason}")
+
+        t0 = time.time()
+        manifest = self.artifact.manifest
+        new_dates = sorted(self._new_counts)
+        holdout_start = new_dates[-(self.holdout_days + self.guard_days)]
+        guard_start   = new_dates[-self.guard_days]
+
+        # ---- 新数据：留出集之前追加训练，其后 holdout_days 日作 early stopping，最后 guard_days 日作守卫 ----
+        loader = self._make_loader(start_date=new_dates[0])
+        loader.plan_split_at(holdout_start, self._new_counts)
+        X_new, y_new, _ = loader.materialize("train")
+        X_rest, y_rest, keys = loader.materialize("val")
+        is_guard = (keys["trade_date"].astype(str) >= guard_start).to_numpy()
+        X_ho, y_ho = X_rest[~is_guard].reset_index(drop=True), y_rest[~is_guard]
+        X_gd, y_gd = X_rest[is_guard].reset_index(drop=True), y_rest[is_guard]
+        for name, start, y in (("留出集", holdout_start, y_ho), ("守卫窗口", guard_start, y_gd)):
+            if len(np.unique(y)) < 2:
+                self._decide(MODE_NOOP, f"{name}（{start} 起）只有单一类别，无法评估")
+                return {"accepted": False, "reason": self.reason}
+
+        # ---- 基线：当前模型截至最优轮 ----
+        n_before = self.artifact.iteration_range[1] or self.artifact.booster.num_boosted_rounds()
+        base = self.artifact.booster[:n_before]
+        before = _holdout_metrics(y_gd, base.inplace_predict(X_gd))
+
+        xgb_model = self._make_model()
+        xgb_model.train_continued(base, X_new, y_new, X_ho, y_ho, loader.feature_cols,
+                                  max_new_trees=min(self.max_new_trees, self.max_total_trees - n_before),
+                                  save=False)
+        after = _holdout_metrics(y_gd, xgb_model.model.predict_proba(X_gd)[:, 1])
+        n_after = int(xgb_model.model.best_iteration) + 1
+        seconds = round(time.time() - t0, 2)
+
+        # 追加 0 棵树（early stopping 认为原模型最优）视为未通过，不覆盖模型文件
+        grew     = n_after > n_before
+        accepted = grew and after["auc"] >= before["auc"] - self.max_auc_drop
+        result = {
+            "accepted":       accepted,
+            "train_dates":    [new_dates[0], loader.date_range["train_end"]],
+            "holdout_dates":  [holdout_start, new_dates[-self.guard_days - 1]],
+            "guard_dates":    [guard_start, new_dates[-1]],
+            "n_new_train":    int(len(y_new)),
+            "n_holdout":      int(len(y_ho)),
+            "n_guard":        int(len(y_gd)),
+            "n_trees_before": int(n_before),
+            "n_trees_after":  int(n_after),
+            "before":         before,
+            "after":          after,
+            "seconds":        seconds,
+        }
+        logger.info(
+            f"[Incremental] 守卫窗口 {guard_start} ~ {new_dates[-1]}（{len(y_gd)} 行）"
+            f" | AUC: {before['auc']:.4f} → {after['auc']:.4f} | logloss: {before['logloss']:.4f} → {after['logloss']:.4f}"
+            f" | 树数: {n_before} → {n_after} | 耗时: {seconds}s"
+        )
+
+        if accepted:
+            metrics = evaluate_fn(xgb_model.model, X_gd, y_gd, loader.feature_cols) if evaluate_fn else after
+            old_range = manifest.get("date_range") or {}
+            history = list(manifest.get("incremental_updates") or [])
+            history.append({"updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                            **{k: v for k, v in result.items() if k != "accepted"}})
+            xgb_model.save_model({
+                **{k: v for k, v in manifest.items() if k not in _ARTIFACT_KEYS},
+                **loader.dataset_versions(),
+                "date_range": {**loader.date_range, "train_start": old_range.get("train_start")},
+                "n_train":    int(manifest.get("n_train") or 0) + int(len(y_new)),
+                "n_val":      int(len(y_ho) + len(y_gd)),
+                "metrics":    {k: round(float(v), 6) for k, v in metrics.items()},
+                "full_refit": manifest.get("full_refit") or {
+                    "data_end": old_range.get("val_end") or old_range.get("train_end"),
+                },
+                "incremental_updates": history,
+            })
+            logger.info(f"[Incremental] 更新已保存: {self.model_path} | 累计增量次数: {len(history)}")
+        elif not grew:
+            logger.warning("[Incremental] 续训未带来验证集提升（追加 0 棵树），放弃本次增量，保留原模型")
+        else:
+            logger.warning(
+                f"[Incremental] 守卫窗口 AUC 下降 {before['auc'] - after['auc']:.4f} > {self.max_auc_drop}，"
+                f"放弃本次增量，保留原模型"
+            )
+
+        if benchmark:
+            result["full_refit"] = self.benchmark_full_refit(holdout_start, X_ho, y_ho, X_gd, y_gd)
+            logger.info(
+                f"[Incremental] 对比全量重训 | 耗时: 增量 {seconds}s / 全量 {result['full_refit']['seconds']}s"
+                f" | AUC: 增量 {after['auc']:.4f} / 全量 {result['full_refit']['auc']:.4f}"
+                f" | logloss: 增量 {after['logloss']:.4f} / 全量 {result['full_refit']['logloss']:.4f}"
+            )
+        return result
+
+    def benchmark_full_refit(self, holdout_start: str, X_ho, y_ho, X_gd, y_gd) -> dict:
+        """
+        在 原训练起点 ~ 留出集前 上全量重训（分块流式，同 train.py），不保存
+        与增量相同：留出集作 early stopping，守卫窗口评估
+        """
+        t0 = time.time()
+        train_start = (self.artifact.manifest.get("date_range") or {}).get("train_start")
+        loader = self._make_loader(start_date=train_start)
+        loader.plan_split_at(holdout_start)
+        model = SectorHeatXGBModel(model_save_path="", params_path=self.params_path)
+        model.train_streaming(loader.data_iter("train"), X_ho, y_ho, loader.feature_cols, save=False)
+        return {
+            **_holdout_metrics(y_gd, model.model.predict_proba(X_gd)[:, 1]),
+            "n_train": int(loader.n_train),
+            "n_trees": int(model.model.best_iteration) + 1,
+            "seconds": round(time.time() - t0, 2),
+        }
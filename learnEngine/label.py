@@ -17,106 +17,246 @@ label 定义：
              设计约束：label2=1 必然满足 label1（label2 ⊆ label1 的充分子集）
              可用于策略二阶过滤：模型选出 label1 候选后，label2 高概率的票优先持仓
 
+附加标签（extra_labels，可选）：
+    {列名: (h, threshold)} → (D+h close - D+1 open) / D+1 open >= threshold → 1，否则 0
+    含义：D+1 开盘买入、持有至 D+h 收盘；h=1 即 label1 口径。D+h 超出日历或无数据 → NaN
+    列名建议以 "label_" 开头（train.py 通过 EXCLUDE_PATTERNS 排除出特征）
+
 过滤逻辑：
-    - D+1 停牌（无数据）→ 跳过，不作为负样本
+    - D+1 停牌（无数据 / open 缺失）→ 跳过，不作为负样本
     - D+2 无数据 → label2 填 NaN，后续清洗时 dropna 即可
+
+计算方式：
+    - 单日模式：generate_single_date 只拉取候选股 D..D+h 的日线
+    - 区间模式：load_range() 一次加载 [start_date, end_date + 预留] 全市场开/收盘面板
+      （交易日 × 股票矩阵），所有日期、所有标签列用沿日期轴平移的数组运算一次算完；
+      之后 generate_single_date 直接从结果中切片，不再访问数据库
 """
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from typing import List
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 import pandas as pd
-from utils.common_tools import get_trade_dates, get_daily_kline_data
+from utils.common_tools import get_trade_dates, get_kline_range_data
+from utils.db_utils import db
 from utils.log_utils import logger
 
+# label1 阈值：D+1 日内收益率（close / open - 1）
+LABEL1_THRESHOLD = 0.03
+# 区间模式单条查询覆盖的交易日数（控制单次结果集：约 日期数 × 全市场股票数 行）
+_RANGE_CHUNK_DAYS = 40
+# 日历预留：end_date 之后需覆盖 max_horizon 个交易日，按每交易日 2 个自然日估算，另加节假日余量（D+2 时共 10 天，与原口径一致）
+_CALENDAR_PAD_DAYS = 6
+
 
 class LabelEngine:
-    """训练集标签生成引擎"""
+    """
+    训练集标签生成引擎
+
+    :param start_date:   D 日区间起点（yyyy-mm-dd）
+    :param end_date:     D 日区间终点
+    :param extra_labels: 附加标签 {列名: (持有期 h ≥ 1, 收益阈值)}，与 label1/label2 同一次计算
+    """
 
-    def __init__(self, start_date: str, end_date: str):
-        self.start_date = start_date
-        self.end_date   = end_date
-        # 多预留 10 个自然日，确保 end_date 对应的 D+2 交易日在范围内
-        label_end = (pd.to_datetime(end_date) + pd.Timedelta(days=10)).strftime("%Y-%m-%d")
+    def __init__(self, start_date: str, end_date: str,
+                 extra_labels: Optional[Dict[str, Tuple[int, float]]] = None):
+        self.start_date   = start_date
+        self.end_date     = end_date
+        self.extra_labels = dict(extra_labels or {})
+        for name, (horizon, _) in self.extra_labels.items():
+            if int(horizon) < 1:
+                raise ValueError(f"[LabelEngine] 附加标签 {name} 持有期必须 ≥ 1，当前: {horizon}")
+        # 需要向后看的最大交易日数（label2 固定用到 D+2）
+        self.max_horizon = max([2] + [int(h) for h, _ in self.extra_labels.values()])
+        # 多预留自然日，确保 end_date 对应的 D+max_horizon 交易日在范围内
+        label_end = (
+            pd.to_datetime(end_date) + pd.Timedelta(days=2 * self.max_horizon + _CALENDAR_PAD_DAYS)
+        ).strftime("%Y-%m-%d")
         self.all_trade_dates = get_trade_dates(start_date, label_end)
         self.date_idx_map    = {d: i for i, d in enumerate(self.all_trade_dates)}
 
-    def generate_single_date(self, trade_date: str, stock_list: List[str]) -> pd.DataFrame:
+        # 区间模式结果：{trade_date: 当日全市场标签 DataFrame}（load_range 后只读，线程安全）
+        self._range_labels: Optional[Dict[str, pd.DataFrame]] = None
+        self._range_lock = threading.Lock()
+
+    @property
+    def label_columns(self) -> List[str]:
+        return ["label1", "label2"] + list(self.extra_labels)
+
+    # ------------------------------------------------------------------ #
+    # 面板加载
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def _to_panel(kline_df: pd.DataFrame, dates: List[str],
+                  codes: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """日线长表 → (open 矩阵, close 矩阵, 股票列表)，矩阵形状 交易日 × 股票，缺失为 NaN"""
+        if kline_df is None or kline_df.empty:
+            codes = list(codes or [])
+            empty = np.full((len(dates), len(codes)), np.nan)
+            return empty, empty.copy(), codes
+
+        df = kline_df[["ts_code", "trade_date", "open", "close"]].copy()
+        df["trade_date"] = pd.to_datetime(df["trade_date"].astype(str)).dt.strftime("%Y-%m-%d")
+        df["open"]  = pd.to_numeric(df["open"], errors="coerce")
+        df["close"] = pd.to_numeric(df["close"], errors="coerce")
+        df = df.drop_duplicates(subset=["ts_code", "trade_date"], keep="last")
+        if codes is None:
+            codes = sorted(df["ts_code"].unique())
+
+        panel = df.pivot(index="trade_date", columns="ts_code", values=["open", "close"])
+        opens  = panel["open"].reindex(index=dates, columns=codes).to_numpy(dtype=float)
+        closes = panel["close"].reindex(index=dates, columns=codes).to_numpy(dtype=float)
+        return opens, closes, list(codes)
+
+    def _load_range_kline(self, dates: List[str]) -> pd.DataFrame:
+        """按交易日分块读取全市场开/收盘（kline_day.trade_date 为 DATE，按 yyyymmdd 入参）"""
+        frames = []
+        sql = "SELECT ts_code, trade_date, open, close FROM kline_day WHERE trade_date BETWEEN %s AND %s"
+        for i in range(0, len(dates), _RANGE_CHUNK_DAYS):
+            chunk = dates[i:i + _RANGE_CHUNK_DAYS]
+            df = db.query(sql, params=(chunk[0].replace("-", ""), chunk[-1].replace("-", "")), return_df=True)
+            if df is None:
+                raise RuntimeError(f"[LabelEngine] 区间日线查询失败: {chunk[0]} ~ {chunk[-1]}")
+            if not df.empty:
+                frames.append(df)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    # ------------------------------------------------------------------ #
+    # 向量化标签计算
+    # ------------------------------------------------------------------ #
+
+    def _compute_labels(self, opens: np.ndarray, closes: np.ndarray, codes: List[str],
+                        panel_dates: List[str], d_dates: List[str]) -> Dict[str, pd.DataFrame]:
         """
-        生成单日标签（口径与策略对齐：D+1 open 买入，D+1 close 卖出）
+        沿日期轴平移计算标签
+        :param panel_dates: 面板行对应的交易日（须为 all_trade_dates 的连续片段）
+        :param d_dates:     需要输出标签的 D 日（须在 panel_dates 中且 D+2 在日历内）
+        :return: {D 日: DataFrame[stock_code, trade_date, label1, label2, *extra]}
+        """
+        n_dates = len(panel_dates)
+        row_of  = {d: i for i, d in enumerate(panel_dates)}
 
-        :param trade_date: D 日，格式 yyyy-mm-dd
-        :param stock_list: 候选股代码列表
-        :return: DataFrame，列：stock_code, trade_date, label1, label2
-                 D+1 停牌的股票不会出现在返回结果中
+        def shifted(mat: np.ndarray, k: int) -> np.ndarray:
+            """out[t] = mat[t + k]，越界为 NaN"""
+            out = np.full_like(mat, np.nan)
+            if k < n_dates:
+                out[:n_dates - k] = mat[k:]
+            return out
+
+        o1, c1, o2 = shifted(opens, 1), shifted(closes, 1), shifted(opens, 2)
+        # D+1 有数据且开盘价有效才出样本（D+1 停牌不作为负样本）
+        valid = np.isfinite(o1) & (o1 > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            intra  = (c1 - o1) / o1
+            label1 = (intra >= LABEL1_THRESHOLD).astype(np.int8)
+            # label2：D+1 日内盈利 AND D+2 高开；D+2 无数据 → NaN
+            label2 = np.where(np.isfinite(o2), ((c1 > o1) & (o2 > c1)).astype(float), np.nan)
+            extra = {}
+            for name, (horizon, threshold) in self.extra_labels.items():
+                ch  = shifted(closes, int(horizon))
+                ret = (ch - o1) / o1
+                extra[name] = np.where(np.isfinite(ch), (ret >= threshold).astype(float), np.nan)
+
+        codes_arr = np.asarray(codes, dtype=object)
+        result = {}
+        for d in d_dates:
+            t    = row_of[d]
+            cols = np.flatnonzero(valid[t])
+            day_df = pd.DataFrame({
+                "stock_code": codes_arr[cols],
+                "trade_date": d,
+                "label1":     label1[t, cols],
+                "label2":     label2[t, cols],
+            })
+            for name, mat in extra.items():
+                day_df[name] = mat[t, cols]
+            result[d] = day_df
+        return result
+
+    def _label_dates(self, dates: List[str]) -> List[str]:
+        """可出标签的 D 日：在日历内且 D+2 交易日存在"""
+        return [d for d in dates
+                if d in self.date_idx_map and self.date_idx_map[d] + 2 < len(self.all_trade_dates)]
+
+    # ------------------------------------------------------------------ #
+    # 对外接口
+    # ------------------------------------------------------------------ #
+
+    def load_range(self, dates: Optional[List[str]] = None) -> int:
         """
-        if trade_date not in self.date_idx_map:
-            return pd.DataFrame()
+        区间模式：一次加载全部 D 日所需的 D..D+h 面板并算出全部标签
+        :param dates: 需要标签的 D 日（如断点续跑时的待处理日期）；None = [start_date, end_date] 全部
+        :return: 已生成标签的 D 日数
+        """
+        with self._range_lock:
+            if self._range_labels is not None:
+                return len(self._range_labels)
+            if dates is None:
+                dates = [d for d in self.all_trade_dates if d <= self.end_date]
+            d_dates = sorted(self._label_dates(dates))
+            if not d_dates:
+                self._range_labels = {}
+                return 0
 
-        idx = self.date_idx_map[trade_date]
-        if idx + 2 >= len(self.all_trade_dates):
-            return pd.DataFrame()
+            last_idx    = min(self.date_idx_map[d_dates[-1]] + self.max_horizon, len(self.all_trade_dates) - 1)
+            panel_dates = self.all_trade_dates[self.date_idx_map[d_dates[0]]:last_idx + 1]
+            kline_df    = self._load_range_kline(panel_dates)
+            opens, closes, codes = self._to_panel(kline_df, panel_dates)
+            self._range_labels = self._compute_labels(opens, closes, codes, panel_dates, d_dates)
+            logger.info(
+                f"[LabelEngine] 区间标签生成完成 | D 日数:{len(d_dates)} | 股票数:{len(codes)} "
+                f"| 面板:{len(panel_dates)}×{len(codes)} | 标签列:{self.label_columns}"
+            )
+            return len(self._range_labels)
 
-        d1_date = self.all_trade_dates[idx + 1]
-        d2_date = self.all_trade_dates[idx + 2]
+    def generate_range(self) -> pd.DataFrame:
+        """区间模式全部标签（长表，按 trade_date 升序）"""
+        self.load_range()
+        frames = [df for df in self._range_labels.values() if not df.empty]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            columns=["stock_code", "trade_date"] + self.label_columns)
 
-        # 批量拉取 D+1 和 D+2 日线
-        d1_df = get_daily_kline_data(trade_date=d1_date, ts_code_list=stock_list)
-        d2_df = get_daily_kline_data(trade_date=d2_date, ts_code_list=stock_list)
+    def generate_single_date(self, trade_date: str, stock_list: List[str]) -> pd.DataFrame:
+        """
+        生成单日标签（口径与策略对齐：D+1 open 买入，D+1 close 卖出）
 
-        if d1_df.empty:
-            logger.warning(f"[LabelEngine] {d1_date} 日线数据为空，跳过")
+        :param trade_date: D 日，格式 yyyy-mm-dd
+        :param stock_list: 候选股代码列表
+        :return: DataFrame，列：stock_code, trade_date, label1, label2[, 附加标签]
+                 D+1 停牌的股票不会出现在返回结果中；行顺序与 stock_list 一致
+        """
+        if not self._label_dates([trade_date]) or not stock_list:
             return pd.DataFrame()
 
-        d1_df["trade_date"] = d1_df["trade_date"].astype(str)
-        if not d2_df.empty:
-            d2_df["trade_date"] = d2_df["trade_date"].astype(str)
-
-        # 构建快速查找
-        d1_map = {row["ts_code"]: row for _, row in d1_df.iterrows()}
-        d2_map = {row["ts_code"]: row for _, row in d2_df.iterrows()} if not d2_df.empty else {}
-
-        rows = []
-        for ts_code in stock_list:
-            d1_row = d1_map.get(ts_code)
-            if d1_row is None:
-                # D+1 停牌，跳过（不作为负样本）
-                continue
-
-            d1_open  = d1_row.get("open",  0)
-            d1_close = d1_row.get("close", 0)
-
-            if not d1_open or d1_open <= 0:
-                continue
-
-            # label1：D+1 日内收益率 = (D+1 close - D+1 open) / D+1 open
-            d1_intra_return = (d1_close - d1_open) / d1_open
-            label1 = 1 if d1_intra_return >= 0.03 else 0
-
-            # label2：D+1 日内盈利 AND D+2 高开
-            # 设计约束：label2=1 必然满足 label1（值得隔夜持股的强势票）
-            # 原定义（D+2 open > D+1 close）存在 label1=0 时 label2=1 的语义矛盾：
-            # D+1 日内亏损但 D+2 高开 → 实际仍是亏损交易，不应标记为正样本
-            d2_row = d2_map.get(ts_code)
-            if d2_row is not None:
-                d2_open  = d2_row.get("open", 0)
-                # 同时满足：D+1 日内盈利（close > open）且 D+2 高开（open > D+1 close）
-                label2 = 1 if (d1_close > d1_open) and (d2_open > d1_close) else 0
-            else:
-                label2 = None  # D+2 无数据，后续清洗时 dropna
-
-            rows.append({
-                "stock_code": ts_code,
-                "trade_date": trade_date,
-                "label1":     label1,
-                "label2":     label2,
-            })
+        # 区间模式已覆盖该日 → 直接切片；未覆盖（区间外日期）→ 退回单日查询
+        day_df = self._range_labels.get(trade_date) if self._range_labels is not None else None
+        if day_df is not None:
+            result = (
+                day_df.set_index("stock_code").reindex(list(dict.fromkeys(stock_list)))
+                      .dropna(subset=["label1"]).rename_axis("stock_code").reset_index()
+            )
+            result["label1"] = result["label1"].astype(np.int8)
+        else:
+            idx         = self.date_idx_map[trade_date]
+            panel_dates = self.all_trade_dates[idx:idx + self.max_horizon + 1]
+            kline_df    = get_kline_range_data(
+                "kline_day", panel_dates[1:], list(dict.fromkeys(stock_list)),
+                columns="ts_code, trade_date, open, close",
+            )
+            if kline_df.empty:
+                logger.warning(f"[LabelEngine] {panel_dates[1]} 日线数据为空，跳过")
+                return pd.DataFrame()
+            opens, closes, codes = self._to_panel(kline_df, panel_dates, list(dict.fromkeys(stock_list)))
+            result = self._compute_labels(opens, closes, codes, panel_dates, [trade_date])[trade_date]
 
-        result = pd.DataFrame(rows)
         if not result.empty:
             logger.info(
                 f"[LabelEngine] {trade_date} 标签生成完成 | "
-                f"样本数:{len(result)} | 正样本(label1):{result['label1'].sum()}"
+                f"样本数:{len(result)} | 正样本(label1):{int(result['label1'].sum())}"
             )
         return result
@@ -1,10 +1,15 @@
 # learnEngine/model.py
-import pickle
+import json
+import os
 import pandas as pd
 import xgboost as xgb
 from sklearn.metrics import accuracy_score, roc_auc_score
+from learnEngine.model_artifact import ModelArtifact, save_artifact
 from utils.log_utils import logger
 
+# 越大越好的评估指标（其余如 logloss / error 越小越好），判断续训是否优于原模型用
+_MAXIMIZE_METRICS = ("auc", "aucpr", "map", "ndcg", "pre")
+
 
 class SectorHeatXGBModel:
     """
@@ -22,9 +27,15 @@ class SectorHeatXGBModel:
       - eval_metric="auc" : 不平衡数据下 AUC 远比 accuracy 可靠
     """
 
-    def __init__(self, model_save_path: str = "learnEngine/models/sector_heat_xgb_model.pkl"):
+    def __init__(self, model_save_path: str = "learnEngine/models/sector_heat_xgb_model.ubj",
+                 params_path: str = None):
+        """
+        :param params_path: 超参数搜索导出的 JSON（hyper_search.export_best），存在时覆盖 base_params 同名参数
+        """
         self.model_save_path = model_save_path
         self.model = None
+        # 训练特征列 → dtype（写入模型清单，推断端按此对齐）
+        self.feature_dtypes = {}
         # scale_pos_weight 在 train() 中根据实际数据动态计算
         self.base_params = {
             "objective": "binary:logistic",
@@ -55,9 +66,25 @@ class SectorHeatXGBModel:
             "random_state": 42,
             "verbosity": 0,
         }
+        if params_path and os.path.exists(params_path):
+            self.load_params(params_path)
+
+    def load_params(self, params_path: str):
+        """加载超参数搜索导出的最优参数，仅覆盖 base_params 中已有的参数"""
+        with open(params_path, encoding="utf-8") as f:
+            tuned = json.load(f).get("params", {})
+        unknown = sorted(set(tuned) - set(self.base_params))
+        if unknown:
+            logger.warning(f"忽略未知参数: {unknown}（{params_path}）")
+        self.base_params.update({k: v for k, v in tuned.items() if k in self.base_params})
+        logger.info(f"已加载调优参数: {params_path} | {json.dumps(tuned, sort_keys=True)}")
 
-    def train(self, X_train, X_val, y_train, y_val, feature_cols: list):
-        """训练模型，动态计算 scale_pos_weight，启用 early stopping"""
+    def train(self, X_train, X_val, y_train, y_val, feature_cols: list, save: bool = True, n_jobs: int = None):
+        """
+        训练模型，动态计算 scale_pos_weight，启用 early stopping
+        :param save:   训练后是否保存模型（滚动前推的各折只评估，不落盘）
+        :param n_jobs: XGBoost 线程数，None = base_params（多折并行时按折分配 CPU）
+        """
         # ── 动态计算正负样本比（解决 A 股标签高度不平衡问题）──────────────
         pos = int(y_train.sum())
         neg = int(len(y_train) - pos)
@@ -69,6 +96,8 @@ class SectorHeatXGBModel:
         )
 
         params = {**self.base_params, "scale_pos_weight": scale_pos_weight}
+        if n_jobs is not None:
+            params["n_jobs"] = n_jobs
         self.model = xgb.XGBClassifier(**params)
 
         # ── 训练（eval_set 用于 early stopping 监控 AUC）──────────────────
@@ -79,10 +108,117 @@ class SectorHeatXGBModel:
             eval_set=[(X_val, y_val)],
             verbose=False,
         )
+        self.feature_dtypes = {c: str(t) for c, t in X_train.dtypes.items()}
 
         actual_trees = self.model.best_iteration + 1 if hasattr(self.model, "best_iteration") else params["n_estimators"]
         logger.info(f"实际训练轮数: {actual_trees} / {params['n_estimators']}")
 
+        self._log_validation(X_val, y_val, feature_cols)
+        if save:
+            self.save_model()
+        return self.model
+
+    def train_streaming(self, train_iter: xgb.DataIter, X_val, y_val, feature_cols: list, save: bool = True):
+        """
+        低内存训练：训练集由 DataIter 分块喂入，直接构建 QuantileDMatrix（不物化原始特征矩阵），
+        参数 / early stopping 与 train() 一致，训练结果包装回 XGBClassifier（保存与推断接口不变）
+        """
+        dtrain = xgb.QuantileDMatrix(train_iter)   # 特征名随 DataFrame 块传入
+        dval   = xgb.QuantileDMatrix(X_val, label=y_val, ref=dtrain)
+
+        pos = int(getattr(train_iter, "n_pos", 0))
+        neg = int(dtrain.num_row() - pos)
+        scale_pos_weight = round(neg / pos, 2) if pos > 0 else 1.0
+        scale_pos_weight = min(scale_pos_weight,4.0)
+        logger.info(
+            f"训练集样本分布 | 正样本(买入):{pos} 负样本:{neg} "
+            f"→ scale_pos_weight={scale_pos_weight}"
+        )
+
+        params = {**self.base_params, "scale_pos_weight": scale_pos_weight}
+        logger.info("开始训练 XGBoost 模型（分块 QuantileDMatrix）...")
+        booster = xgb.train(
+            self._booster_params(params), dtrain,
+            num_boost_round=params["n_estimators"],
+            evals=[(dval, "validation_0")],
+            early_stopping_rounds=params["early_stopping_rounds"],
+            verbose_eval=False,
+        )
+        logger.info(f"实际训练轮数: {booster.best_iteration + 1} / {params['n_estimators']}")
+
+        self.model = xgb.XGBClassifier(**params)
+        self.model.load_model(booster.save_raw(raw_format="ubj"))
+        self.feature_dtypes = {c: str(t) for c, t in X_val.dtypes.items()}
+
+        self._log_validation(X_val, y_val, feature_cols)
+        if save:
+            self.save_model()
+        return self.model
+
+    def train_continued(self, booster: xgb.Booster, X_train, y_train, X_val, y_val, feature_cols: list,
+                        max_new_trees: int, save: bool = True):
+        """
+        增量训练：在已有 Booster 上以新交易日数据续训（追加树，已有树不变），early stopping 同 base_params
+        最优新树在验证集上不优于原模型时不追加任何树（返回原模型，追加树数为 0）
+        :param booster:       已有模型（需已截至最优轮，续训不拷贝原对象）
+        :param max_new_trees: 本次最多追加的树数
+        """
+        pos = int(y_train.sum())
+        neg = int(len(y_train) - pos)
+        scale_pos_weight = round(neg / pos, 2) if pos > 0 else 1.0
+        scale_pos_weight = min(scale_pos_weight,4.0)
+        logger.info(
+            f"增量训练集样本分布 | 正样本(买入):{pos} 负样本:{neg} "
+            f"→ scale_pos_weight={scale_pos_weight}"
+        )
+
+        params = {**self.base_params, "scale_pos_weight": scale_pos_weight}
+        dtrain = xgb.DMatrix(X_train, label=y_train)
+        dval   = xgb.DMatrix(X_val, label=y_val)
+        n_base = booster.num_boosted_rounds()
+        # early stopping 只在新追加的轮次里取最优，"不追加"需与续训前的验证集分数单独比较
+        base_score = float(booster.eval(dval, "validation_0").split()[-1].split(":")[1])
+
+        logger.info(f"开始增量训练 XGBoost 模型（已有 {n_base} 棵树，最多追加 {max_new_trees} 棵）...")
+        grown = xgb.train(
+            self._booster_params(params), dtrain,
+            num_boost_round=max_new_trees,
+            evals=[(dval, "validation_0")],
+            early_stopping_rounds=params["early_stopping_rounds"],
+            verbose_eval=False,
+            xgb_model=booster,
+        )
+        maximize = str(params["eval_metric"]).split("@")[0] in _MAXIMIZE_METRICS
+        improved = grown.best_score > base_score if maximize else grown.best_score < base_score
+        # 只保留到最优轮（best_iteration 为全局轮号），保存后推断端无需 iteration_range 截断多余树
+        best = grown.best_iteration if improved else n_base - 1
+        booster = (grown if improved else booster)[: best + 1]
+        booster.set_attr(best_iteration=str(best))
+        logger.info(
+            f"增量追加轮数: {best + 1 - n_base} / {max_new_trees} | 累计树数: {best + 1}"
+            f" | 验证集 {params['eval_metric']}: {base_score:.4f} → {grown.best_score if improved else base_score:.4f}"
+        )
+
+        self.model = xgb.XGBClassifier(**params)
+        self.model.load_model(booster.save_raw(raw_format="ubj"))
+        self.feature_dtypes = {c: str(t) for c, t in X_val.dtypes.items()}
+
+        self._log_validation(X_val, y_val, feature_cols)
+        if save:
+            self.save_model()
+        return self.model
+
+    @staticmethod
+    def _booster_params(params: dict) -> dict:
+        """XGBClassifier 参数 → xgb.train 原生参数"""
+        booster_params = {
+            k: v for k, v in params.items()
+            if k not in ("n_estimators", "early_stopping_rounds", "n_jobs", "random_state")
+        }
+        booster_params.update(nthread=params["n_jobs"], seed=params["random_state"])
+        return booster_params
+
+    def _log_validation(self, X_val, y_val, feature_cols: list):
         # ── 评估 ──────────────────────────────────────────────────────────
         y_val_pred  = self.model.predict(X_val)
         y_val_proba = self.model.predict_proba(X_val)[:, 1]
@@ -102,28 +238,30 @@ class SectorHeatXGBModel:
         logger.info("Top 5 重要因子:")
         logger.info(feature_importance.head(5).to_string(index=False))
 
-        self.save_model()
-        return self.model
-
-    def save_model(self):
-        """保存训练好的模型到本地"""
+    def save_model(self, metadata: dict = None):
+        """
+        保存为 XGBoost 原生 UBJSON + 旁路清单（model_artifact）
+        :param metadata: 训练元数据（因子版本 / 训练日期区间 / 验证指标等），写入清单
+        """
         if self.model is None:
             logger.error("模型还未训练，无法保存")
             return
-        with open(self.model_save_path, "wb") as f:
-            pickle.dump(self.model, f)
+        fitted = self.model.get_params()
+        metadata = {"params": {k: fitted.get(k, v) for k, v in self.base_params.items()}, **(metadata or {})}
+        save_artifact(self.model, self.model_save_path, self.feature_dtypes, metadata)
         logger.info(f"模型已保存到：{self.model_save_path}")
 
     def load_model(self):
-        """加载本地保存的模型，用于策略里的预测"""
-        try:
-            with open(self.model_save_path, "rb") as f:
-                self.model = pickle.load(f)
-            logger.info("模型加载成功！")
-            return self.model
-        except Exception as e:
-            logger.error(f"模型加载失败：{e}")
-            raise
+        """加载本地保存的模型（先按清单校验，再加载原生模型），用于策略里的预测"""
+        artifact = ModelArtifact(self.model_save_path)
+        errors = artifact.validate()
+        if errors:
+            logger.error(f"模型加载失败：{'；'.join(errors)}")
+            raise ValueError(f"模型工件校验失败: {self.model_save_path}")
+        self.model = artifact.to_classifier()
+        self.feature_dtypes = artifact.feature_dtypes
+        logger.info("模型加载成功！")
+        return self.model
 
     def predict_profit_prob(self, feature_df: pd.DataFrame) -> list:
         """
@@ -0,0 +1,312 @@
+"""
+模型工件 (ModelArtifact)
+=========================
+原方式：pickle.dump(XGBClassifier) → sector_heat_xgb_model.pkl，策略端 pickle.load 后检查 feature_names_in_
+        反序列化会执行任意代码（不安全）、与 xgboost / sklearn 版本强绑定，且整对象反序列化较慢
+现方式：
+    <name>.ubj             XGBoost 原生 UBJSON（跨版本兼容，加载不执行代码）
+    <name>.manifest.json   旁路清单：特征列 / dtype、FACTOR_VERSION 与各因子版本、训练日期区间、
+                           验证指标、最优轮数、xgboost 版本、模型文件 sha256
+
+加载：构造时只读清单；validate() 按清单做 schema 校验（清单格式、文件完整性、特征列、因子版本），
+      首次预测时才反序列化 Booster（懒加载）；预测按清单特征列 / dtype 对齐输入
+
+批量推断（InferencePlan）：
+    prepare_features 每次调用都按列 pd.to_numeric → 逐列 astype → 重建 DataFrame，再由 XGBoost 解析 DataFrame；
+    回测中逐日调用时 pandas 开销占信号耗时的可观比例。模型加载时预编译推断计划：
+        1. 列映射：引擎输出列位置 → 模型输入列位置（按输出列签名缓存，列不变时直接复用）
+        2. dtype 转换表：数值列直接拷贝；Decimal / object 列先按 float 批量转换，失败再退回 pd.to_numeric；
+           整数特征截断取整（与 astype(int) 一致）
+        3. 预分配 float32 缓冲区（行数不足时按倍数扩容），NaN / inf 原地置 0 后直接喂给 Booster.inplace_predict
+    输出概率与 prepare_features + predict_proba 一致
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from utils.log_utils import logger
+
+# 清单格式版本（字段不兼容变更时递增）
+MANIFEST_VERSION = 1
+# 模型文件格式
+MODEL_FORMAT = "xgboost-ubj"
+_MANIFEST_SUFFIX = ".manifest.json"
+# 旧版 pickle 模型 feature_types → 清单 dtype
+_PICKLE_DTYPES = {"int": "int64", "i": "int64", "float": "float32", "q": "float32"}
+
+
+def manifest_path_for(model_path: str) -> str:
+    """sector_heat_xgb_model.ubj → sector_heat_xgb_model.manifest.json"""
+    return os.path.splitext(model_path)[0] + _MANIFEST_SUFFIX
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_artifact(model: xgb.XGBClassifier, model_path: str, feature_dtypes: Dict[str, str],
+                  metadata: Optional[dict] = None) -> dict:
+    """
+    保存原生 UBJSON 模型 + 旁路清单（清单最后写入，作为模型已完整落盘的标志）
+    :param feature_dtypes: 训练特征列 → dtype（列顺序即模型输入顺序）
+    :param metadata:       训练元数据（因子版本 / 日期区间 / 指标等），原样写入清单
+    :return: 清单
+    """
+    if os.path.splitext(model_path)[1] != ".ubj":
+        raise ValueError(f"模型文件需使用 .ubj 扩展名（XGBoost 原生 UBJSON）: {model_path}")
+    os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+
+    tmp_path = model_path + ".tmp.ubj"
+    model.save_model(tmp_path)
+    os.replace(tmp_path, model_path)
+
+    best_iteration = getattr(model, "best_iteration", None)
+    manifest = {
+        "manifest_version": MANIFEST_VERSION,
+        "model_format":     MODEL_FORMAT,
+        "model_file":       os.path.basename(model_path),
+        "sha256":           _file_sha256(model_path),
+        "xgboost_version":  xgb.__version__,
+        "created_at":       datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "feature_names":    list(feature_dtypes),
+        "feature_dtypes":   dict(feature_dtypes),
+        "best_iteration":   None if best_iteration is None else int(best_iteration),
+        **(metadata or {}),
+    }
+    manifest_path = manifest_path_for(model_path)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+class ModelArtifact:
+    """
+    原生模型 + 清单的懒加载视图
+
+    :param model_path: .ubj 模型路径（清单为同名 .manifest.json）
+    :param nthread:    推断线程数（None = XGBoost 默认）
+    """
+
+    def __init__(self, model_path: str, nthread: Optional[int] = None):
+        self.model_path    = model_path
+        self.manifest_path = manifest_path_for(model_path)
+        self.nthread       = nthread
+        self.manifest: dict = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        self._booster: Optional[xgb.Booster] = None
+
+    @property
+    def feature_names(self) -> List[str]:
+        return list(self.manifest.get("feature_names", []))
+
+    @property
+    def feature_dtypes(self) -> Dict[str, str]:
+        return dict(self.manifest.get("feature_dtypes", {}))
+
+    @property
+    def iteration_range(self) -> tuple:
+        """早停模型只用到最优轮（与 XGBClassifier.predict_proba 一致），(0, 0) = 全部树"""
+        best = self.manifest.get("best_iteration")
+        return (0, best + 1) if best is not None else (0, 0)
+
+    # ------------------------------------------------------------------ #
+    # 校验
+    # ------------------------------------------------------------------ #
+
+    def validate(self, feature_versions: Optional[Dict[str, str]] = None,
+                 check_hash: bool = True,
+                 factor_version: Optional[str] = None) -> List[str]:
+        """
+        按清单校验工件（不反序列化模型）
+        :param feature_versions: 当前各因子版本（FeatureEngine.feature_versions()），
+                                 与训练时版本不同的因子视为口径不一致
+        :param factor_version:   当前训练集口径（learnEngine.dataset.FACTOR_VERSION），与训练时不同视为口径不一致
+        :return: 问题列表（空 = 通过）；口径相关问题以"因子版本"开头，清单缺少版本信息（如 pickle 迁移）同样计入
+        """
+        if not self.manifest:
+            return [f"模型清单不存在: {self.manifest_path}"]
+        errors = []
+        if self.manifest.get("manifest_version") != MANIFEST_VERSION:
+            errors.append(f"清单版本 {self.manifest.get('manifest_version')} 不受支持（当前 {MANIFEST_VERSION}）")
+        if self.manifest.get("model_format") != MODEL_FORMAT:
+            errors.append(f"模型格式 {self.manifest.get('model_format')} 不受支持（需 {MODEL_FORMAT}）")
+        if not os.path.exists(self.model_path):
+            errors.append(f"模型文件不存在: {self.model_path}")
+        elif check_hash and _file_sha256(self.model_path) != self.manifest.get("sha256"):
+            errors.append(f"模型文件与清单 sha256 不一致（文件被替换或写入不完整）: {self.model_path}")
+
+        names = self.feature_names
+        if not names:
+            errors.append("清单缺少 feature_names")
+        elif len(set(names)) != len(names):
+            errors.append("清单 feature_names 存在重复列")
+        missing_dtypes = [c for c in names if c not in self.feature_dtypes]
+        if missing_dtypes:
+            errors.append(f"清单缺少 {len(missing_dtypes)} 个特征列的 dtype: {missing_dtypes[:5]}")
+
+        if factor_version:
+            trained_factor = self.manifest.get("factor_version")
+            if not trained_factor:
+                errors.append("因子版本缺失：清单无 factor_version（迁移或旧版工件），无法确认训练口径")
+            elif trained_factor != factor_version:
+                errors.append(f"因子版本与训练时不一致（需重新生成训练集并训练）: "
+                              f"FACTOR_VERSION {trained_factor} → {factor_version}")
+        if feature_versions:
+            trained = self.manifest.get("feature_versions") or {}
+            if not trained:
+                errors.append("因子版本缺失：清单无 feature_versions（迁移或旧版工件），无法确认各因子口径")
+            changed = {
+                n: (v, feature_versions[n]) for n, v in trained.items()
+                if n in feature_versions and feature_versions[n] != v
+            }
+            if changed:
+                detail = ", ".join(f"{n}: {old} → {new}" for n, (old, new) in changed.items())
+                errors.append(f"因子版本与训练时不一致（需重新生成训练集并训练）: {detail}")
+        return errors
+
+    # ------------------------------------------------------------------ #
+    # 推断
+    # ------------------------------------------------------------------ #
+
+    @property
+    def booster(self) -> xgb.Booster:
+        """首次访问时加载原生模型"""
+        if self._booster is None:
+            booster = xgb.Booster()
+            booster.load_model(self.model_path)
+            if self.nthread:
+                booster.set_param({"nthread": self.nthread})
+            self._booster = booster
+        return self._booster
+
+    def prepare_features(self, feature_df: pd.DataFrame) -> tuple:
+        """
+        按清单列序 / dtype 对齐特征（缺失列填 0；Decimal / object 转数值；NaN / inf 填 0）
+        :return: (X, 缺失列列表)
+        """
+        names = self.feature_names
+        missing = [c for c in names if c not in feature_df.columns]
+        X = {}
+        for col in names:
+            if col in missing:
+                values = np.zeros(len(feature_df), dtype=np.float32)
+            else:
+                values = pd.to_numeric(feature_df[col], errors="coerce").to_numpy(dtype=np.float32)
+                values[~np.isfinite(values)] = 0
+            X[col] = values.astype(self.feature_dtypes.get(col, "float32"), copy=False)
+        return pd.DataFrame(X, index=feature_df.index), missing
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        """正类概率（X 需已按 prepare_features 对齐）"""
+        return self.booster.inplace_predict(X, iteration_range=self.iteration_range)
+
+    def inference_plan(self) -> "InferencePlan":
+        """预编译批量推断计划（numpy 缓冲区直连 Booster.inplace_predict）"""
+        return InferencePlan(self)
+
+    def to_classifier(self) -> xgb.XGBClassifier:
+        """包装为 XGBClassifier（保留 feature_names_in_ / best_iteration，兼容 sklearn 接口）"""
+        model = xgb.XGBClassifier()
+        model.load_model(self.model_path)
+        return model
+
+
+class InferencePlan:
+    """
+    预编译推断计划：引擎输出 DataFrame → float32 缓冲区 → inplace_predict
+
+    :param artifact: 已通过 validate() 的模型工件
+    """
+
+    def __init__(self, artifact: ModelArtifact):
+        self.artifact = artifact
+        names = artifact.feature_names
+        self.feature_names = names
+        # 整数特征列位置（预测前截断取整）
+        dtypes = artifact.feature_dtypes
+        self._int_positions = np.array(
+            [j for j, c in enumerate(names) if np.issubdtype(np.dtype(dtypes.get(c, "float32")), np.integer)],
+            dtype=np.intp,
+        )
+        self._buffer = np.zeros((0, len(names)), dtype=np.float32)
+        self._signature: Optional[tuple] = None
+        self._table: List[tuple] = []     # [(模型列位置, 输出列位置, 是否数值列)]
+        self.missing: List[str] = []
+        self._lock = threading.Lock()
+
+    def _compile(self, feature_df: pd.DataFrame):
+        """按输出列签名生成列映射与 dtype 转换表"""
+        positions = feature_df.columns.get_indexer(self.feature_names)
+        dtypes = feature_df.dtypes.to_numpy()
+        self._table = [
+            (j, int(src), isinstance(dtypes[src], np.dtype) and dtypes[src].kind in "biuf")
+            for j, src in enumerate(positions) if src >= 0
+        ]
+        self.missing = [c for c, src in zip(self.feature_names, positions) if src < 0]
+        self._signature = tuple(feature_df.columns)
+
+    def _rows(self, n: int) -> np.ndarray:
+        """取 n 行缓冲区视图（容量不足时按 2 倍扩容）"""
+        if n > len(self._buffer):
+            self._buffer = np.zeros((max(n, 2 * len(self._buffer)), len(self.feature_names)), dtype=np.float32)
+        return self._buffer[:n]
+
+    @staticmethod
+    def _coerce(values: np.ndarray) -> np.ndarray:
+        """Decimal / object 列 → float（无法解析的值为 NaN，与 pd.to_numeric(errors="coerce") 一致）"""
+        try:
+            return np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def predict(self, feature_df: pd.DataFrame) -> tuple:
+        """
+        :return: (正类概率, 缺失特征列)；缺失列按 0 填充
+        """
+        with self._lock:
+            if tuple(feature_df.columns) != self._signature:
+                self._compile(feature_df)
+            n = len(feature_df)
+            buf = self._rows(n)
+            buf[:] = 0
+            for j, src, numeric in self._table:
+                values = feature_df.iloc[:, src].to_numpy()
+                buf[:, j] = values if numeric else self._coerce(values)
+            np.nan_to_num(buf, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+            if len(self._int_positions):
+                buf[:, self._int_positions] = np.trunc(buf[:, self._int_positions])
+            probs = self.artifact.booster.inplace_predict(buf, iteration_range=self.artifact.iteration_range)
+            return np.array(probs, copy=True), list(self.missing)
+
+
+def migrate_pickle(pkl_path: str, model_path: str) -> dict:
+    """
+    一次性把旧版 pickle 模型转换为原生 UBJSON + 清单
+    （pickle.load 会执行文件中的代码，仅用于转换本机 train.py 产出的可信文件）
+    """
+    with open(pkl_path, "rb") as f:
+        model = pickle.load(f)
+    # 整数型特征（XGBoost feature_types 为 int）保留整数 dtype，其余按 float32
+    feature_types = model.get_booster().feature_types or []
+    feature_dtypes = {
+        c: _PICKLE_DTYPES.get(feature_types[i] if i < len(feature_types) else "float", "float32")
+        for i, c in enumerate(model.feature_names_in_)
+    }
+    manifest = save_artifact(model, model_path, feature_dtypes, {"migrated_from": os.path.basename(pkl_path)})
+    logger.info(f"[ModelArtifact] 已转换 {pkl_path} → {model_path} | 特征数: {len(feature_dtypes)}")
+    return manifest
@@ -0,0 +1,323 @@
+"""
+已处理日期记录 (ProcessedDatesManager)
+======================================
+断点续跑的"已处理日期"状态，由 快照 + 追加日志 两个文件组成：
+
+    processed_dates.json          快照：{factor_version, generation, processed_dates}（原子替换写入）
+    processed_dates.json.journal  追加日志：每行一条 JSON 记录，写入后 fsync
+                                  {"op": "header", "factor_version": ..., "generation": N}
+                                  {"op": "add", "date": "2024-11-04"}
+
+    - add() 只向日志追加一行（O(1)），不再每个日期重写整份 JSON；成员判断用内存 set
+    - 日志每累计 COMPACT_EVERY 条记录压缩一次：写新快照（generation + 1）→ 截断日志
+    - 进程崩溃最多留下日志末尾一行半截记录，加载时忽略无法解析的行
+    - 多进程并发写：所有写操作持有 <快照>.lock 文件锁（fcntl / msvcrt），
+      写入前先读取其他进程追加的新记录；快照 generation 变化说明日志已被他人压缩，整体重载
+    - 旧版单文件 JSON（无 generation 字段）可直接读取，首次压缩后升级为新格式
+
+运行本模块（python -m learnEngine.processed_dates）对 10k 日期历史做基准测试。
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Set
+
+from utils.log_utils import logger
+
+try:
+    import fcntl          # Linux / macOS
+except ImportError:       # Windows
+    fcntl = None
+
+try:
+    import msvcrt         # Windows
+except ImportError:
+    msvcrt = None
+
+
+# 日志累计多少条 add 记录后压缩为快照
+COMPACT_EVERY = 500
+# 日志文件后缀 / 锁文件后缀
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX    = ".lock"
+
+
+def _fsync_write(path: str, text: str):
+    """临时文件写入 + fsync + 原子替换"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ProcessedDatesManager:
+    """
+    管理已处理日期的读写（追加日志 + 定期快照，支持多进程并发写）
+
+    :param file_path:      快照文件路径（日志 / 锁文件在同目录下加后缀）
+    :param factor_version: 当前 FACTOR_VERSION；与快照版本不一致时清空记录（强制重跑）
+    :param compact_every:  日志压缩阈值（条）
+    """
+
+    def __init__(self, file_path: str, factor_version: str, compact_every: int = COMPACT_EVERY):
+        self.file_path      = file_path
+        self.journal_path   = file_path + JOURNAL_SUFFIX
+        self.lock_path      = file_path + LOCK_SUFFIX
+        self.factor_version = factor_version
+        self.compact_every  = compact_every
+
+        self._dates: Set[str]   = set()
+        self._generation        = 0     # 当前快照代数（日志头与之对应）
+        self._journal_offset    = 0     # 已读取到的日志字节位置
+        self._journal_records   = 0     # 日志中 add 记录数（压缩判断）
+        self._thread_lock       = threading.Lock()
+
+        with self._locked():
+            self._load()
+
+    # ------------------------------------------------------------------ #
+    # 文件锁
+    # ------------------------------------------------------------------ #
+
+    @contextmanager
+    def _locked(self):
+        """进程内线程锁 + 跨进程文件锁（平台不支持时退化为仅线程锁）"""
+        with self._thread_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+            with open(self.lock_path, "a+b") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                elif msvcrt is not None:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    elif msvcrt is not None:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    # ------------------------------------------------------------------ #
+    # 读取（调用方持有锁）
+    # ------------------------------------------------------------------ #
+
+    def _load(self):
+        """加载快照 + 重放日志；因子版本不一致则清空（强制重跑）"""
+        self._dates, self._generation = set(), 0
+        self._journal_offset, self._journal_records = 0, 0
+
+        if os.path.exists(self.file_path):
+            try:
+                with open(self.file_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("factor_version") != self.factor_version:
+                    logger.warning("因子版本变更，清空已处理记录（将重新生成全量数据）")
+                    self._write_snapshot(set(), generation=int(data.get("generation", 0)) + 1)
+                    return
+                self._dates      = set(data.get("processed_dates", []))
+                self._generation = int(data.get("generation", 0))
+            except Exception as e:
+                logger.error(f"加载已处理日期失败: {e}")
+                return
+        self._replay_journal()
+
+    def _replay_journal(self):
+        """从 _journal_offset 起重放日志；日志头代数与快照不符（他人已压缩 / 残留旧日志）时忽略"""
+        if not os.path.exists(self.journal_path):
+            return
+        size = os.path.getsize(self.journal_path)
+        if size < self._journal_offset:
+            # 日志已被其他进程压缩截断 → 快照已更新，整体重载
+            self._load()
+            return
+
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            chunk = f.read()
+
+        consumed = 0
+        for raw in chunk.splitlines(keepends=True):
+            if not raw.endswith(b"\n"):
+                break   # 末尾半截记录（写入中 / 崩溃残留），等待下次读取
+            consumed += len(raw)
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                logger.warning(f"[ProcessedDates] 忽略损坏的日志行: {raw[:80]!r}")
+                continue
+            op = record.get("op")
+            if op == "header":
+                if (record.get("generation") != self._generation
+                        or record.get("factor_version") != self.factor_version):
+                    # 与当前快照不匹配的旧日志（压缩后截断前崩溃残留），其内容已在快照中 → 以新日志头重建
+                    self._write_snapshot(self._dates, self._generation)
+                    return
+            elif op == "add":
+                self._dates.add(record["date"])
+                self._journal_records += 1
+        self._journal_offset += consumed
+
+    # ------------------------------------------------------------------ #
+    # 写入（调用方持有锁）
+    # ------------------------------------------------------------------ #
+
+    def _journal_header(self) -> dict:
+        """日志首行（header）；日志不存在 / 首行损坏时返回空 dict"""
+        try:
+            with open(self.journal_path, "rb") as f:
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return {}
+
+    def _sync_generation(self):
+        """
+        其他进程可能已压缩：日志头代数变化（只读首行，不解析快照）则整体重载，否则只读日志新增部分
+        """
+        header = self._journal_header()
+        if header and header.get("generation") != self._generation:
+            self._load()
+        else:
+            self._replay_journal()
+
+    def _write_snapshot(self, dates: Set[str], generation: int):
+        """写新快照并以新日志头截断日志"""
+        _fsync_write(self.file_path, json.dumps(
+            {"factor_version": self.factor_version,
+             "generation": generation,
+             "processed_dates": sorted(dates)},
+            ensure_ascii=False, indent=2,
+        ))
+        header = json.dumps({"op": "header", "factor_version": self.factor_version,
+                             "generation": generation}) + "\n"
+        _fsync_write(self.journal_path, header)
+        self._dates, self._generation = set(dates), generation
+        self._journal_offset  = len(header.encode("utf-8"))
+        self._journal_records = 0
+
+    def _append(self, records: List[dict]):
+        """追加记录并 fsync（调用前已 _sync_generation，日志中完整行均已读取）"""
+        if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0:
+            self._write_snapshot(self._dates, self._generation)
+        payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        with open(self.journal_path, "a+b") as f:
+            # 末尾残留半截记录（崩溃）时先换行隔开，避免与新记录拼成一行
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    payload = b"\n" + payload
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            self._journal_offset = f.tell()
+
+    # ------------------------------------------------------------------ #
+    # 对外接口
+    # ------------------------------------------------------------------ #
+
+    @property
+    def processed_dates(self) -> List[str]:
+        """已处理日期（升序）"""
+        return sorted(self._dates)
+
+    def is_processed(self, date: str) -> bool:
+        return date in self._dates
+
+    def refresh(self):
+        """读取其他进程追加的记录（多进程并发时，判断前可先调用）"""
+        with self._locked():
+            self._sync_generation()
+
+    def add(self, date: str):
+        """添加并立即持久化（写入成功后调用，保证幂等）：追加一行日志 + fsync"""
+        self.add_many([date])
+
+    def add_many(self, dates: List[str]):
+        """批量添加（一次加锁 + 一次 fsync）"""
+        with self._locked():
+            self._sync_generation()
+            new_dates = [d for d in dict.fromkeys(dates) if d not in self._dates]
+            if not new_dates:
+                return
+            self._append([{"op": "add", "date": d} for d in new_dates])
+            self._dates.update(new_dates)
+            self._journal_records += len(new_dates)
+            if self._journal_records >= self.compact_every:
+                self._write_snapshot(self._dates, self._generation + 1)
+
+    def compact(self):
+        """立即把日志压缩进快照"""
+        with self._locked():
+            self._sync_generation()
+            self._write_snapshot(self._dates, self._generation + 1)
+
+    def reset(self):
+        """清空已处理记录（如训练集 CSV 被删除，需重新生成时调用）"""
+        with self._locked():
+            self._sync_generation()
+            self._write_snapshot(set(), self._generation + 1)
+        logger.warning("已处理日期记录已重置，将重新生成全量数据")
+
+
+# ============================================================
+# 基准测试：python -m learnEngine.processed_dates
+# ============================================================
+
+def _benchmark(n_dates: int = 10_000):
+    """旧方案（list 成员判断 + 每日期重写整份 JSON）vs 追加日志，逐日期 add + 全量 is_processed"""
+    import datetime
+    import shutil
+
+    dates = [(datetime.date(1990, 1, 1) + datetime.timedelta(days=i)).isoformat() for i in range(n_dates)]
+    work_dir = tempfile.mkdtemp(prefix="processed_dates_bench_")
+    try:
+        # 旧方案
+        legacy_path, legacy = os.path.join(work_dir, "legacy.json"), []
+        t0 = time.perf_counter()
+        for d in dates:
+            if d not in legacy:
+                legacy.append(d)
+                with open(legacy_path, "w", encoding="utf-8") as f:
+                    json.dump({"factor_version": "bench", "processed_dates": sorted(legacy)}, f)
+        legacy_add = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        hits = sum(d in legacy for d in dates)
+        legacy_lookup = time.perf_counter() - t0
+
+        # 追加日志
+        manager = ProcessedDatesManager(os.path.join(work_dir, "journal.json"), "bench")
+        t0 = time.perf_counter()
+        for d in dates:
+            manager.add(d)
+        journal_add = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        hits_j = sum(manager.is_processed(d) for d in dates)
+        journal_lookup = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        reloaded = ProcessedDatesManager(os.path.join(work_dir, "journal.json"), "bench")
+        journal_load = time.perf_counter() - t0
+
+        assert hits == hits_j == len(reloaded.processed_dates) == n_dates
+        print(f"日期数: {n_dates}")
+        print(f"旧方案  add 合计: {legacy_add:8.3f}s | is_processed 合计: {legacy_lookup:8.4f}s")
+        print(f"追加日志 add 合计: {journal_add:8.3f}s | is_processed 合计: {journal_lookup:8.4f}s "
+              f"| 重新加载: {journal_load:.4f}s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    _benchmark()
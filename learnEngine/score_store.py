@@ -0,0 +1,185 @@
+"""
+模型打分存储 (ScoreStore)
+==========================
+回测逐日调用 SectorHeatStrategy.generate_signal，每次重跑都要重新走一遍
+Top3 板块 → 候选池 → FeatureDataBundle → 因子计算 → 模型预测；
+只改执行参数（buy_top_k / min_prob / 佣金等）时这些结果完全相同。
+
+本存储按 (模型哈希, 当前因子口径, trade_date, ts_code) 缓存候选股打分：
+
+    <root>/
+        model=<sha256 前 16 位>/factor=<FACTOR_VERSION>-<各因子版本哈希 8 位>/
+            trade_month=2026-03/scores-2026-03-02.parquet   ← ts_code + prob（一日一文件）
+
+    - 单日文件 Parquet 元数据记录日级信息：top3_sectors / adapt_score / status
+      （status=empty：Top3 或候选池为空，记录后不再重复计算）
+    - 打分与轮动分门槛等选股参数无关（批量任务不做轮动过快拦截），读取时再按策略参数筛选
+    - 因子口径取推理代码当前的 FACTOR_VERSION 与 FeatureEngine.feature_versions()（而非模型清单记录的训练版本）：
+      模型重训（sha256 变化）、全局口径变更或单个因子递增版本都会落到新目录，旧打分不会被误用；
+      清单记录的训练版本仅作为元数据写入单日文件（train_factor_version）
+    - 单日写入为整文件原子替换
+
+批量填充见 runner/score_store_runner.py；策略端 score_store_dir 下存在当日打分时直接读取。
+依赖 pyarrow（与分区训练集存储一致）。
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from learnEngine.dataset_store import PARTITION_KEY
+from learnEngine.model_artifact import ModelArtifact
+from utils.log_utils import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# 单日文件 Parquet 元数据中记录日级信息的键
+SCORE_META_KEY = b"score_meta"
+# 日级状态：ok = 有候选股打分；empty = Top3 / 候选池 / 特征为空（当日不买入）
+SCORE_OK    = "ok"
+SCORE_EMPTY = "empty"
+# 模型哈希截取长度
+_MODEL_HASH_LEN = 16
+# 各因子版本哈希截取长度
+_FEATURE_HASH_LEN = 8
+
+_SCORE_FILE_RE = re.compile(r"scores-(\d{4}-\d{2}-\d{2})\.parquet$")
+_UNSAFE_CHARS  = re.compile(r"[^0-9A-Za-z._-]")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("打分存储需要 pyarrow，请先 pip install pyarrow")
+
+
+def _normalize_date(date: str) -> str:
+    """YYYYMMDD / YYYY-MM-DD → YYYY-MM-DD"""
+    date = str(date)
+    return f"{date[:4]}-{date[4:6]}-{date[6:]}" if len(date) == 8 and date.isdigit() else date
+
+
+def _feature_versions_hash(feature_versions: Dict[str, str]) -> str:
+    """各因子版本 → 短哈希（与因子注册顺序无关）"""
+    payload = json.dumps(sorted(feature_versions.items()), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:_FEATURE_HASH_LEN]
+
+
+class ScoreStore:
+    """
+    :param root_dir:       存储根目录
+    :param model_hash:           模型标识（清单 sha256 前 16 位）
+    :param factor_version:       推理代码当前的 FACTOR_VERSION（learnEngine.dataset.FACTOR_VERSION）
+    :param feature_versions:     当前各因子版本（FeatureEngine.feature_versions()），哈希后并入目录名
+    :param train_factor_version: 模型清单记录的训练集 FACTOR_VERSION，仅写入元数据（不参与定位）
+    """
+
+    def __init__(self, root_dir: str, model_hash: str, factor_version: str,
+                 feature_versions: Optional[Dict[str, str]] = None,
+                 train_factor_version: Optional[str] = None):
+        self.root_dir             = root_dir
+        self.model_hash           = model_hash
+        self.factor_version       = factor_version
+        self.feature_hash         = _feature_versions_hash(feature_versions or {})
+        self.train_factor_version = train_factor_version
+        self.store_dir = os.path.join(
+            root_dir, f"model={model_hash}",
+            f"factor={_UNSAFE_CHARS.sub('_', factor_version)}-{self.feature_hash}",
+        )
+
+    @classmethod
+    def for_artifact(cls, root_dir: str, artifact: ModelArtifact, factor_version: str,
+                     feature_versions: Optional[Dict[str, str]] = None) -> "ScoreStore":
+        """以模型清单的 sha256 + 当前因子口径定位打分目录（清单的训练版本仅记入元数据）"""
+        manifest = artifact.manifest
+        return cls(
+            root_dir, str(manifest.get("sha256", ""))[:_MODEL_HASH_LEN], factor_version,
+            feature_versions, manifest.get("factor_version"),
+        )
+
+    def path(self, date: str) -> str:
+        date = _normalize_date(date)
+        return os.path.join(self.store_dir, f"{PARTITION_KEY}={date[:7]}", f"scores-{date}.parquet")
+
+    def has(self, date: str) -> bool:
+        return os.path.exists(self.path(date))
+
+    def list_dates(self, start_date: str = None, end_date: str = None) -> List[str]:
+        """已打分的交易日（YYYY-MM-DD，升序）"""
+        if not os.path.isdir(self.store_dir):
+            return []
+        start_date = _normalize_date(start_date) if start_date else None
+        end_date   = _normalize_date(end_date) if end_date else None
+        dates = []
+        for month_dir in os.listdir(self.store_dir):
+            for name in os.listdir(os.path.join(self.store_dir, month_dir)):
+                m = _SCORE_FILE_RE.match(name)
+                if not m:
+                    continue
+                d = m.group(1)
+                if (start_date and d < start_date) or (end_date and d > end_date):
+                    continue
+                dates.append(d)
+        return sorted(dates)
+
+    # ------------------------------------------------------------------ #
+    # 读写
+    # ------------------------------------------------------------------ #
+
+    def write_date(self, date: str, scores: pd.DataFrame, meta: dict) -> int:
+        """
+        写入单日打分（整文件原子替换）
+        :param scores: ts_code + prob（status=empty 时为空表）
+        :param meta:   日级信息 {status, top3_sectors, adapt_score}
+        :return: 写入行数
+        """
+        _require_pyarrow()
+        date = _normalize_date(date)
+        table = pa.table(
+            {
+                "ts_code": pa.array(scores["ts_code"].astype(str).tolist() if len(scores) else [], pa.string()),
+                "prob":    pa.array(scores["prob"].to_numpy(dtype=np.float32) if len(scores) else [], pa.float32()),
+            },
+            metadata={SCORE_META_KEY: json.dumps(
+                {"trade_date": date, "train_factor_version": self.train_factor_version, **meta},
+                ensure_ascii=False, default=str,
+            )},
+        )
+        path = self.path(date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        return table.num_rows
+
+    def read_date(self, date: str) -> Optional[Tuple[pd.DataFrame, dict]]:
+        """
+        :return: (ts_code + prob, 日级信息)；未打分返回 None
+        """
+        path = self.path(date)
+        if not os.path.exists(path):
+            return None
+        _require_pyarrow()
+        table = pq.read_table(path)
+        meta = json.loads((table.schema.metadata or {}).get(SCORE_META_KEY, b"{}"))
+        return table.to_pandas(), meta
+
+    def load(self, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+        """区间内全部打分（trade_date + ts_code + prob + adapt_score），供离线分析"""
+        frames = []
+        for date in self.list_dates(start_date, end_date):
+            scores, meta = self.read_date(date)
+            if not scores.empty:
+                frames.append(scores.assign(trade_date=date, adapt_score=meta.get("adapt_score")))
+        if not frames:
+            return pd.DataFrame(columns=["trade_date", "ts_code", "prob", "adapt_score"])
+        df = pd.concat(frames, ignore_index=True)
+        logger.info(f"[ScoreStore] 读取打分 | 日期: {df['trade_date'].nunique()} | 行数: {len(df)} | {self.store_dir}")
+        return df[["trade_date", "ts_code", "prob", "adapt_score"]]
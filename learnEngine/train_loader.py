@@ -0,0 +1,292 @@
+"""
+低内存训练集加载器 (TrainingDataLoader)
+========================================
+原方式：全部列按 float64 / object 读入 → fnmatch 过滤特征列 → 全表 fillna / replace
+        → XGBClassifier.fit 内部再构建一份 DMatrix，峰值内存约为最终特征矩阵的数倍
+现方式：
+    1. 先按 schema（分区存储）或表头 + 少量样本（CSV）解析出特征列，只读取
+       主键 + 目标标签 + 特征列，被排除的列不解码
+    2. 按块流式读取（分区存储按交易日分块，CSV 按行数分块），块内完成
+       去标签缺失 / 去重 / NaN·inf 填 0，特征列降为 float32，类别型 K 线结构列降为 int8
+    3. 第一遍只读 trade_date / 主键 / 标签确定时间切分点（与 time_series_split 口径一致：
+       按交易日排序后取前 1 - val_ratio 行为训练集）
+    4. 训练集经 xgboost.DataIter 直接从块流构建 QuantileDMatrix（分箱后每个值 1 字节，
+       不保留原始浮点矩阵）；验证集（尾部 val_ratio）物化为紧凑 DataFrame 供评估
+
+峰值内存 ≈ 分箱后的训练矩阵 + 验证集 float32 矩阵 + 单块数据
+"""
+import os
+from fnmatch import fnmatch
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from learnEngine.dataset_store import PartitionedDatasetStore
+from utils.log_utils import logger
+
+# CSV 分块行数（分区存储按交易日分块，见 STORE_DATES_PER_CHUNK）
+CSV_CHUNK_ROWS = 50000
+# 分区存储每块交易日数（每日约数百行候选股）
+STORE_DATES_PER_CHUNK = 20
+# CSV 推断列类型的样本行数
+_CSV_SAMPLE_ROWS = 1000
+
+_KEY_COLS = ["stock_code", "trade_date"]
+
+
+class TrainingDataLoader:
+    """
+    按块读取训练集，产出降精度后的特征块
+
+    :param path:            分区存储目录或训练集 CSV 路径
+    :param target_label:    目标标签列
+    :param is_feature_col:  列名 → 是否为训练特征（train.py 的 EXCLUDE_COLS / EXCLUDE_PATTERNS）
+    :param int8_patterns:   按 int8 存放的类别型特征列（fnmatch 通配符）
+    :param start_date / end_date: 训练日期区间（含，None 不限）
+    """
+
+    def __init__(self, path: str, target_label: str, is_feature_col: Callable[[str], bool],
+                 int8_patterns: List[str] = (), start_date: str = None, end_date: str = None):
+        self.path         = path
+        self.target_label = target_label
+        self.start_date   = start_date
+        self.end_date     = end_date
+        self.store: Optional[PartitionedDatasetStore] = None
+
+        if os.path.isdir(path):
+            self.store = PartitionedDatasetStore(path)
+            if not self.store.exists():
+                raise FileNotFoundError(f"训练集存储不存在: {path}\n请先运行 python learnEngine/dataset.py 生成训练集")
+            source_dtypes = self.store.dtypes
+        else:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"训练集文件不存在: {path}\n请先运行 python learnEngine/dataset.py 生成训练集")
+            sample = pd.read_csv(path, nrows=_CSV_SAMPLE_ROWS)
+            source_dtypes = {
+                c: "float64" if pd.api.types.is_numeric_dtype(sample[c]) else "string" for c in sample.columns
+            }
+
+        if target_label not in source_dtypes:
+            raise ValueError(f"目标标签列 '{target_label}' 不存在于训练集中，可用列: {list(source_dtypes)}")
+
+        # ---- 先解析特征列，只读取所需列 ----
+        self.feature_cols: List[str] = [
+            c for c, t in source_dtypes.items() if t != "string" and is_feature_col(c)
+        ]
+        self.feature_dtypes: Dict[str, str] = {
+            c: "int8" if any(fnmatch(c, pat) for pat in int8_patterns) else "float32"
+            for c in self.feature_cols
+        }
+        self.read_cols = _KEY_COLS + [target_label] + self.feature_cols
+        self.n_source_cols = len(source_dtypes)
+
+        self.split_date: Optional[str] = None
+        self.split_date_train_rows = 0
+        self.n_train = 0
+        self.n_val   = 0
+        # 训练 / 验证日期区间（plan_split 后可用，写入模型清单）
+        self.date_range: Dict[str, Optional[str]] = {}
+
+    # ------------------------------------------------------------------ #
+    # 分块读取
+    # ------------------------------------------------------------------ #
+
+    def _iter_raw(self, columns: List[str]):
+        if self.store is not None:
+            yield from self.store.iter_load(columns, self.start_date, self.end_date, STORE_DATES_PER_CHUNK)
+            return
+        dtype = {c: np.float32 for c in columns if c in self.feature_dtypes}
+        for chunk in pd.read_csv(self.path, usecols=columns, dtype=dtype, chunksize=CSV_CHUNK_ROWS):
+            chunk["trade_date"] = chunk["trade_date"].astype(str)
+            if self.start_date:
+                chunk = chunk[chunk["trade_date"] >= self.start_date]
+            if self.end_date:
+                chunk = chunk[chunk["trade_date"] <= self.end_date]
+            yield chunk
+
+    def _iter_clean(self, columns: List[str]):
+        """去标签缺失 + 主键去重（跨块：分区存储一日一文件天然不跨块，CSV 以主键哈希跨块去重）"""
+        seen = set() if self.store is None else None
+        for chunk in self._iter_raw(columns):
+            chunk = chunk.dropna(subset=[self.target_label])
+            chunk = chunk.drop_duplicates(subset=_KEY_COLS)
+            if seen is not None and not chunk.empty:
+                keys = pd.util.hash_pandas_object(chunk[_KEY_COLS], index=False).to_numpy()
+                fresh = np.fromiter((k not in seen for k in keys), dtype=bool, count=len(keys))
+                seen.update(keys[fresh].tolist())
+                chunk = chunk[fresh]
+            if not chunk.empty:
+                yield chunk
+
+    def _to_features(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """块内 NaN / inf 填 0（与 DataSetAssembler 一致）并降精度"""
+        X = {}
+        for col in self.feature_cols:
+            values = chunk[col].to_numpy(dtype=np.float32, copy=True)
+            values[~np.isfinite(values)] = 0
+            X[col] = values.astype(self.feature_dtypes[col], copy=False)
+        return pd.DataFrame(X, index=pd.RangeIndex(len(chunk)))
+
+    def iter_chunks(self, part: str = "all"):
+        """
+        产出 (X 块, y 块, 主键块)
+        :param part: all / train / val（train / val 需先调用 plan_split）
+        """
+        if part != "all" and self.split_date is None:
+            raise RuntimeError("iter_chunks(train/val) 前需先调用 plan_split()")
+
+        split_taken = 0
+        for chunk in self._iter_clean(self.read_cols):
+            if part != "all":
+                dates = chunk["trade_date"].to_numpy()
+                is_train = dates < self.split_date
+                # 切分日当日：按块流顺序前 split_date_train_rows 行归训练集
+                on_split = np.flatnonzero(dates == self.split_date)
+                take = on_split[:max(0, self.split_date_train_rows - split_taken)]
+                split_taken += len(take)
+                is_train[take] = True
+                chunk = chunk[is_train if part == "train" else ~is_train]
+                if chunk.empty:
+                    continue
+            chunk = chunk.reset_index(drop=True)
+            y = chunk[self.target_label].to_numpy().astype(np.int8)
+            yield self._to_features(chunk), y, chunk[_KEY_COLS]
+
+    # ------------------------------------------------------------------ #
+    # 时间切分 / 物化
+    # ------------------------------------------------------------------ #
+
+    def date_counts(self) -> Dict[str, int]:
+        """只读 主键 + 标签，统计各交易日有效行数 {trade_date: 行数}"""
+        date_counts: Dict[str, int] = {}
+        for chunk in self._iter_clean(_KEY_COLS + [self.target_label]):
+            for date, n in chunk["trade_date"].value_counts().items():
+                date_counts[date] = date_counts.get(date, 0) + int(n)
+        return date_counts
+
+    def plan_split_at(self, val_start: str, date_counts: Optional[Dict[str, int]] = None) -> int:
+        """
+        按日期切分：val_start（含）之后的交易日为验证集（增量更新以最近若干交易日作留出集）
+        :return: 有效行数
+        """
+        date_counts = date_counts if date_counts is not None else self.date_counts()
+        dates = sorted(date_counts)
+        train_dates = [d for d in dates if d < val_start]
+        val_dates   = [d for d in dates if d >= val_start]
+        self.split_date, self.split_date_train_rows = val_start, 0
+        self.n_train = sum(date_counts[d] for d in train_dates)
+        self.n_val   = sum(date_counts[d] for d in val_dates)
+        self.date_range = {
+            "train_start": train_dates[0] if train_dates else None,
+            "train_end":   train_dates[-1] if train_dates else None,
+            "val_start":   val_dates[0] if val_dates else None,
+            "val_end":     val_dates[-1] if val_dates else None,
+        }
+        logger.info(
+            f"[TrainLoader] 按日期切分 | 训练集: {self.n_train} 行（{len(train_dates)} 日）"
+            f" | 验证集: {self.n_val} 行（{len(val_dates)} 日，自 {val_start}）"
+        )
+        return self.n_train + self.n_val
+
+    def plan_split(self, val_ratio: float) -> int:
+        """
+        第一遍只读 主键 + 标签，确定训练 / 验证切分点
+        :return: 有效行数
+        """
+        date_counts = self.date_counts()
+        total = sum(date_counts.values())
+        split_point = int(total * (1 - val_ratio))
+        self.n_train, self.n_val = split_point, total - split_point
+        self.split_date, self.split_date_train_rows = "", 0
+
+        cum = 0
+        dates = sorted(date_counts)
+        for i, date in enumerate(dates):
+            if cum + date_counts[date] > split_point:
+                self.split_date, self.split_date_train_rows = date, split_point - cum
+                train_end = date if self.split_date_train_rows > 0 else (dates[i - 1] if i > 0 else None)
+                self.date_range = {"train_start": dates[0] if split_point > 0 else None, "train_end": train_end,
+                                   "val_start": date, "val_end": dates[-1]}
+                break
+            cum += date_counts[date]
+        else:
+            self.split_date = "9999-12-31"   # 无验证集
+            self.date_range = {"train_start": dates[0] if dates else None, "train_end": dates[-1] if dates else None,
+                               "val_start": None, "val_end": None}
+
+        logger.info(
+            f"[TrainLoader] 时间切分 | 有效行数: {total} | 训练集: {self.n_train} 行 | 验证集: {self.n_val} 行"
+            f" | 切分日: {self.split_date}（当日前 {self.split_date_train_rows} 行归训练集）"
+        )
+        return total
+
+    def materialize(self, part: str = "all"):
+        """
+        物化为紧凑 DataFrame（各列按 feature_dtypes 存放，块拼接前不保留原始浮点数据）
+        :return: (X, y, keys)
+        """
+        X_parts, y_parts, key_parts = [], [], []
+        for X, y, keys in self.iter_chunks(part):
+            X_parts.append(X)
+            y_parts.append(y)
+            key_parts.append(keys)
+        if not X_parts:
+            empty = pd.DataFrame({c: pd.Series(dtype=t) for c, t in self.feature_dtypes.items()})
+            return empty, np.array([], dtype=np.int8), pd.DataFrame(columns=_KEY_COLS)
+        X = pd.concat(X_parts, ignore_index=True)
+        y = np.concatenate(y_parts)
+        keys = pd.concat(key_parts, ignore_index=True)
+        logger.info(
+            f"[TrainLoader] 物化 {part} | 行数: {len(X)} | 特征列数: {len(self.feature_cols)}"
+            f"/{self.n_source_cols} | 内存: {X.memory_usage(deep=False).sum() / 1024 / 1024:.1f}MB"
+        )
+        return X, y, keys
+
+    def dataset_versions(self) -> dict:
+        """
+        训练集口径版本（写入模型清单，推断端据此校验因子口径）
+        :return: {factor_version, feature_versions}；CSV 训练集无版本信息时为空
+        """
+        if self.store is None or not self.store.partition_files():
+            return {}
+        files = self.store.partition_files(self.start_date, self.end_date) or self.store.partition_files()
+        versions = self.store.read_feature_versions(files[-1])
+        # 有因子 → 列登记时只保留产出训练特征列的因子（其余因子版本变化不影响本模型）
+        owned = self.store.schema.get("feature_columns") or {}
+        used = set(self.feature_cols)
+        versions = {n: v for n, v in versions.items() if n not in owned or used.intersection(owned[n])}
+        return {"factor_version": self.store.schema.get("factor_version"), "feature_versions": versions}
+
+    def data_iter(self, part: str = "train") -> "ChunkDataIter":
+        """供 xgboost.QuantileDMatrix 直接从块流构建训练矩阵"""
+        return ChunkDataIter(self, part)
+
+
+class ChunkDataIter(xgb.DataIter):
+    """xgboost 外部数据迭代器：每次 next 喂入一块特征（QuantileDMatrix 构建时会完整迭代两遍）"""
+
+    def __init__(self, loader: TrainingDataLoader, part: str = "train"):
+        self.loader = loader
+        self.part   = part
+        self._it    = None
+        self.n_rows = 0
+        self.n_pos  = 0
+        super().__init__()
+
+    def next(self, input_data: Callable) -> bool:
+        if self._it is None:
+            self._it = self.loader.iter_chunks(self.part)
+            self.n_rows, self.n_pos = 0, 0
+        batch = next(self._it, None)
+        if batch is None:
+            return False
+        X, y, _ = batch
+        self.n_rows += len(y)
+        self.n_pos  += int(y.sum())
+        input_data(data=X, label=y)
+        return True
+
+    def reset(self):
+        self._it = None
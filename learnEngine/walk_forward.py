@@ -0,0 +1,233 @@
+"""
+滚动前推验证引擎 (WalkForwardEngine)
+====================================
+train.time_series_split 只切一次尾部验证集、模型只拟合一次，单一切分点的 AUC 波动大，
+无法判断因子组合在不同行情阶段是否稳定。本引擎按交易日把样本切成多折：
+
+    expanding : 训练窗口从样本起点扩展到验证窗口之前
+    rolling   : 训练窗口为验证窗口之前固定 train_days 个交易日
+
+    ┌──────────── train ────────────┐gap┌─ val k ─┐
+    样本按 trade_date 排序，验证窗口为尾部连续的 n_folds × val_days 个交易日，逐折后移
+
+加速手段：
+    1. 分箱一次：用全样本构建一次 QuantileDMatrix 取分位切点（get_quantile_cut），
+       把特征矩阵映射为 uint8 分箱码并按日期排序写入临时 .npy（每值 1 字节）
+       各折直接以分箱码训练：每列取值 ≤ max_bin，XGBoost 在折内不再做分位草图近似，
+       切分与全局分箱完全一致，且不必逐折重建分位草图
+       （切点只使用特征分布、不含标签信息）
+    2. 各折训练 / 验证在排序后的分箱码上都是连续区间，子进程 np.load(mmap_mode="r") 零拷贝切片
+    3. 折级并行：spawn 进程池（XGBoost 的 OpenMP 线程池在 fork 后不安全），
+       CPU 线程按 fold_workers × n_jobs ≈ cpu_count 分配
+
+各折以 SectorHeatXGBModel.train(save=False) 训练，指标来自调用方传入的 evaluate_fn
+（train.evaluate_model，需为可 pickle 的模块级函数），汇总为逐折明细 + 均值 / 标准差。
+"""
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from learnEngine.model import SectorHeatXGBModel
+from utils.log_utils import logger
+
+# XGBoost 默认分箱数（hist），分箱码用 uint8 存放
+MAX_BIN = 256
+# 单折最少训练行数（不足时跳过该折）
+MIN_FOLD_TRAIN_ROWS = 50
+# 汇总均值 / 标准差的指标
+_METRIC_KEYS = ["accuracy", "auc", "precision", "recall"]
+
+
+def build_bin_codes(X: pd.DataFrame, max_bin: int = MAX_BIN) -> np.ndarray:
+    """全样本分位切点 → uint8 分箱码矩阵（与 XGBoost hist 的 upper_bound 分箱口径一致）"""
+    ref = xgb.QuantileDMatrix(X, max_bin=max_bin)
+    indptr, cuts = ref.get_quantile_cut()
+    del ref
+    codes = np.empty(X.shape, dtype=np.uint8)
+    for j, col in enumerate(X.columns):
+        # 每列首个切点为最小值哨兵，其后为各箱上界
+        col_cuts = cuts[int(indptr[j]) + 1: int(indptr[j + 1])]
+        values = X[col].to_numpy(dtype=np.float32)
+        if len(col_cuts) == 0:
+            codes[:, j] = 0
+            continue
+        codes[:, j] = np.minimum(np.searchsorted(col_cuts, values, side="right"), len(col_cuts) - 1)
+    return codes
+
+
+def _run_fold(task: dict) -> dict:
+    """子进程：在分箱码的连续区间上训练单折并评估"""
+    codes = np.load(task["codes_path"], mmap_mode="r")
+    y     = np.load(task["y_path"], mmap_mode="r")
+    cols  = task["feature_cols"]
+
+    tr0, tr1 = task["train_range"]
+    va0, va1 = task["val_range"]
+    X_train = pd.DataFrame(np.asarray(codes[tr0:tr1]), columns=cols)
+    X_val   = pd.DataFrame(np.asarray(codes[va0:va1]), columns=cols)
+    y_train, y_val = np.asarray(y[tr0:tr1]), np.asarray(y[va0:va1])
+
+    model = SectorHeatXGBModel(model_save_path="")
+    model.train(X_train, X_val, y_train, y_val, cols, save=False, n_jobs=task["n_jobs"])
+    metrics = task["evaluate_fn"](model.model, X_val, y_val, cols)
+    best_iteration = getattr(model.model, "best_iteration", None)
+    return {
+        "fold": task["fold"],
+        **task["meta"],
+        "best_iteration": None if best_iteration is None else int(best_iteration),
+        "train_pos_rate": round(float(y_train.mean()), 4),
+        "val_pos_rate":   round(float(y_val.mean()), 4) if len(y_val) else 0.0,
+        **{k: float(metrics[k]) for k in _METRIC_KEYS if k in metrics},
+    }
+
+
+class WalkForwardEngine:
+    """
+    滚动前推验证：plan_folds → run → summary
+
+    :param n_folds:      折数（验证窗口数）
+    :param val_days:     每折验证窗口交易日数
+    :param mode:         expanding / rolling
+    :param train_days:   rolling 模式的训练窗口交易日数
+    :param gap_days:     训练窗口末尾与验证窗口之间空出的交易日数（标签持有期 > 1 日时防泄漏）
+    :param fold_workers: 并行折数，None = 按 CPU 自动（每折至少 2 线程）
+    """
+
+    def __init__(self, n_folds: int = 5, val_days: int = 40, mode: str = "expanding",
+                 train_days: int = 250, gap_days: int = 0, fold_workers: Optional[int] = None):
+        if mode not in ("expanding", "rolling"):
+            raise ValueError(f"不支持的滚动模式: {mode}（expanding / rolling）")
+        self.n_folds      = n_folds
+        self.val_days     = val_days
+        self.mode         = mode
+        self.train_days   = train_days
+        self.gap_days     = gap_days
+        self.fold_workers = fold_workers
+        self.folds: List[dict] = []
+        self.results = pd.DataFrame()
+
+    # ------------------------------------------------------------------ #
+    # 切分
+    # ------------------------------------------------------------------ #
+
+    def plan_folds(self, sorted_dates: np.ndarray) -> List[dict]:
+        """
+        在已按日期排序的 trade_date 数组上规划各折的行区间
+        :return: [{fold, train_range, val_range, meta}]，区间为 [start, end) 行号
+        """
+        unique_dates, first_row = np.unique(sorted_dates, return_index=True)
+        bounds = np.append(first_row, len(sorted_dates))
+        n_dates = len(unique_dates)
+
+        folds = []
+        val_start0 = n_dates - self.n_folds * self.val_days
+        for k in range(self.n_folds):
+            v0 = val_start0 + k * self.val_days
+            v1 = v0 + self.val_days
+            t1 = v0 - self.gap_days
+            t0 = 0 if self.mode == "expanding" else max(0, t1 - self.train_days)
+            if v0 < 0 or t1 <= t0:
+                logger.warning(f"[WalkForward] 第 {k + 1} 折训练窗口为空（交易日不足），跳过")
+                continue
+            train_range = (int(bounds[t0]), int(bounds[t1]))
+            if train_range[1] - train_range[0] < MIN_FOLD_TRAIN_ROWS:
+                logger.warning(f"[WalkForward] 第 {k + 1} 折训练样本不足 {MIN_FOLD_TRAIN_ROWS} 行，跳过")
+                continue
+            folds.append({
+                "fold":        k + 1,
+                "train_range": train_range,
+                "val_range":   (int(bounds[v0]), int(bounds[v1])),
+                "meta": {
+                    "train_start": str(unique_dates[t0]), "train_end": str(unique_dates[t1 - 1]),
+                    "val_start":   str(unique_dates[v0]), "val_end":   str(unique_dates[v1 - 1]),
+                    "n_train":     int(bounds[t1] - bounds[t0]),
+                    "n_val":       int(bounds[v1] - bounds[v0]),
+                },
+            })
+        self.folds = folds
+        return folds
+
+    def _resolve_workers(self) -> tuple:
+        """(并行折数, 每折 XGBoost 线程数)，两者乘积 ≈ CPU 核数"""
+        cpus = os.cpu_count() or 1
+        workers = self.fold_workers or max(1, cpus // 2)
+        workers = max(1, min(workers, len(self.folds), cpus))
+        return workers, max(1, cpus // workers)
+
+    # ------------------------------------------------------------------ #
+    # 执行
+    # ------------------------------------------------------------------ #
+
+    def run(self, X: pd.DataFrame, y: np.ndarray, trade_dates, evaluate_fn: Callable) -> pd.DataFrame:
+        """
+        :param X:           特征矩阵（load_and_prepare 的 X）
+        :param y:           标签
+        :param trade_dates: 与 X 行对齐的 trade_date
+        :param evaluate_fn: (model, X_val, y_val, feature_cols) → {accuracy, auc, precision, recall}
+        :return: 逐折结果 DataFrame
+        """
+        order = np.argsort(np.asarray(trade_dates).astype(str), kind="stable")
+        sorted_dates = np.asarray(trade_dates).astype(str)[order]
+        if not self.plan_folds(sorted_dates):
+            logger.error("[WalkForward] 无可用折，检查 n_folds / val_days / train_days 与样本交易日数")
+            return pd.DataFrame()
+
+        feature_cols = list(X.columns)
+        workers, n_jobs = self._resolve_workers()
+        logger.info(
+            f"[WalkForward] {self.mode} | 折数: {len(self.folds)} | 验证窗口: {self.val_days} 日"
+            f" | 并行折数: {workers} × XGBoost 线程: {n_jobs}"
+        )
+
+        tmp_dir = tempfile.mkdtemp(prefix="walk_forward_")
+        try:
+            # ---- 分箱一次，按日期排序落盘，各折共享 ----
+            codes_path = os.path.join(tmp_dir, "codes.npy")
+            y_path     = os.path.join(tmp_dir, "y.npy")
+            np.save(codes_path, build_bin_codes(X)[order])
+            np.save(y_path, np.asarray(y)[order])
+
+            tasks = [
+                {**fold, "codes_path": codes_path, "y_path": y_path, "feature_cols": feature_cols,
+                 "n_jobs": n_jobs, "evaluate_fn": evaluate_fn}
+                for fold in self.folds
+            ]
+            if workers == 1:
+                rows = [_run_fold(task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+                    rows = list(pool.map(_run_fold, tasks))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.results = pd.DataFrame(rows).sort_values("fold").reset_index(drop=True)
+        return self.results
+
+    # ------------------------------------------------------------------ #
+    # 汇总
+    # ------------------------------------------------------------------ #
+
+    def summary(self) -> pd.DataFrame:
+        """各指标跨折均值 / 标准差 / 最小值"""
+        if self.results.empty:
+            return pd.DataFrame()
+        keys = [k for k in _METRIC_KEYS if k in self.results.columns]
+        return self.results[keys].agg(["mean", "std", "min"]).T.round(4)
+
+    def log_summary(self):
+        for row in self.results.to_dict(orient="records"):
+            logger.info(
+                f"[WalkForward] 第 {row['fold']} 折 | 训练 {row['train_start']}~{row['train_end']}（{row['n_train']} 行）"
+                f" | 验证 {row['val_start']}~{row['val_end']}（{row['n_val']} 行）"
+                f" | AUC:{row.get('auc', float('nan')):.4f} 精确率:{row.get('precision', float('nan')):.4f}"
+                f" | 轮数:{row['best_iteration']}"
+            )
+        for metric, row in self.summary().iterrows():
+            logger.info(f"[WalkForward] {metric:10s} | 均值:{row['mean']:.4f} 标准差:{row['std']:.4f} 最小:{row['min']:.4f}")
@@ -0,0 +1,107 @@
+"""
+模型打分存储 — 批量填充 (独立运行脚本)
+=========================================
+功能：
+  对回测日期区间逐日执行 SectorHeatStrategy.score_date（Top3 板块 → 候选池 → 因子 → 模型打分），
+  结果写入 learnEngine/score_store.ScoreStore（按 模型哈希 / 当前因子口径 / 交易日 分文件）。
+  之后回测命中打分存储时只执行选股（轮动分拦截 + min_prob + buy_top_k），
+  只改执行参数（buy_top_k / min_prob / 佣金等）的重跑从逐日因子计算降为逐日读一个小文件。
+
+运行方式：
+  python runner/score_store_runner.py --start 2026-03-02 --end 2026-03-12
+  python runner/score_store_runner.py --start 2026-03-02 --end 2026-03-12 --workers 4
+  python runner/score_store_runner.py --start 2026-03-02 --end 2026-03-12 --force   # 覆盖已有打分
+
+说明：
+  - 多个交易日并发计算（线程共享策略的 FeatureEngine / DB 连接池 / 分钟线 API 信号量，与 dataset.py 一致）
+  - 已打分日期默认跳过；异常日期（含候选池 / ST 名单查询失败）不写入，下次运行自动重算
+  - 模型重训后打分落到新的 model=<哈希> 目录，旧打分不会被误用
+
+依赖前置：
+  已运行 python train.py 生成 sector_heat_xgb_model.ubj（+ .manifest.json）
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.common_tools import get_trade_dates, get_daily_kline_data
+from utils.log_utils import logger
+
+# 默认并发日期数（分钟线 API 有全局信号量，过大无收益）
+DEFAULT_WORKERS = 2
+
+
+def fill_score_store(start_date: str, end_date: str, workers: int = DEFAULT_WORKERS,
+                     force: bool = False) -> dict:
+    """
+    批量填充区间内各交易日的模型打分
+    :return: {ok, empty, failed, skipped} 日期数
+    """
+    from learnEngine.score_store import SCORE_EMPTY
+    from strategies.sector_heat_strategy import SectorHeatStrategy
+
+    strategy = SectorHeatStrategy()
+    store = strategy.get_score_store()
+    if store is None:
+        raise RuntimeError("模型未就绪（请先运行 python train.py）或策略未配置 score_store_dir")
+
+    trade_dates = get_trade_dates(start_date, end_date)
+    todo  = [d for d in trade_dates if force or not store.has(d)]
+    stats = {"ok": 0, "empty": 0, "failed": 0, "skipped": len(trade_dates) - len(todo)}
+    logger.info(
+        f"[ScoreStore] 批量打分 {start_date} ~ {end_date} | 交易日: {len(trade_dates)} "
+        f"| 待计算: {len(todo)} | 并发: {workers} | 目录: {store.store_dir}"
+    )
+
+    def _score_one(date: str):
+        daily_df = get_daily_kline_data(date)
+        if daily_df.empty:
+            logger.warning(f"[ScoreStore] {date} 无日线数据，跳过")
+            return None
+        # 不做轮动分拦截：打分与选股参数无关，拦截在读取时按策略参数执行
+        return strategy.score_date(date, daily_df, max_adapt_score=None)
+
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(_score_one, d): d for d in todo}
+        for future in as_completed(futures):
+            date = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"[ScoreStore] {date} 打分失败: {e}", exc_info=True)
+                result = None
+            if result is None:
+                stats["failed"] += 1
+                continue
+            scores, meta = result
+            n = store.write_date(date, scores, meta)
+            stats["empty" if meta["status"] == SCORE_EMPTY else "ok"] += 1
+            logger.info(f"[ScoreStore] {date} 已写入 | 状态: {meta['status']} | 候选: {n}")
+
+    logger.info(
+        f"[ScoreStore] 完成 | 有打分: {stats['ok']} | 空日: {stats['empty']} | 失败: {stats['failed']} "
+        f"| 跳过(已有): {stats['skipped']} | 耗时: {time.time() - t0:.1f}s"
+    )
+    return stats
+
+
+# ============================================================
+# CLI 入口
+# ============================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="板块热度策略模型打分批量填充（供回测复用）")
+    parser.add_argument("--start", type=str, required=True, help="开始日期，格式 YYYY-MM-DD")
+    parser.add_argument("--end", type=str, required=True, help="结束日期，格式 YYYY-MM-DD")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="并发交易日数")
+    parser.add_argument("--force", action="store_true", help="覆盖已有打分（默认跳过）")
+    args = parser.parse_args()
+
+    result = fill_score_store(args.start, args.end, args.workers, args.force)
+    sys.exit(0 if result["failed"] == 0 else 1)
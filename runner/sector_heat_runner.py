@@ -25,7 +25,7 @@
 
 依赖前置：
   1. 已运行 python learnEngine/dataset.py 生成训练集
-  2. 已运行 python train.py 训练并保存模型到 sector_heat_xgb_model.pkl
+  2. 已运行 python train.py 训练并保存模型到 sector_heat_xgb_model.ubj（+ .manifest.json 清单）
 """
 
 import argparse
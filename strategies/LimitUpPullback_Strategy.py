@@ -2,7 +2,7 @@ import pandas as pd
 from typing import List, Dict, Tuple
 from strategies.base_strategy import BaseStrategy
 from utils.log_utils import logger
-from utils.common_tools import get_trade_dates, filter_st_stocks
+from utils.common_tools import get_trade_dates, filter_st_stocks, attach_limit_prices
 
 
 class LimitUpPullback_Strategy(BaseStrategy):
@@ -87,9 +87,9 @@ class LimitUpPullback_Strategy(BaseStrategy):
         # ========== 步骤4：更新涨停历史&价格缓存 ==========
         # 计算当日涨跌幅，判断涨停
         valid_df["pct_change"] = (valid_df["close"] / valid_df["pre_close"]) - 1
+        valid_df = attach_limit_prices(valid_df)   # 涨停价整列取入库值 / 向量化补算
         for _, row in valid_df.iterrows():
             ts_code = row["ts_code"]
-            pre_close = row["pre_close"]
             close_price = row["close"]
 
             # 初始化缓存
@@ -103,8 +103,8 @@ class LimitUpPullback_Strategy(BaseStrategy):
             if len(self.price_cache[ts_code]) > self.support_ma + 5:
                 self.price_cache[ts_code] = self.price_cache[ts_code][-(self.support_ma + 5):]
 
-            # 判断有效涨停（复用基类涨停价计算）
-            limit_up_price = self.calc_limit_up_price(ts_code, pre_close)
+            # 判断有效涨停
+            limit_up_price = row["limit_up"]
             is_valid_limit_up = (close_price >= limit_up_price - 0.001) and (row["open"] < limit_up_price - 0.001)
             if is_valid_limit_up:
                 self.limit_up_history[ts_code].append({
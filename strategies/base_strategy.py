@@ -63,23 +63,25 @@ class BaseStrategy(ABC):
         """
         pass
 
-    def calc_limit_up_price(self, ts_code: str, pre_close: float) -> float:
+    def calc_limit_up_price(self, ts_code: str, pre_close: float, is_st: bool = False) -> float:
         """
         计算股票涨停价（适配不同板块涨跌幅限制，融合调试日志+强类型+完整校验）
         :param ts_code: 股票代码（如600000.SH/300001.SZ/831010.BJ）
         :param pre_close: 前一日收盘价
+        :param is_st: 是否 ST（主板 ST 按 ST 比例）
         :return: 涨停价格（保留2位小数，无效值返回0.0）
         """
-        return calc_limit_up_price(ts_code, pre_close)
+        return calc_limit_up_price(ts_code, pre_close, is_st)
 
-    def calc_limit_down_price(self, ts_code: str, pre_close: float) -> float:
+    def calc_limit_down_price(self, ts_code: str, pre_close: float, is_st: bool = False) -> float:
         """
         计算股票跌停价（和涨停价逻辑完全对齐，适配不同板块涨跌幅限制）
         :param ts_code: 股票代码
         :param pre_close: 前一日收盘价
+        :param is_st: 是否 ST（主板 ST 按 ST 比例）
         :return: 跌停价格（保留2位小数，无效值返回0）
         """
-        return calc_limit_down_price(ts_code, pre_close)
+        return calc_limit_down_price(ts_code, pre_close, is_st)
 
     # ========== 可选扩展方法（子类按需重写） ==========
     def get_strategy_info(self) -> Dict[str, any]:
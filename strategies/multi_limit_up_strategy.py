@@ -15,6 +15,7 @@ from config.config  import (
 
 from data.data_cleaner import data_cleaner
 from strategies.base_strategy import BaseStrategy
+from utils.common_tools import get_row_limit_prices, get_st_stock_codes
 from utils.log_utils import logger
 
 # 分钟线缓存开关（全局配置）
@@ -315,6 +316,8 @@ class MultiLimitUpStrategy(BaseStrategy):
         :return: (buy_stocks, sell_signal_map)
         """
         sell_signal_map = {}
+        # 持仓 ST 状态（入库涨停价缺失时补算用，仅有持仓时查询）
+        st_codes = set(get_st_stock_codes(trade_date)) if positions else set()
 
         # 遍历当前持仓，生成卖出信号
         for ts_code, pos in positions.items():
@@ -326,8 +329,8 @@ class MultiLimitUpStrategy(BaseStrategy):
                 continue
             row = row.iloc[0]  # 转为Series，方便取值
 
-            # 计算涨停价，判断是否涨停
-            limit_price = self.calc_limit_up_price(ts_code, row["pre_close"])
+            # 涨停价（优先取 kline_day 入库列），判断是否涨停
+            limit_price, _ = get_row_limit_prices(ts_code, row, row["pre_close"], ts_code in st_codes)
             is_limit = row["close"] >= limit_price * self.limit_up_price_tolerance
             """
             hold_days业务逻辑（确保回测引擎正确接收信号）：
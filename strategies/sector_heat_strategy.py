@@ -13,30 +13,21 @@
 过滤逻辑与 dataset.py 完全对齐，保证训练/推断口径一致。
 """
 import os
-import pickle
 from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
-from config.config import FILTER_BSE_STOCK, FILTER_STAR_BOARD, FILTER_688_BOARD
 from data.data_cleaner import data_cleaner
-from features import FeatureEngine, FeatureDataBundle
+from features import FeatureEngine, FeatureDataBundle, CandidatePoolEngine
 from features.sector.sector_heat_feature import SectorHeatFeature
+from learnEngine.dataset import FACTOR_VERSION
+from learnEngine.model_artifact import InferencePlan, ModelArtifact
+from learnEngine.score_store import SCORE_EMPTY, SCORE_OK, ScoreStore
 from strategies.base_strategy import BaseStrategy
-from utils.common_tools import (
-    filter_st_stocks,
-    get_daily_kline_data,
-    get_stocks_in_sector,
-    get_trade_dates,
-)
 from utils.log_utils import logger
 
-# 与 dataset.py 对齐的低流动性阈值（单位：千元）
-_MIN_AMOUNT = 10_000   # 1000 万元
-
 
 class SectorHeatStrategy(BaseStrategy):
     """
@@ -57,16 +48,33 @@ class SectorHeatStrategy(BaseStrategy):
             "load_minute": True,     # 是否加载分钟线（保证特征与训练口径一致）
             "model_path": os.path.join(
                 os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-                "sector_heat_xgb_model.pkl",
+                "sector_heat_xgb_model.ubj",
+            ),
+            # 因子版本与模型清单不一致（含清单无版本信息）时拒绝加载（False = 仅告警）；
+            # 随仓库发布的模型由 pickle 迁移、清单无 FACTOR_VERSION / 因子版本，重训生成带版本清单后改回 True
+            "strict_schema": False,
+            # 轮动分 ≥ 该值视为轮动过快，当日不买入
+            "max_adapt_score": 50,
+            # 模型打分存储（runner/score_store_runner.py 批量填充；命中时跳过因子计算与预测），None = 关闭
+            "score_store_dir": os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                "score_store",
             ),
         }
 
         # 新架构组件（与 dataset.py 使用同一套 FeatureEngine）
         self._sector_heat   = SectorHeatFeature()
         self._feature_engine = FeatureEngine()
+        self._candidate_pool = CandidatePoolEngine()
 
-        # 模型（懒加载，首次调用 generate_signal 时加载）
-        self._model = None
+        # 模型工件（懒加载：首次调用 generate_signal 时读清单校验，首次预测时加载原生模型）
+        self._model: ModelArtifact = None
+        # 预编译推断计划（模型加载时构建：列映射 + dtype 转换表 + float32 缓冲区）
+        self._inference_plan: InferencePlan = None
+        # 当前模型对应的打分存储（模型加载时按清单 sha256 + 当前 FACTOR_VERSION / 因子版本定位）
+        self._score_store: Optional[ScoreStore] = None
+        # 当日买入信号缓存 (trade_date, buy_signal_map)
+        self._buy_signal_cache: Tuple[Optional[str], Dict[str, str]] = (None, {})
 
         # 持仓管理：{ts_code: buy_date}，用于严格执行 D+1 卖出规则
         self.hold_stock_dict: Dict[str, str] = {}
@@ -82,6 +90,9 @@ class SectorHeatStrategy(BaseStrategy):
         self.clear_signal()
         self.hold_stock_dict.clear()
         self._model = None  # 重置模型，下次使用时重新加载
+        self._inference_plan = None
+        self._score_store = None
+        self._buy_signal_cache = (None, {})
 
     def generate_signal(
         self,
@@ -149,6 +160,34 @@ class SectorHeatStrategy(BaseStrategy):
             logger.error(f"{trade_date} 模型未就绪，跳过买入")
             return {}
 
+        # 引擎每日调用 generate_signal 两次（买入 / 卖出），同一交易日只计算一次
+        if self._buy_signal_cache[0] == trade_date:
+            return dict(self._buy_signal_cache[1])
+
+        # ── Step 1 ~ 4：优先读取打分存储，未命中时实时计算 ──────────────────
+        scored = self._read_scores(trade_date)
+        if scored is None:
+            scored = self.score_date(
+                trade_date, daily_df, max_adapt_score=self.strategy_params["max_adapt_score"]
+            )
+        if scored is None:
+            return {}
+
+        buy_signal_map = self._select_buy(trade_date, *scored)
+        self._buy_signal_cache = (trade_date, dict(buy_signal_map))
+        return buy_signal_map
+
+    def score_date(
+        self, trade_date: str, daily_df: pd.DataFrame, max_adapt_score: float = None
+    ) -> Optional[Tuple[pd.DataFrame, dict]]:
+        """
+        Step 1 ~ 4：Top3 板块 → 候选池 → 因子计算 → 模型打分（与选股参数无关，可写入打分存储）
+        :param max_adapt_score: 轮动分 ≥ 该值时不再构建候选池（实时选股省去无效计算）；None = 不拦截（批量打分）
+        :return: (scores[ts_code, prob], meta{status, top3_sectors, adapt_score})；
+                 异常返回 None（不写入打分存储，下次重算）
+        """
+        empty = pd.DataFrame({"ts_code": pd.Series(dtype=str), "prob": pd.Series(dtype=np.float32)})
+
         # ── Step 1: Top3 板块 + 轮动分 ────────────────────────────────────
         try:
             top3_result  = self._sector_heat.select_top3_hot_sectors(trade_date)
@@ -156,16 +195,16 @@ class SectorHeatStrategy(BaseStrategy):
             adapt_score  = top3_result["adapt_score"]
         except Exception as e:
             logger.error(f"{trade_date} 板块热度计算失败: {e}", exc_info=True)
-            return {}
+            return None
 
+        meta = {"status": SCORE_EMPTY, "top3_sectors": list(top3_sectors or []), "adapt_score": adapt_score}
         if not top3_sectors:
             logger.warning(f"{trade_date} Top3 板块为空，跳过买入")
-            return {}
+            return empty, meta
 
         logger.info(f"{trade_date} Top3={top3_sectors} | adapt_score={adapt_score}")
-        if adapt_score >=50:
-            logger.warning(f"{adapt_score} 轮动过快")
-            return {}
+        if max_adapt_score is not None and adapt_score >= max_adapt_score:
+            return empty, {**meta, "status": SCORE_OK}
 
         # ── ST 数据入库（非致命，异常不中断选股）────────────────────────────
         try:
@@ -173,13 +212,17 @@ class SectorHeatStrategy(BaseStrategy):
         except Exception as e:
             logger.warning(f"{trade_date} ST 数据入库失败（忽略）: {e}")
 
-        # ── Step 2: 候选池构建 ────────────────────────────────────────────
-        sector_candidate_map, target_ts_codes = self._build_candidate_pool(
-            trade_date, daily_df, top3_sectors
-        )
+        # ── Step 2: 候选池构建（查询失败返回 None：不写入打分存储，下次重算）──────
+        try:
+            sector_candidate_map, target_ts_codes = self._build_candidate_pool(
+                trade_date, daily_df, top3_sectors
+            )
+        except Exception as e:
+            logger.error(f"{trade_date} 候选池构建失败: {e}", exc_info=True)
+            return None
         if not target_ts_codes:
             logger.warning(f"{trade_date} 候选池为空，跳过买入")
-            return {}
+            return empty, meta
 
         # ── Step 3: 特征计算（与训练口径完全一致）────────────────────────────
         try:
@@ -194,28 +237,49 @@ class SectorHeatStrategy(BaseStrategy):
             feature_df = self._feature_engine.run_single_date(bundle)
         except Exception as e:
             logger.error(f"{trade_date} 特征计算失败: {e}", exc_info=True)
-            return {}
+            return None
 
         if feature_df.empty:
             logger.warning(f"{trade_date} 特征计算结果为空，跳过买入")
-            return {}
+            return empty, meta
 
         # ── Step 4: XGBoost 预测 ──────────────────────────────────────────
         try:
-            expected_cols = list(self._model.feature_names_in_)
-            X = (
-                feature_df
-                .reindex(columns=expected_cols, fill_value=0)
-                # DB 返回的 Decimal/object 列在此强制转为 float（训练 CSV 读回是 float，推断时须对齐）
-                .apply(pd.to_numeric, errors="coerce")
-                .fillna(0)
-                .replace([np.inf, -np.inf], 0)
-            )
-            probs = self._model.predict_proba(X)[:, 1]
-            feature_df = feature_df.copy()
-            feature_df["_prob"] = probs
+            # 按清单列序 / dtype 对齐（DB 返回的 Decimal/object 列转为数值，NaN / inf 填 0，与训练口径一致）
+            probs, missing = self._inference_plan.predict(feature_df)
+            if missing:
+                logger.warning(f"{trade_date} 特征缺失 {len(missing)} 列（按 0 填充）: {missing[:10]}")
         except Exception as e:
             logger.error(f"{trade_date} 模型预测失败: {e}", exc_info=True)
+            return None
+
+        scores = pd.DataFrame({"ts_code": feature_df["stock_code"].to_numpy(), "prob": probs})
+        return scores, {**meta, "status": SCORE_OK}
+
+    def _read_scores(self, trade_date: str) -> Optional[Tuple[pd.DataFrame, dict]]:
+        """读取打分存储中的当日打分（未配置 / 未命中 / 读取失败返回 None）"""
+        if self._score_store is None or not self._score_store.has(trade_date):
+            return None
+        try:
+            scores, meta = self._score_store.read_date(trade_date)
+        except Exception as e:
+            logger.warning(f"{trade_date} 打分存储读取失败，改为实时计算: {e}")
+            return None
+        logger.info(
+            f"{trade_date} 命中打分存储 | Top3={meta.get('top3_sectors')} "
+            f"| adapt_score={meta.get('adapt_score')} | 候选: {len(scores)}"
+        )
+        return scores, meta
+
+    def _select_buy(self, trade_date: str, scores: pd.DataFrame, meta: dict) -> Dict[str, str]:
+        """Step 5：轮动分拦截 + 概率阈值 + Top-K（只依赖选股参数，打分存储命中时只执行这一步）"""
+        if meta.get("status") == SCORE_EMPTY:
+            return {}
+        adapt_score = meta.get("adapt_score")
+        if adapt_score is not None and adapt_score >= self.strategy_params["max_adapt_score"]:
+            logger.warning(f"{adapt_score} 轮动过快")
+            return {}
+        if scores.empty:
             return {}
 
         # ── Step 5: 排序选股 ──────────────────────────────────────────────
@@ -223,8 +287,8 @@ class SectorHeatStrategy(BaseStrategy):
         top_k    = int(self.strategy_params["buy_top_k"])
 
         selected = (
-            feature_df[feature_df["_prob"] >= min_prob]
-            .sort_values("_prob", ascending=False)
+            scores[scores["prob"] >= min_prob]
+            .sort_values("prob", ascending=False)
             .head(top_k)
         )
 
@@ -233,22 +297,31 @@ class SectorHeatStrategy(BaseStrategy):
             return {}
 
         # 返回格式 {ts_code: 'close'}，引擎以尾盘收盘价买入
-        buy_signal_map = {row["stock_code"]: "close" for _, row in selected.iterrows()}
+        buy_signal_map = {ts_code: "close" for ts_code in selected["ts_code"]}
         logger.info(
             f"{trade_date} 最终买入 {len(buy_signal_map)} 只: "
             + " | ".join(
-                f"{row['stock_code']}(p={row['_prob']:.3f})"
-                for _, row in selected.iterrows()
+                f"{ts_code}(p={prob:.3f})"
+                for ts_code, prob in zip(selected["ts_code"], selected["prob"])
             )
         )
         return buy_signal_map
 
     # ------------------------------------------------------------------ #
-    # 模型加载（懒加载 + 属性校验）
+    # 模型加载（懒加载 + 清单校验）
     # ------------------------------------------------------------------ #
 
+    def get_score_store(self) -> Optional[ScoreStore]:
+        """
+        当前模型对应的打分存储（供 runner/score_store_runner.py 批量填充）
+        :return: 模型未就绪或未配置 score_store_dir 时返回 None
+        """
+        if not self._ensure_model():
+            return None
+        return self._score_store
+
     def _ensure_model(self) -> bool:
-        """加载模型并校验 feature_names_in_ 属性（供 reindex 对齐列序）"""
+        """读取模型清单并按 schema 校验（特征列 / 因子版本 / 文件完整性），原生模型在首次预测时加载"""
         if self._model is not None:
             return True
         path = self.strategy_params["model_path"]
@@ -259,27 +332,43 @@ class SectorHeatStrategy(BaseStrategy):
             )
             return False
         try:
-            with open(path, "rb") as f:
-                self._model = pickle.load(f)
-            if not hasattr(self._model, "feature_names_in_"):
-                logger.error(
-                    "模型缺少 feature_names_in_ 属性。"
-                    "请确认 train.py 使用 pandas DataFrame 作为 X 输入训练 XGBClassifier。"
+            artifact = ModelArtifact(path)
+            feature_versions = self._feature_engine.feature_versions()
+            errors = artifact.validate(feature_versions, factor_version=FACTOR_VERSION)
+            version_errors = [e for e in errors if e.startswith("因子版本")]
+            if version_errors and not self.strategy_params.get("strict_schema", True):
+                logger.warning(
+                    "模型清单校验告警（strict_schema=False，按非严格模式继续加载，打分口径可能与训练不一致）: "
+                    + "；".join(version_errors)
                 )
-                self._model = None
+                errors = [e for e in errors if e not in version_errors]
+            if errors:
+                logger.error("模型清单校验失败: " + "；".join(errors))
                 return False
+            self._model = artifact
+            self._inference_plan = artifact.inference_plan()
+            store_dir = self.strategy_params.get("score_store_dir")
+            self._score_store = (
+                ScoreStore.for_artifact(store_dir, artifact, FACTOR_VERSION, feature_versions) if store_dir else None
+            )
+            manifest = artifact.manifest
+            date_range = manifest.get("date_range") or {}
             logger.info(
                 f"模型加载成功: {path} "
-                f"| 特征数: {len(self._model.feature_names_in_)}"
+                f"| 特征数: {len(artifact.feature_names)} "
+                f"| 因子版本: {manifest.get('factor_version')} "
+                f"| 训练区间: {date_range.get('train_start')}~{date_range.get('train_end')} "
+                f"| 验证 AUC: {(manifest.get('metrics') or {}).get('auc')}"
             )
             return True
         except Exception as e:
             logger.error(f"模型加载失败: {e}")
             self._model = None
+            self._inference_plan = None
             return False
 
     # ------------------------------------------------------------------ #
-    # 候选池构建（逻辑与 dataset.py 完全对齐）
+    # 候选池构建（与 dataset.py 共用 CandidatePoolEngine，口径完全一致）
     # ------------------------------------------------------------------ #
 
     def _build_candidate_pool(
@@ -289,164 +378,8 @@ class SectorHeatStrategy(BaseStrategy):
         top3_sectors: List[str],
     ) -> Tuple[Dict[str, pd.DataFrame], List[str]]:
         """
-        逐板块过滤，返回 (sector_candidate_map, target_ts_codes)
-        过滤顺序：板块 → ST → 日线数据 → 近10日涨停基因 → D日涨停封板 → 低流动性
-        """
-        sector_candidate_map: Dict[str, pd.DataFrame] = {}
-
-        for sector in top3_sectors:
-            logger.info(f"候选池 | 处理板块: {sector}")
-            try:
-                raw = get_stocks_in_sector(sector)
-                if not raw:
-                    logger.warning(f"[{sector}] 无股票，跳过")
-                    sector_candidate_map[sector] = pd.DataFrame()
-                    continue
-
-                ts_codes = [item["ts_code"] for item in raw]
-
-                # 1. 板块过滤（BSE / 科创 / 创业板）
-                ts_codes = self._filter_ts_code_by_board(ts_codes)
-                if not ts_codes:
-                    sector_candidate_map[sector] = pd.DataFrame()
-                    continue
-
-                # 2. ST 过滤
-                ts_codes = filter_st_stocks(ts_codes, trade_date)
-                if not ts_codes:
-                    sector_candidate_map[sector] = pd.DataFrame()
-                    continue
-
-                # 3. 日线数据过滤（当日无数据的股票排除）
-                sector_daily = daily_df[daily_df["ts_code"].isin(ts_codes)].copy()
-                if sector_daily.empty:
-                    sector_candidate_map[sector] = pd.DataFrame()
-                    continue
-
-                # 4. 近 10 日涨停基因过滤
-                candidates    = sector_daily["ts_code"].unique().tolist()
-                limit_up_map  = self._check_limit_up_gene(candidates, trade_date, day_count=10)
-                keep          = [ts for ts, has in limit_up_map.items() if has]
-                sector_daily  = sector_daily[sector_daily["ts_code"].isin(keep)]
-                if sector_daily.empty:
-                    sector_candidate_map[sector] = pd.DataFrame()
-                    continue
-
-                # 5. D 日涨停封板过滤（尾盘无法买入）
-                sector_daily = self._filter_limit_up_on_d0(sector_daily)
-
-                # 6. 低流动性过滤（与 dataset.py 阈值对齐）
-                if "amount" in sector_daily.columns:
-                    sector_daily = sector_daily[sector_daily["amount"] >= _MIN_AMOUNT]
-
-                sector_candidate_map[sector] = sector_daily
-                logger.info(f"[{sector}] 最终候选股: {len(sector_daily)}")
-
-            except Exception as e:
-                logger.error(f"[{sector}] 候选池构建失败: {e}", exc_info=True)
-                sector_candidate_map[sector] = pd.DataFrame()
-
-        # 跨板块去重，汇总候选股票列表
-        target_ts_codes = list({
-            ts
-            for df in sector_candidate_map.values()
-            if not df.empty
-            for ts in df["ts_code"].tolist()
-        })
-        return sector_candidate_map, target_ts_codes
-
-    # ------------------------------------------------------------------ #
-    # 过滤工具方法
-    # ------------------------------------------------------------------ #
-
-    def _filter_ts_code_by_board(self, ts_code_list: List[str]) -> List[str]:
-        """过滤北交所 / 科创板 / 创业板"""
-        result = []
-        for ts in ts_code_list:
-            if not ts:
-                continue
-            if FILTER_BSE_STOCK and (ts.endswith(".BJ") or ts.startswith(("83", "87", "88"))):
-                continue
-            if FILTER_688_BOARD and ts.startswith("688"):
-                continue
-            if FILTER_STAR_BOARD and ts.startswith(("300", "301", "302")) and ts.endswith(".SZ"):
-                continue
-            result.append(ts)
-        return result
-
-    def _filter_limit_up_on_d0(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        过滤 D 日涨停封板（close ≥ limit_up - 0.01，尾盘买不进去）
-        保守策略：价格数据异常时保留（avoid 误过滤）
+        返回 (sector_candidate_map, target_ts_codes)
+        过滤条件：板块 → ST → 日线数据 → 近10日涨停基因 → D日涨停封板 → 低流动性
+        查询失败直接抛出（由 score_date 按失败处理，不能当作候选池为空）
         """
-        if df.empty:
-            return df
-        keep = []
-        for _, row in df.iterrows():
-            pre_close = float(row.get("pre_close") or 0)
-            close     = float(row.get("close")     or 0)
-            if pre_close <= 0 or close <= 0:
-                keep.append(True)    # 数据异常，保守保留
-                continue
-            lu = self.calc_limit_up_price(row["ts_code"], pre_close)
-            keep.append(lu <= 0 or close < lu - 0.01)
-        filtered = df[keep].copy()
-        removed  = len(df) - len(filtered)
-        if removed:
-            logger.info(f"[D日涨停过滤] 涨停封板股已过滤: {removed} 只")
-        return filtered
-
-    def _check_limit_up_gene(
-        self,
-        ts_code_list: List[str],
-        end_date: str,
-        day_count: int = 10,
-    ) -> Dict[str, bool]:
-        """
-        判断近 N 个交易日内是否有涨停（涨停基因过滤）
-        保守策略：数据获取失败时全返回 True（不误删股票）
-        """
-        if not ts_code_list or day_count <= 0 or not end_date:
-            return {ts: True for ts in ts_code_list}
-        try:
-            if len(end_date) == 8 and end_date.isdigit():
-                end_dt = datetime.strptime(end_date, "%Y%m%d")
-            else:
-                end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-            pre_end  = (end_dt - timedelta(days=1)).strftime("%Y-%m-%d")
-            start_60 = (end_dt - timedelta(days=60)).strftime("%Y-%m-%d")
-            dates    = get_trade_dates(start_60, pre_end)[-day_count:]
-            if len(dates) < day_count:
-                logger.warning(f"可回溯交易日不足 {day_count} 个，返回全 True")
-                return {ts: True for ts in ts_code_list}
-        except Exception as e:
-            logger.error(f"获取交易日失败: {e}")
-            return {ts: True for ts in ts_code_list}
-
-        result = {ts: False for ts in ts_code_list}
-        try:
-            for date in dates:
-                df = get_daily_kline_data(trade_date=date)
-                if df.empty:
-                    continue
-                df = df[df["ts_code"].isin(ts_code_list)]
-                for _, row in df.iterrows():
-                    ts = row["ts_code"]
-                    if result.get(ts):
-                        continue    # 已确认有涨停，跳过
-                    pre_c = float(row.get("pre_close") or 0)
-                    close = float(row.get("close")     or 0)
-                    if pre_c <= 0 or close <= 0:
-                        continue
-                    lu = self.calc_limit_up_price(ts, pre_c)
-                    if lu > 0 and (abs(close - lu) <= 0.001 or close >= lu):
-                        result[ts] = True
-        except Exception as e:
-            logger.error(f"涨停基因判断失败: {e}，返回全 True")
-            return {ts: True for ts in ts_code_list}
-
-        logger.info(
-            f"涨停基因判断 | 候选: {len(ts_code_list)} "
-            f"| 有涨停基因: {sum(result.values())}"
-        )
-        return result
+        return self._candidate_pool.build(trade_date, daily_df, top3_sectors)
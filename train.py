@@ -4,15 +4,21 @@
 运行方式：python train.py
 
 前置条件：
-    已运行 python learnEngine/dataset.py 生成 train_dataset.csv
+    已运行 python learnEngine/dataset.py 生成训练集（分区 Parquet 存储或 CSV）
 
 流程：
-    1. 加载训练集 CSV
-    2. 数据预处理（清洗、特征/标签分离）
+    1. 加载训练集（先解析特征列，只读取所需列 + 日期区间，按块读取并降为 float32 / int8）
+    2. 数据预处理（块内清洗、特征/标签分离）
     3. 时间序列切分 train / val（避免未来数据泄漏）
+       STREAMING_TRAIN 下训练集按块直接构建 QuantileDMatrix，不物化原始特征矩阵
     4. 训练 XGBoost 模型
     5. 输出评估指标 + 特征重要性
-    6. 保存模型
+    6. 保存模型（XGBoost 原生 UBJSON + 清单：特征列 / dtype、因子版本、训练日期区间、验证指标）
+    （可选）WALK_FORWARD_MODE 开启时，训练前先做多折滚动前推验证，输出逐折 / 汇总指标
+    （可选）HYPER_SEARCH_METHOD 开启时，训练前先做超参数搜索，最优参数导出到 MODEL_PARAMS_PATH，
+            随后的正式训练（及存在该文件时的每次训练）以其覆盖 base_params
+    （可选）UPDATE_MODE="incremental" 时先按全量重训策略判断：满足条件则在当前模型上追加新交易日的树
+            （留出集回退守卫通过后覆盖保存）并结束；需全量重训时继续上述流程
 """
 
 import os
@@ -30,7 +36,11 @@ from typing import List
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
+from learnEngine.hyper_search import HyperParamSearch
+from learnEngine.incremental import IncrementalUpdater, MODE_FULL, MODE_INCREMENTAL
 from learnEngine.model import SectorHeatXGBModel
+from learnEngine.train_loader import TrainingDataLoader
+from learnEngine.walk_forward import WalkForwardEngine
 from utils.log_utils import logger
 
 
@@ -38,9 +48,50 @@ from utils.log_utils import logger
 # 可配置参数
 # ============================================================
 TRAIN_CSV_PATH   = os.path.join(os.getcwd(), "learnEngine/train_dataset_final.csv")
-MODEL_SAVE_PATH  = os.path.join(os.getcwd(), "sector_heat_xgb_model.pkl")
+# 分区 Parquet 训练集目录（存在时优先于 CSV）
+TRAIN_STORE_DIR  = os.path.join(os.getcwd(), "learnEngine/train_dataset_store")
+# 训练日期区间（None = 全部；分区存储下推到文件级过滤）
+TRAIN_START_DATE = None
+TRAIN_END_DATE   = None
+# 模型路径（XGBoost 原生 UBJSON，清单写入同名 .manifest.json）
+MODEL_SAVE_PATH  = os.path.join(os.getcwd(), "sector_heat_xgb_model.ubj")
 TARGET_LABEL     = "label1"       # 训练目标：label1 (日内 5% 收益) 或 label2 (隔夜高开)
 VAL_RATIO        = 0.2            # 验证集占比（按时间序列尾部切分）
+# 低内存训练：训练集按块直接构建 XGBoost QuantileDMatrix（False = 全量物化后 XGBClassifier.fit）
+STREAMING_TRAIN  = True
+
+# 滚动前推验证：None 关闭 / "expanding"（扩展窗口）/ "rolling"（固定窗口）
+WALK_FORWARD_MODE        = None
+WALK_FORWARD_FOLDS       = 5
+WALK_FORWARD_VAL_DAYS    = 40     # 每折验证窗口交易日数
+WALK_FORWARD_TRAIN_DAYS  = 250    # rolling 模式训练窗口交易日数
+WALK_FORWARD_GAP_DAYS    = 0      # 训练 / 验证之间空出的交易日数（多日持有期标签时设为持有期）
+WALK_FORWARD_WORKERS     = None   # 并行折数，None = 按 CPU 自动分配（折数 × XGBoost 线程 ≈ 核数）
+WALK_FORWARD_REPORT_PATH = os.path.join(os.getcwd(), "walk_forward_report.csv")
+
+# 超参数搜索：None 关闭 / "random"（随机 + 中位数剪枝）/ "halving"（连续减半）
+HYPER_SEARCH_METHOD       = None
+HYPER_SEARCH_TRIALS       = 27     # 试验数（halving 为首档参数组数，第 0 组为当前 base_params 基线）
+HYPER_SEARCH_WORKERS      = None   # 并行试验数，None = 按 CPU 自动分配
+HYPER_SEARCH_RESULTS_PATH = os.path.join(os.getcwd(), "hyper_search_results.csv")
+# 调优参数 JSON：搜索后写入；存在时 SectorHeatXGBModel 以其覆盖 base_params 同名参数（删除即恢复手工参数）
+MODEL_PARAMS_PATH         = os.path.join(os.getcwd(), "sector_heat_xgb_params.json")
+
+# 模型更新方式："full"（每次全量重训）/ "incremental"（在当前模型上续训新交易日，按下列策略定期全量重训）
+UPDATE_MODE                 = "full"
+INCREMENTAL_MAX_NEW_TREES   = 50      # 单次增量最多追加树数
+INCREMENTAL_MAX_TOTAL_TREES = 600     # 累计树数上限，达到后全量重训
+INCREMENTAL_HOLDOUT_DAYS    = 5       # 守卫窗口之前的留出集交易日数（仅 early stopping，下次更新并入训练）
+INCREMENTAL_GUARD_DAYS      = 3       # 新数据最末的守卫窗口交易日数（仅回退守卫，early stopping 不可见）
+INCREMENTAL_MAX_AUC_DROP    = 0.005   # 守卫窗口 AUC 下降超过该值则放弃本次增量
+FULL_REFIT_EVERY_DAYS       = 20      # 距上次全量重训新增交易日数达到该值 → 全量重训
+INCREMENTAL_BENCHMARK       = False   # 增量后在相同数据上全量重训一次，对比耗时与 AUC（不保存）
+
+# 类别型特征（fnmatch 通配符）：取值为少量整数，按 int8 读取存放，其余特征列 float32
+INT8_PATTERNS: List[str] = [
+    # K 线结构 {2=真阳,1=假阳,-1=假阴,-2=真阴}
+    "stock_candle_*",
+]
 
 # 需要排除的非特征列（主键 + 标签 + 辅助信息）
 EXCLUDE_COLS = [
@@ -52,6 +103,8 @@ EXCLUDE_COLS = [
 # 因子过滤模式（fnmatch 通配符）：匹配到的列将被排除在训练特征之外
 # 修改此处即可在不重新生成 CSV 的情况下切换因子组合，无需重跑 dataset.py
 EXCLUDE_PATTERNS: List[str] = [
+    # LabelEngine 附加标签（多持有期），非特征
+    "label_*",
     "stock_open_*",
     "stock_high_*",
     "stock_low_*",
@@ -118,56 +171,27 @@ EXCLUDE_PATTERNS: List[str] = [
 # ============================================================
 # 数据加载与预处理
 # ============================================================
-def load_and_prepare(csv_path: str, target_label: str):
-    """
-    加载训练集 CSV 并预处理
-
-    :return: (X, y, feature_cols, df) — 特征矩阵、标签、特征列名、原始 DataFrame
-    """
-    if not os.path.exists(csv_path):
-        raise FileNotFoundError(f"训练集文件不存在: {csv_path}\n请先运行 python learnEngine/dataset.py 生成训练集")
-
-    df = pd.read_csv(csv_path)
-    logger.info(f"加载训练集: {csv_path} | 行数: {len(df)} | 列数: {len(df.columns)}")
-
-    # 检查标签列
-    if target_label not in df.columns:
-        raise ValueError(f"目标标签列 '{target_label}' 不存在于训练集中，可用列: {df.columns.tolist()}")
-
-    # 删除标签缺失的行
-    before = len(df)
-    df = df.dropna(subset=[target_label])
-    if len(df) < before:
-        logger.info(f"删除 {target_label} 缺失行: {before - len(df)}")
-
-    # 去重
-    dup = df.duplicated(subset=["stock_code", "trade_date"]).sum()
-    if dup > 0:
-        df = df.drop_duplicates(subset=["stock_code", "trade_date"])
-        logger.info(f"移除重复行: {dup}")
+def _is_feature_col(col: str) -> bool:
+    """非主键/标签/辅助列，且不匹配 EXCLUDE_PATTERNS"""
+    if col in EXCLUDE_COLS:
+        return False
+    return not any(fnmatch(col, pat) for pat in EXCLUDE_PATTERNS)
 
-    # 分离特征与标签
-    feature_cols = [c for c in df.columns if c not in EXCLUDE_COLS]
-    # 仅保留数值型列
-    feature_cols = [c for c in feature_cols if pd.api.types.is_numeric_dtype(df[c])]
 
-    # EXCLUDE_PATTERNS 过滤（fnmatch 通配符，不影响 CSV 生成）
-    if EXCLUDE_PATTERNS:
-        feature_cols = [c for c in feature_cols
-                        if not any(fnmatch(c, pat) for pat in EXCLUDE_PATTERNS)]
-        logger.info(f"EXCLUDE_PATTERNS 过滤后特征列数: {len(feature_cols)}")
-
-    X = df[feature_cols].copy()
-    y = df[target_label].astype(int).values
-
-    # 缺失值填 0（与 DataSetAssembler 一致）
-    X = X.fillna(0)
+def load_and_prepare(csv_path: str, target_label: str, start_date: str = None, end_date: str = None):
+    """
+    加载训练集并预处理（先解析特征列只读所需列，按块清洗并降精度后拼接）
+    :param csv_path: 训练集 CSV 路径或分区存储目录
+    :param start_date / end_date: 训练日期区间（含，None 不限）
 
-    # inf 替换为 0
-    X = X.replace([np.inf, -np.inf], 0)
+    :return: (X, y, feature_cols, df) — 特征矩阵（float32 / int8）、标签、特征列名、主键 DataFrame（stock_code, trade_date）
+    """
+    loader = TrainingDataLoader(csv_path, target_label, _is_feature_col, INT8_PATTERNS, start_date, end_date)
+    logger.info(f"加载训练集: {csv_path} | 读取列数: {len(loader.read_cols)}/{loader.n_source_cols}")
 
-    logger.info(f"特征列数: {len(feature_cols)} | 正样本率: {y.mean():.2%}")
-    return X, y, feature_cols, df
+    X, y, df = loader.materialize("all")
+    logger.info(f"特征列数: {len(loader.feature_cols)} | 正样本率: {y.mean() if len(y) else 0:.2%}")
+    return X, y, loader.feature_cols, df
 
 
 # ============================================================
@@ -203,6 +227,17 @@ def time_series_split(X, y, df, val_ratio: float):
     return X_train, X_val, y_train, y_val
 
 
+def _split_date_range(sorted_dates: np.ndarray, split_point: int) -> dict:
+    """已排序 trade_date 在 split_point 处切分后的训练 / 验证日期区间（写入模型清单）"""
+    n = len(sorted_dates)
+    return {
+        "train_start": str(sorted_dates[0])               if split_point > 0 else None,
+        "train_end":   str(sorted_dates[split_point - 1]) if split_point > 0 else None,
+        "val_start":   str(sorted_dates[split_point])     if split_point < n else None,
+        "val_end":     str(sorted_dates[-1])              if split_point < n else None,
+    }
+
+
 # ============================================================
 # 详细评估
 # ============================================================
@@ -261,25 +296,100 @@ if __name__ == "__main__":
     logger.info("=" * 60)
 
     # 1. 加载数据
-    X, y, feature_cols, df = load_and_prepare(TRAIN_CSV_PATH, TARGET_LABEL)
-
-    if len(X) < 50:
-        logger.error(f"训练集样本不足（{len(X)} 行），至少需要 50 行，请扩大日期范围重新生成训练集")
-        sys.exit(1)
-
-    # 2. 时间序列切分
-    X_train, X_val, y_train, y_val = time_series_split(X, y, df, VAL_RATIO)
-
-    # 3. 训练模型
-    xgb_model = SectorHeatXGBModel(model_save_path=MODEL_SAVE_PATH)
-    xgb_model.train(X_train, X_val, y_train, y_val, feature_cols)
+    train_path = TRAIN_STORE_DIR if os.path.isdir(TRAIN_STORE_DIR) else TRAIN_CSV_PATH
+
+    # 0. 滚动前推验证（一次加载 + 一次分箱，各折并行训练评估）
+    if WALK_FORWARD_MODE:
+        X, y, feature_cols, df = load_and_prepare(train_path, TARGET_LABEL, TRAIN_START_DATE, TRAIN_END_DATE)
+        wf = WalkForwardEngine(
+            n_folds=WALK_FORWARD_FOLDS, val_days=WALK_FORWARD_VAL_DAYS, mode=WALK_FORWARD_MODE,
+            train_days=WALK_FORWARD_TRAIN_DAYS, gap_days=WALK_FORWARD_GAP_DAYS,
+            fold_workers=WALK_FORWARD_WORKERS,
+        )
+        wf_results = wf.run(X, y, df["trade_date"].to_numpy(), evaluate_model)
+        if not wf_results.empty:
+            wf.log_summary()
+            wf_results.to_csv(WALK_FORWARD_REPORT_PATH, index=False, encoding="utf-8-sig")
+            logger.info(f"滚动前推报告已保存: {WALK_FORWARD_REPORT_PATH}")
+        del X, y, df
+
+    # 0. 超参数搜索（一次加载 + 一次分箱，试验并行 + 早停剪枝），最优参数导出后用于本次正式训练
+    if HYPER_SEARCH_METHOD:
+        X, y, feature_cols, df = load_and_prepare(train_path, TARGET_LABEL, TRAIN_START_DATE, TRAIN_END_DATE)
+        search = HyperParamSearch(
+            method=HYPER_SEARCH_METHOD, n_trials=HYPER_SEARCH_TRIALS, val_ratio=VAL_RATIO,
+            results_path=HYPER_SEARCH_RESULTS_PATH, workers=HYPER_SEARCH_WORKERS,
+        )
+        search.run(X, y, df["trade_date"].to_numpy())
+        search.log_summary()
+        search.export_best(MODEL_PARAMS_PATH)
+        del X, y, df
+
+    # 0. 增量更新（本次刚做过超参数搜索时参数已变，直接全量重训）
+    if UPDATE_MODE == "incremental" and not HYPER_SEARCH_METHOD:
+        updater = IncrementalUpdater(
+            MODEL_SAVE_PATH, train_path, TARGET_LABEL, _is_feature_col, INT8_PATTERNS,
+            end_date=TRAIN_END_DATE, params_path=MODEL_PARAMS_PATH,
+            max_new_trees=INCREMENTAL_MAX_NEW_TREES, max_total_trees=INCREMENTAL_MAX_TOTAL_TREES,
+            holdout_days=INCREMENTAL_HOLDOUT_DAYS, guard_days=INCREMENTAL_GUARD_DAYS,
+            max_auc_drop=INCREMENTAL_MAX_AUC_DROP,
+            full_refit_days=FULL_REFIT_EVERY_DAYS,
+        )
+        mode = updater.plan()
+        if mode != MODE_FULL:
+            if mode == MODE_INCREMENTAL:
+                result = updater.update(evaluate_fn=evaluate_model, benchmark=INCREMENTAL_BENCHMARK)
+                logger.info(f"增量更新{'完成' if result['accepted'] else '未通过守卫'}：{updater.reason}")
+            sys.exit(0)
+        logger.info(f"转为全量重训：{updater.reason}")
+
+    xgb_model = SectorHeatXGBModel(model_save_path=MODEL_SAVE_PATH, params_path=MODEL_PARAMS_PATH)
+
+    loader = TrainingDataLoader(train_path, TARGET_LABEL, _is_feature_col, INT8_PATTERNS,
+                                TRAIN_START_DATE, TRAIN_END_DATE)
+    if STREAMING_TRAIN:
+        # 2. 时间序列切分（第一遍只读主键 + 标签）→ 3. 训练集按块构建 QuantileDMatrix
+        feature_cols = loader.feature_cols
+        total = loader.plan_split(VAL_RATIO)
+        if total < 50:
+            logger.error(f"训练集样本不足（{total} 行），至少需要 50 行，请扩大日期范围重新生成训练集")
+            sys.exit(1)
+        X_val, y_val, _ = loader.materialize("val")
+        xgb_model.train_streaming(loader.data_iter("train"), X_val, y_val, feature_cols, save=False)
+        n_train, date_range = loader.n_train, loader.date_range
+    else:
+        X, y, feature_cols, df = load_and_prepare(train_path, TARGET_LABEL, TRAIN_START_DATE, TRAIN_END_DATE)
+        if len(X) < 50:
+            logger.error(f"训练集样本不足（{len(X)} 行），至少需要 50 行，请扩大日期范围重新生成训练集")
+            sys.exit(1)
+
+        # 2. 时间序列切分
+        X_train, X_val, y_train, y_val = time_series_split(X, y, df, VAL_RATIO)
+
+        # 3. 训练模型
+        xgb_model.train(X_train, X_val, y_train, y_val, feature_cols, save=False)
+        n_train = len(X_train)
+        date_range = _split_date_range(np.sort(df["trade_date"].to_numpy()), n_train)
 
     # 4. 详细评估
     metrics = evaluate_model(xgb_model.model, X_val, y_val, feature_cols)
 
-    # 5. 完成
+    # 5. 保存模型 + 清单（推断端按清单校验特征列与因子版本）
+    xgb_model.save_model({
+        "target_label": TARGET_LABEL,
+        "train_source": os.path.basename(train_path),
+        **loader.dataset_versions(),
+        "date_range":   date_range,
+        "n_train":      int(n_train),
+        "n_val":        int(len(X_val)),
+        "metrics":      {k: round(float(v), 6) for k, v in metrics.items()},
+        # 全量重训所见数据截止日（增量更新据此计算全量重训周期）
+        "full_refit":   {"data_end": date_range.get("val_end") or date_range.get("train_end")},
+    })
+
+    # 6. 完成
     logger.info("=" * 60)
     logger.info(f"训练完成！模型已保存至: {MODEL_SAVE_PATH}")
-    logger.info(f"  训练集: {len(X_train)} 行 | 验证集: {len(X_val)} 行")
+    logger.info(f"  训练集: {n_train} 行 | 验证集: {len(X_val)} 行")
     logger.info(f"  AUC: {metrics['auc']:.4f} | Precision: {metrics['precision']:.4f} | Recall: {metrics['recall']:.4f}")
     logger.info("=" * 60)
@@ -6,13 +6,16 @@ import re
 import threading
 from collections import defaultdict
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 import time
 from pathlib import Path
 import functools
 from typing import List, Dict, Optional
-from typing import Tuple
-from config.config import MAIN_BOARD_LIMIT_UP_RATE, STAR_BOARD_LIMIT_UP_RATE, BJ_BOARD_LIMIT_UP_RATE
+from typing import Tuple, Set
+from config.config import (
+    MAIN_BOARD_PRICE_LIMIT, STAR_BOARD_PRICE_LIMIT, BJ_BOARD_PRICE_LIMIT, ST_BOARD_PRICE_LIMIT,
+)
 from utils.db_utils import db
 from utils.log_utils import logger
 from typing import List, Dict
@@ -108,54 +111,342 @@ def sort_by_recent_gain(df: pd.DataFrame, trade_date: str, day_count: int = 20)
     return df
 
 
-def calc_limit_up_price(ts_code: str, pre_close: float) -> float:
+def build_recent_gain_panel(daily_grouped: dict, ts_codes: List[str],
+                            today_str: str, day_ago_str: str) -> pd.DataFrame:
+    """
+    从已加载的日线字典（key=(ts_code, trade_date)）一次性取出近N日涨幅所需的两日收盘价
+    供 sort_by_recent_gain_from_panel 复用，避免每个板块各查一次数据库
+
+    :param daily_grouped: FeatureDataBundle.daily_grouped
+    :param ts_codes: 需要排名的全部股票（多个板块合并）
+    :param today_str: 今日，格式yyyy-mm-dd
+    :param day_ago_str: 前第N+1个交易日（基准日），格式yyyy-mm-dd
+    :return: DataFrame（index=ts_code，列：today_close、ago_close），缺失为 NaN
+    """
+    codes = list(dict.fromkeys(ts_codes))
+
+    def _close(key):
+        row = daily_grouped.get(key)
+        v = row.get("close") if row else None
+        return float("nan") if v is None else float(v)
+
+    return pd.DataFrame({
+        "today_close": [_close((c, today_str)) for c in codes],
+        "ago_close":   [_close((c, day_ago_str)) for c in codes],
+    }, index=pd.Index(codes, name="ts_code"))
+
+
+def sort_by_recent_gain_from_panel(df: pd.DataFrame, gain_panel: pd.DataFrame, day_count: int = 20) -> pd.DataFrame:
+    """
+    【内存版近N日涨幅排序】与 sort_by_recent_gain 输出一致（列、行顺序、并列时的先后）
+    计算口径、合并方式与排序调用完全相同，仅数据来源由两次数据库查询改为 build_recent_gain_panel
+
+    :param df: 待排序的股票DataFrame（必须包含ts_code字段）
+    :param gain_panel: build_recent_gain_panel 的返回值；为空表示基准日不可用（返回原DataFrame）
+    :param day_count: 近N日涨幅的N，默认20
+    :return: 按近N日涨幅降序排序后的DataFrame
+    """
+    if df.empty or "ts_code" not in df.columns or day_count <= 0 or gain_panel is None or gain_panel.empty:
+        return df
+
+    required_days = day_count + 1
+    ago_col  = f"ago_{required_days}d_close"
+    gain_col = f"recent_{day_count}d_gain"
+
+    # 与 SQL 版相同的两次 left merge + dropna，保证行顺序与并列处理一致
+    df_today = gain_panel["today_close"].dropna().rename_axis("ts_code").reset_index()
+    df_ago   = gain_panel["ago_close"].dropna().rename(ago_col).rename_axis("ts_code").reset_index()
+    df = df.merge(df_today, on="ts_code", how="left").merge(df_ago, on="ts_code", how="left")
+    df = df.dropna(subset=["today_close", ago_col])
+
+    if df.empty:
+        return df
+
+    df[gain_col] = (df["today_close"] / df[ago_col] - 1) * 100
+    df = df.sort_values(gain_col, ascending=False).reset_index(drop=True)
+    return df
+
+
+def _round_price(price):
+    """
+    交易所价格取整：四舍五入到分（round-half-up，非银行家舍入）
+    加 1e-6 吸收浮点乘法误差（如 10.05 × 1.1 = 11.055000000000001 / 11.054999999999999）
+    """
+    return np.floor(np.asarray(price, dtype=float) * 100 + 0.5 + 1e-6) / 100
+
+
+def _limit_rate(ts_code: str, is_st: bool = False) -> float:
+    """
+    单只股票的交易所涨跌幅比例（北交所 → 创业板/科创板 → 主板 ST → 主板）
+    返回真实比例（10% / 20% / 30% / 5%），不含 config 中 *_LIMIT_UP_RATE 的容错
+    """
+    if ts_code.endswith(".BJ"):  # 北交所
+        return BJ_BOARD_PRICE_LIMIT
+    if ts_code.startswith(("300", "301", "302")) or (ts_code.startswith("3") and ts_code.endswith(".SZ")):  # 创业板
+        return STAR_BOARD_PRICE_LIMIT
+    if ts_code.startswith("688"):  # 科创板
+        return STAR_BOARD_PRICE_LIMIT  # 科创板和创业板涨跌幅一致（20%）
+    if is_st:  # 主板 ST
+        return ST_BOARD_PRICE_LIMIT
+    return MAIN_BOARD_PRICE_LIMIT  # 主板（60/00开头）
+
+
+def calc_limit_up_price(ts_code: str, pre_close: float, is_st: bool = False) -> float:
     """
     计算股票涨停价（适配不同板块涨跌幅限制，融合调试日志+强类型+完整校验）
+    批量场景请用 calc_limit_prices / attach_limit_prices（kline_day 入库时已写入 limit_up 列）
     :param ts_code: 股票代码（如600000.SH/300001.SZ/831010.BJ）
     :param pre_close: 前一日收盘价
+    :param is_st: 是否 ST（主板 ST 按 ST_BOARD_PRICE_LIMIT）
     :return: 涨停价格（保留2位小数，无效值返回0.0）
     """
     if not pre_close or pre_close <= 0:
         logger.debug(f"[{ts_code}] 前收盘价无效（pre_close={pre_close}），涨停价返回0.0")
         return 0.0
-    # 1. 判断板块类型，匹配对应涨跌幅
-    if ts_code.endswith(".BJ"):  # 北交所
-        limit_rate = BJ_BOARD_LIMIT_UP_RATE
-    elif ts_code.startswith(("300", "301", "302")) or (ts_code.startswith("3") and ts_code.endswith(".SZ")):  # 创业板
-        limit_rate = STAR_BOARD_LIMIT_UP_RATE
-    elif ts_code.startswith("688"):  # 科创板
-        limit_rate = STAR_BOARD_LIMIT_UP_RATE  # 科创板和创业板涨跌幅一致（20%）
-    else:  # 主板（60/00开头）
-        limit_rate = MAIN_BOARD_LIMIT_UP_RATE
-    limit_up_price = pre_close * (1 + limit_rate)
-    limit_up_price = round(limit_up_price, 2)
+    limit_rate = _limit_rate(ts_code, is_st)
+    limit_up_price = float(_round_price(pre_close * (1 + limit_rate)))
     logger.debug(f"[{ts_code}] 前收盘价={pre_close}，涨停幅度={limit_rate}，涨停价={limit_up_price}")
-    return round(limit_up_price, 2)
+    return limit_up_price
 
 
-def calc_limit_down_price(ts_code: str, pre_close: float) -> float:
+def calc_limit_down_price(ts_code: str, pre_close: float, is_st: bool = False) -> float:
     """
     计算股票跌停价（和涨停价逻辑完全对齐，适配不同板块涨跌幅限制）
     :param ts_code: 股票代码
     :param pre_close: 前一日收盘价
+    :param is_st: 是否 ST
     :return: 跌停价格（保留2位小数，无效值返回0）
     """
     if not pre_close or pre_close <= 0:
-        logger.debug(f"[{ts_code}] 前收盘价无效（pre_close={pre_close}），涨停价返回0.0")
+        logger.debug(f"[{ts_code}] 前收盘价无效（pre_close={pre_close}），跌停价返回0.0")
         return 0.0
-        # 1. 判断板块类型，匹配对应涨跌幅
-    if ts_code.endswith(".BJ"):  # 北交所
-        limit_rate = BJ_BOARD_LIMIT_UP_RATE
-    elif ts_code.startswith(("300", "301", "302")) or (ts_code.startswith("3") and ts_code.endswith(".SZ")):  # 创业板
-        limit_rate = STAR_BOARD_LIMIT_UP_RATE
-    elif ts_code.startswith("688"):  # 科创板
-        limit_rate = STAR_BOARD_LIMIT_UP_RATE  # 科创板和创业板涨跌幅一致（20%）
-    else:  # 主板（60/00开头）
-        limit_rate = MAIN_BOARD_LIMIT_UP_RATE
+    limit_rate = _limit_rate(ts_code, is_st)
     # 跌停价公式：前收盘价 × (1 - 涨跌幅系数)，四舍五入保留2位小数
-    limit_down_price = pre_close * (1 - limit_rate)
+    limit_down_price = float(_round_price(pre_close * (1 - limit_rate)))
     logger.debug(f"[{ts_code}] 前收盘价={pre_close}，跌停幅度={limit_rate}，跌停价={limit_down_price}")
-    return  round(limit_down_price, 2)
+    return limit_down_price
+
+
+# ============================================================
+# 涨跌停事件（向量化计算 + stock_limit_event 事件表）
+# ============================================================
+
+# 事件位（event_flags 按位或，单日可同时命中多个）
+LIMIT_EVENT_UP        = 1    # 收盘涨停（|close - 涨停价| ≤ 0.001 或 close ≥ 涨停价，与涨停基因口径一致）
+LIMIT_EVENT_TOUCHED   = 2    # 盘中触及涨停（最高价按同一口径达到涨停价）
+LIMIT_EVENT_BROKEN    = 4    # 炸板（触及涨停但收盘未封住）
+LIMIT_EVENT_DOWN      = 8    # 收盘跌停（close ≤ 跌停价 + 0.001）
+LIMIT_EVENT_ONE_PRICE = 16   # 一字板（收盘涨停且全天最低价不低于涨停价）
+
+# 事件表名（data_cleaner.clean_and_insert_limit_events 入库）
+LIMIT_EVENT_TABLE = "stock_limit_event"
+# 价格比较容差（元）：涨跌停价为交易所真实价（精确到分），近涨停容差只在此处比较时施加
+_LIMIT_PRICE_TOL  = 0.001
+
+
+def _board_limit_rate(ts_codes: pd.Series, is_st=None) -> np.ndarray:
+    """按代码向量化匹配板块涨跌幅（与 _limit_rate 的判断顺序完全一致）"""
+    codes = pd.Series(ts_codes).astype(str)
+    is_bj   = codes.str.endswith(".BJ").to_numpy()
+    is_gem  = (codes.str.startswith(("300", "301", "302")) | (codes.str.startswith("3") & codes.str.endswith(".SZ"))).to_numpy()
+    is_star = codes.str.startswith("688").to_numpy()
+    st_mask = np.zeros(len(codes), dtype=bool) if is_st is None else np.asarray(is_st, dtype=bool)
+    return np.select(
+        [is_bj, is_gem | is_star, st_mask],
+        [BJ_BOARD_PRICE_LIMIT, STAR_BOARD_PRICE_LIMIT, ST_BOARD_PRICE_LIMIT],
+        default=MAIN_BOARD_PRICE_LIMIT,
+    )
+
+
+def calc_limit_prices(ts_codes: pd.Series, pre_close: pd.Series, is_st=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    向量化计算涨停价 / 跌停价（calc_limit_up_price / calc_limit_down_price 的批量版本，取整规则一致）
+    :param ts_codes: 股票代码 Series
+    :param pre_close: 前收盘价 Series（与 ts_codes 等长）
+    :param is_st: 可选，与 ts_codes 等长的布尔数组（主板 ST 按 ST 比例）
+    :return: (up_limit, down_limit)，保留2位小数；前收盘价无效的位置为 0.0
+    """
+    pre   = pd.to_numeric(pd.Series(pre_close), errors="coerce").to_numpy(dtype=float)
+    rate  = _board_limit_rate(ts_codes, is_st)
+    valid = np.isfinite(pre) & (pre > 0)
+    safe  = np.where(valid, pre, 0.0)
+    up    = np.where(valid, _round_price(safe * (1 + rate)), 0.0)
+    down  = np.where(valid, _round_price(safe * (1 - rate)), 0.0)
+    return up, down
+
+
+def _st_mask(df: pd.DataFrame, st_codes=None, st_pairs=None):
+    """ST 布尔掩码：st_codes 按代码匹配（单日日线），st_pairs 按 (ts_code, YYYY-MM-DD) 匹配（多日日线）"""
+    if st_pairs:
+        raw   = df["trade_date"].astype(str).str.replace("-", "", regex=False).str[:8]
+        dates = raw.str[:4] + "-" + raw.str[4:6] + "-" + raw.str[6:8]     # 兼容 YYYYMMDD / YYYY-MM-DD
+        return pd.MultiIndex.from_arrays([df["ts_code"], dates]).isin(list(st_pairs))
+    if st_codes:
+        return df["ts_code"].isin(st_codes).to_numpy()
+    return None
+
+
+def attach_limit_prices(daily_df: pd.DataFrame, st_codes=None, st_pairs=None) -> pd.DataFrame:
+    """
+    保证日线带 limit_up / limit_down 列（热路径统一入口，替代逐行 calc_limit_up_price）
+    kline_day 入库时已写入的正值直接沿用；历史未回填（为 0 / 缺列）的行向量化补算
+    :param st_codes: 可选，ST 股票代码集合（补算时主板 ST 按 ST 比例）
+    :param st_pairs: 可选，ST (ts_code, YYYY-MM-DD) 集合（多日日线按日判断 ST，优先于 st_codes）
+    :return: 新 DataFrame（不修改入参）
+    """
+    if daily_df is None or daily_df.empty:
+        return daily_df
+    df = daily_df.copy()
+    is_st = _st_mask(df, st_codes, st_pairs)
+    up, down = calc_limit_prices(df["ts_code"], df["pre_close"], is_st)
+    for col, calc in (("limit_up", up), ("limit_down", down)):
+        stored = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float) if col in df.columns \
+            else np.zeros(len(df))
+        df[col] = np.where(np.isfinite(stored) & (stored > 0), stored, calc)
+    return df
+
+
+def get_row_limit_prices(ts_code: str, row: dict, pre_close: float, is_st: bool = False) -> Tuple[float, float]:
+    """
+    单行取涨跌停价：优先读 kline_day 入库的 limit_up / limit_down，缺失时退回标量计算
+    标量补算与 calc_limit_prices 共用 _limit_rate / _round_price，ST 口径与入库列一致
+    :param is_st: 该股当日是否 ST（主板 ST 按 ST_BOARD_PRICE_LIMIT 补算）
+    """
+    up   = float(row.get("limit_up") or 0)
+    down = float(row.get("limit_down") or 0)
+    if up > 0 and down > 0:
+        return up, down
+    return calc_limit_up_price(ts_code, pre_close, is_st), calc_limit_down_price(ts_code, pre_close, is_st)
+
+
+def build_limit_events(daily_df: pd.DataFrame, st_codes=None, st_pairs=None) -> pd.DataFrame:
+    """
+    由日线批量计算涨跌停事件（全市场一次向量化，无逐行循环）
+    :param daily_df: 日线 DataFrame（ts_code, trade_date, open, high, low, close, pre_close[, limit_up, limit_down]）
+    :param st_codes: 可选，ST 股票代码集合（日线未带入库涨跌停价时用于补算）
+    :param st_pairs: 可选，ST (ts_code, YYYY-MM-DD) 集合（多日日线补算用）
+    :return: DataFrame[ts_code, trade_date, up_limit, down_limit, event_flags]；
+             pre_close / close 无效的行 event_flags 为 0
+    """
+    cols = ["ts_code", "trade_date", "up_limit", "down_limit", "event_flags"]
+    if daily_df is None or daily_df.empty:
+        return pd.DataFrame(columns=cols)
+
+    daily_df = attach_limit_prices(daily_df, st_codes, st_pairs)
+    up   = daily_df["limit_up"].to_numpy(dtype=float)
+    down = daily_df["limit_down"].to_numpy(dtype=float)
+    close = pd.to_numeric(daily_df["close"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    high  = pd.to_numeric(daily_df["high"],  errors="coerce").fillna(0).to_numpy(dtype=float)
+    low   = pd.to_numeric(daily_df["low"],   errors="coerce").fillna(0).to_numpy(dtype=float)
+
+    valid     = (up > 0) & (close > 0)
+    limit_up  = valid & ((np.abs(close - up) <= _LIMIT_PRICE_TOL) | (close >= up))
+    touched   = limit_up | (valid & ((np.abs(high - up) <= _LIMIT_PRICE_TOL) | (high >= up)))
+    broken    = touched & ~limit_up
+    limit_dn  = valid & (down > 0) & ((np.abs(close - down) <= _LIMIT_PRICE_TOL) | (close <= down))
+    one_price = limit_up & ((np.abs(low - up) <= _LIMIT_PRICE_TOL) | (low >= up))
+
+    flags = (
+        limit_up  * LIMIT_EVENT_UP
+        | touched   * LIMIT_EVENT_TOUCHED
+        | broken    * LIMIT_EVENT_BROKEN
+        | limit_dn  * LIMIT_EVENT_DOWN
+        | one_price * LIMIT_EVENT_ONE_PRICE
+    ).astype(np.uint8)
+
+    return pd.DataFrame({
+        "ts_code":     daily_df["ts_code"].to_numpy(),
+        "trade_date":  daily_df["trade_date"].astype(str).to_numpy(),
+        "up_limit":    up,
+        "down_limit":  down,
+        "event_flags": flags,
+    }, columns=cols)
+
+
+def get_limit_event_flags(trade_dates: List[str], ts_code_list: List[str]) -> pd.DataFrame:
+    """
+    读取指定日期 × 股票的涨跌停事件位
+    优先读 stock_limit_event 事件表；事件表未覆盖的日期（未回填）用一次 kline_day 区间查询现算
+
+    :param trade_dates: 交易日列表（YYYY-MM-DD）
+    :return: DataFrame[ts_code, trade_date(YYYY-MM-DD), event_flags]
+    """
+    cols = ["ts_code", "trade_date", "event_flags"]
+    if not trade_dates or not ts_code_list:
+        return pd.DataFrame(columns=cols)
+
+    sql = f"SELECT ts_code, trade_date, event_flags FROM {LIMIT_EVENT_TABLE} WHERE trade_date IN %s AND ts_code IN %s"
+    stored = db.query(sql, params=(tuple(d.replace("-", "") for d in trade_dates), tuple(ts_code_list)),
+                      return_df=True)
+    if stored is None or stored.empty:
+        stored = pd.DataFrame(columns=cols)
+    else:
+        stored["trade_date"] = stored["trade_date"].astype(str)
+
+    covered = set(stored["trade_date"])
+    missing = [d for d in trade_dates if d not in covered]
+    if not missing:
+        return stored[cols]
+
+    daily = get_kline_range_data(
+        "kline_day", missing, ts_code_list,
+        columns="ts_code, trade_date, open, high, low, close, pre_close, limit_up, limit_down",
+    )
+    if daily.empty:
+        return stored[cols]
+    logger.debug(f"[limit_event] 事件表未覆盖 {len(missing)} 个日期，由 kline_day 现算")
+    computed = build_limit_events(daily, st_pairs=get_st_stock_pairs(missing))
+    computed["trade_date"] = pd.to_datetime(computed["trade_date"]).dt.strftime("%Y-%m-%d")
+    return pd.concat([stored[cols], computed[cols]], ignore_index=True)
+
+
+def check_limit_up_gene(ts_code_list: List[str], end_date: str, day_count: int = 10) -> Dict[str, bool]:
+    """
+    近 N 个交易日（不含 end_date 当天）是否有涨停（涨停基因）
+    事件位按股票按位或归并为一个字节的位集，基因判断即 LIMIT_EVENT_UP 位是否置位。
+    保守逻辑：日期/数据获取失败时全返回 True（不误删股票）
+
+    :param end_date: 当前交易日（兼容 YYYYMMDD / YYYY-MM-DD）
+    :return: {ts_code: True=有涨停基因}
+    """
+    if not ts_code_list or day_count <= 0 or not end_date:
+        return {ts: True for ts in ts_code_list}
+
+    try:
+        if len(end_date) == 8 and end_date.isdigit():
+            end_dt = datetime.strptime(end_date, "%Y%m%d")
+        else:
+            end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+        pre_end  = (end_dt - timedelta(days=1)).strftime("%Y-%m-%d")
+        start_dt = (end_dt - timedelta(days=60)).strftime("%Y-%m-%d")
+        dates    = get_trade_dates(start_dt, pre_end)[-day_count:]
+        if len(dates) < day_count:
+            logger.warning(f"回溯交易日不足 {day_count} 个，返回全 True")
+            return {ts: True for ts in ts_code_list}
+    except Exception as e:
+        logger.error(f"获取交易日失败: {e}")
+        return {ts: True for ts in ts_code_list}
+
+    try:
+        events = get_limit_event_flags(dates, ts_code_list)
+    except Exception as e:
+        logger.error(f"涨停事件获取失败: {e}，返回全 True")
+        return {ts: True for ts in ts_code_list}
+    if events.empty:
+        return {ts: True for ts in ts_code_list}
+
+    codes = pd.Index(pd.unique(pd.Series(ts_code_list)))
+    pos   = codes.get_indexer(events["ts_code"])
+    hit   = pos >= 0
+    bits  = np.zeros(len(codes), dtype=np.uint8)
+    np.bitwise_or.at(bits, pos[hit], events["event_flags"].to_numpy(dtype=np.uint8)[hit])
+    has_gene = (bits & LIMIT_EVENT_UP) != 0
+
+    result = dict(zip(codes, has_gene.tolist()))
+    logger.info(
+        f"近 {day_count} 日涨停判断完成 | 候选: {len(ts_code_list)} | 有涨停基因: {int(has_gene.sum())}"
+    )
+    return result
 
 
 # def check_stock_has_limit_up(ts_code_list: List[str], end_date: str, day_count: int = 10) -> Dict[str, bool]:
@@ -350,23 +641,52 @@ def get_prev_trade_date(ref_date: str = None) -> str:
         return (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
 
 
-def get_st_stock_codes(trade_date: str) -> List[str]:
+def get_st_stock_codes(trade_date: str, strict: bool = False) -> List[str]:
     """
     获取指定交易日所有 ST / *ST 股票代码列表。
     与 filter_st_stocks 区别：本函数直接返回 ST 代码集合，无需传入候选池。
 
     :param trade_date: 交易日，格式 YYYY-MM-DD
+    :param strict:     查询失败时抛出 RuntimeError（候选池构建用，避免把失败当作"当日无 ST"）；
+                       False 时记录错误并返回空列表
     :return: ST 股票 ts_code 列表
     """
     sql = "SELECT DISTINCT ts_code FROM stock_risk_warning WHERE trade_date = %s"
     try:
         df = db.query(sql, params=(trade_date,), return_df=True)
+        if df is None:
+            raise RuntimeError("stock_risk_warning 查询失败")
         return df["ts_code"].tolist() if not df.empty else []
     except Exception as e:
         logger.error(f"[get_st_stock_codes] 查询失败 | 交易日：{trade_date} | 错误：{e}")
+        if strict:
+            raise RuntimeError(f"ST 名单查询失败: {trade_date}") from e
         return []
 
 
+def get_st_stock_pairs(trade_dates: List[str]) -> Set[Tuple[str, str]]:
+    """
+    批量获取多个交易日的 ST 名单（一次 IN 查询，替代逐日 get_st_stock_codes）
+    :param trade_dates: 交易日列表，格式 YYYY-MM-DD
+    :return: {(ts_code, YYYY-MM-DD)}；查询失败记录错误并返回空集合
+    """
+    if not trade_dates:
+        return set()
+    placeholders = ", ".join(["%s"] * len(trade_dates))
+    sql = f"SELECT DISTINCT ts_code, trade_date FROM stock_risk_warning WHERE trade_date IN ({placeholders})"
+    try:
+        df = db.query(sql, params=tuple(trade_dates), return_df=True)
+        if df is None:
+            raise RuntimeError("stock_risk_warning 查询失败")
+        if df.empty:
+            return set()
+        dates = pd.to_datetime(df["trade_date"].astype(str)).dt.strftime("%Y-%m-%d")
+        return set(zip(df["ts_code"], dates))
+    except Exception as e:
+        logger.error(f"[get_st_stock_pairs] 查询失败 | 交易日数：{len(trade_dates)} | 错误：{e}")
+        return set()
+
+
 def get_daily_kline_data(trade_date: str, ts_code_list: List[str] = None) -> pd.DataFrame:
     """
     获取指定日期的日线数据（向后兼容优化版）
@@ -449,6 +769,36 @@ def get_qfq_kline_data(trade_date: str, ts_code_list: List[str] = None) -> pd.Da
     return pd.DataFrame()
 
 
+def get_kline_range_data(table_name: str, trade_dates: List[str], ts_code_list: List[str],
+                         columns: str = "*", order_by: str = "") -> pd.DataFrame:
+    """
+    多日 × 多股一次性查询（日线 / 前复权 / 分钟线通用），替代逐日 get_*_kline_data 扇出
+
+    :param table_name:   表名（kline_day / kline_day_qfq / kline_min）
+    :param trade_dates:  交易日列表，格式 yyyy-mm-dd；kline_day 系列按 yyyymmdd 入参
+    :param ts_code_list: 股票代码列表（调用方负责分块，控制单条 IN 长度）
+    :param columns:      查询列，默认 *
+    :param order_by:     可选 ORDER BY 子句内容
+    :return: DataFrame；无数据/失败返回空 DF（失败记录 error）
+    """
+    if not trade_dates or not ts_code_list:
+        return pd.DataFrame()
+    # kline_min 的 trade_date 与 get_kline_min_by_stock_date 一致使用 yyyy-mm-dd，其余表用 yyyymmdd
+    dates_param = tuple(trade_dates) if table_name == "kline_min" else tuple(d.replace("-", "") for d in trade_dates)
+    sql = f"SELECT {columns} FROM {table_name} WHERE trade_date IN %s AND ts_code IN %s"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    try:
+        df = db.query(sql, params=(dates_param, tuple(ts_code_list)), return_df=True)
+    except Exception as e:
+        logger.error(f"[{table_name}] 区间查询失败：{e}")
+        return pd.DataFrame()
+    if df is None:
+        logger.error(f"[{table_name}] 区间查询返回None（数据库异常）| 日期数:{len(trade_dates)} 股票数:{len(ts_code_list)}")
+        return pd.DataFrame()
+    return df
+
+
 def getStockRank_fortraining(trade_date: str) -> Optional[pd.DataFrame]:
     """
     数据库读取指定日期trade_date